@@ -0,0 +1,183 @@
+"""
+Admission control for the API: a concurrency limit and a bounded wait queue
+per request class, with fast 503s instead of requests piling up in the
+threadpool behind SQLite's write lock.
+
+Reads (GET/HEAD) and writes (everything else) have separate gates, so a burst
+of scans cannot starve inventory browsing and vice versa. A request is turned
+away immediately when its gate's queue is full or when the expected wait
+(queue position times the recent average hold time, leaving out imports and
+bulk edits and capping each sample at the budget) exceeds the gate's budget;
+one that does get queued gives up when the budget runs out. Rejections carry
+``Retry-After`` so scanners back off instead of retrying in a tight loop.
+
+Configured per class with ``CARD_INV_{READ,WRITE}_CONCURRENCY``,
+``CARD_INV_{READ,WRITE}_QUEUE`` and ``CARD_INV_{READ,WRITE}_MAX_WAIT``
+(seconds); ``CARD_INV_ADMISSION=0`` turns the middleware off.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+
+ADMISSION_ENABLED = os.getenv("CARD_INV_ADMISSION", "1") != "0"
+# Paths outside the API (static files, /health), the admin routes and the long-lived alert stream are never gated
+GATED_PREFIX = "/api/"
+EXEMPT_PREFIXES = ("/api/admin", "/api/alerts/stream")
+# Gated, but their holds (long uploads, whole-table edits) say nothing about the wait of a scan
+UNTIMED_PREFIXES = ("/api/items/import", "/api/items/bulk")
+
+_EWMA_WEIGHT = 0.2
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class Rejected(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class Gate:
+    """Concurrency limit plus a FIFO wait queue, used from the event loop only."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters = deque()
+        self.avg_hold = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_queue_depth = 0
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until queue slot ``position`` (1-based) is likely admitted."""
+        return math.ceil(position / self.limit) * self.avg_hold
+
+    def _reject(self, position: int) -> Rejected:
+        self.rejected += 1
+        return Rejected(max(1.0, self.expected_wait(position)))
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        position = len(self._waiters) + 1
+        if position > self.queue_size or self.expected_wait(position) > self.max_wait:
+            raise self._reject(position)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        try:
+            done, _pending = await asyncio.wait({waiter}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Client went away while queued; hand on a slot that was just passed to us
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        if not done:
+            self._waiters.remove(waiter)
+            waiter.cancel()
+            self.timed_out += 1
+            raise self._reject(len(self._waiters) + 1)
+        self.admitted += 1
+
+    def release(self) -> None:
+        # The slot passes straight to the next waiter, so active stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def record_hold(self, seconds: float) -> None:
+        # Capped, so one slow request cannot push the estimate past the budget on its own
+        self.avg_hold += _EWMA_WEIGHT * (min(seconds, self.max_wait) - self.avg_hold)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "queue_size": self.queue_size,
+            "max_queue_depth": self.max_queue_depth,
+            "max_wait_seconds": self.max_wait,
+            "avg_hold_ms": round(self.avg_hold * 1000, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+def _gate_from_env(name: str, limit: int, queue_size: int, max_wait: float) -> Gate:
+    prefix = f"CARD_INV_{name.upper()}_"
+    return Gate(
+        name,
+        limit=int(os.getenv(prefix + "CONCURRENCY", str(limit))),
+        queue_size=int(os.getenv(prefix + "QUEUE", str(queue_size))),
+        max_wait=float(os.getenv(prefix + "MAX_WAIT", str(max_wait))),
+    )
+
+
+# Writes serialize on SQLite anyway; a few in flight keeps the lock busy without
+# parking dozens of threads on it. Budgets stay well under nginx's 60 s timeout.
+gates = {
+    "read": _gate_from_env("read", limit=32, queue_size=256, max_wait=10.0),
+    "write": _gate_from_env("write", limit=4, queue_size=64, max_wait=10.0),
+}
+
+
+def stats() -> dict:
+    return {name: gate.stats() for name, gate in gates.items()}
+
+
+async def _send_busy(send, gate: Gate, retry_after: float) -> None:
+    body = json.dumps({"detail": f"Server busy ({gate.name} queue full), retry shortly"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(math.ceil(retry_after)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(GATED_PREFIX) or path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        gate = gates["read" if scope["method"] in READ_METHODS else "write"]
+        try:
+            await gate.acquire()
+        except Rejected as rejected:
+            await _send_busy(send, gate, rejected.retry_after)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not path.startswith(UNTIMED_PREFIXES):
+                gate.record_hold(time.perf_counter() - started)
+            gate.release()
@@ -0,0 +1,314 @@
+"""
+Low-stock alerts, evaluated on write.
+
+A reorder point is set per item or per set (``reorder_points``; an item's own
+threshold wins). The thresholds are held in memory per database, so crud's
+quantity changes check them with a dictionary lookup inside the write's own
+transaction: a ``stock_alerts`` row is added only when the quantity crosses
+from above the threshold to at or below it, and open alerts are resolved when
+it climbs back above. Set-based writes (imports, bulk updates) run the same
+test once in SQL over the ledger rows they just added. Nothing scans the
+items table, and with no reorder points configured the check costs nothing.
+
+Alerts are published after the write commits: to ``GET /api/alerts/stream``
+(server-sent events) subscribers of the same database and, with
+``CARD_INV_ALERT_WEBHOOK_URL`` set, POSTed there as JSON by a background
+thread. Each process holds its own copy of the thresholds and reloads it
+when the ``reorder_points`` change counter shows that another process changed
+them (checked at most every ``CARD_INV_VIEW_CHECK_SECONDS``, see ``events``).
+"""
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import urllib.request
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, bindparam, event, select, text, update
+from sqlalchemy.orm import Session
+
+from . import events, models
+from .db import current_store, database_key
+
+ALERT_WEBHOOK_URL = os.getenv("CARD_INV_ALERT_WEBHOOK_URL")
+ALERT_WEBHOOK_TIMEOUT = float(os.getenv("CARD_INV_ALERT_WEBHOOK_TIMEOUT", "5"))
+SUBSCRIBER_QUEUE = 100
+
+_PENDING = "pending_stock_alerts"
+
+# Threshold of an item: its own reorder point, else its set's
+_THRESHOLD_SQL = """COALESCE(
+    (SELECT threshold FROM reorder_points r WHERE r.item_id = i.id),
+    (SELECT threshold FROM reorder_points r WHERE r.set_name = i.set_name))"""
+
+# Quantity before and after, and threshold, of each item with ledger rows stamped :now
+_CHANGED_SQL = f"""
+SELECT i.id AS item_id, i.barcode, i.name, i.set_name, i.quantity, i.quantity - m.delta AS before,
+       {_THRESHOLD_SQL} AS threshold
+FROM (SELECT item_id, SUM(delta) AS delta FROM stock_movements WHERE created_at = :now GROUP BY item_id) AS m
+JOIN items i ON i.id = m.item_id
+"""
+
+_CROSSED_DOWN_SQL = text(f"""
+INSERT INTO stock_alerts (item_id, barcode, name, set_name, threshold, quantity, created_at)
+SELECT item_id, barcode, name, set_name, threshold, quantity, :now FROM ({_CHANGED_SQL}) AS changed
+WHERE before > threshold AND quantity <= threshold
+RETURNING id
+""").bindparams(bindparam("now", type_=DateTime))
+
+_CROSSED_UP_SQL = text(f"""
+UPDATE stock_alerts SET resolved_at = :now
+WHERE resolved_at IS NULL AND item_id IN (
+    SELECT item_id FROM ({_CHANGED_SQL}) AS changed WHERE before <= threshold AND quantity > threshold
+)
+""").bindparams(bindparam("now", type_=DateTime))
+
+
+class ReorderPoints:
+    """In-memory copy of one database's ``reorder_points``."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.stale = False
+        self.uses_items = False
+        self.by_item = {}
+        self.by_set = {}
+
+    def load(self, db: Session) -> None:
+        rows = db.execute(select(models.ReorderPoint.item_id, models.ReorderPoint.set_name,
+                                 models.ReorderPoint.threshold)).all()
+        self.by_item = {item_id: threshold for item_id, _, threshold in rows if item_id is not None}
+        self.by_set = {set_name: threshold for _, set_name, threshold in rows if set_name is not None}
+        self.loaded = True
+        self.stale = False
+
+    # Item writes do not change thresholds
+    def upsert_item(self, item, fields=None) -> None:
+        pass
+
+    def remove(self, item_id: int) -> None:
+        pass
+
+    def invalidate(self, fields=None) -> None:
+        pass
+
+    def empty(self) -> bool:
+        return not self.by_item and not self.by_set
+
+    def threshold(self, item_id: int, set_name: str = None):
+        threshold = self.by_item.get(item_id)
+        if threshold is None and set_name is not None:
+            threshold = self.by_set.get(set_name)
+        return threshold
+
+
+points = events.ViewRegistry(ReorderPoints, counter="reorder_points")
+
+
+def _payload(alert: models.StockAlert) -> dict:
+    return {
+        "id": alert.id,
+        "item_id": alert.item_id,
+        "barcode": alert.barcode,
+        "name": alert.name,
+        "set_name": alert.set_name,
+        "threshold": alert.threshold,
+        "quantity": alert.quantity,
+        "created_at": alert.created_at.isoformat(),
+    }
+
+
+def _queue_for_publish(db: Session, alerts) -> None:
+    db.info.setdefault(_PENDING, []).extend(_payload(alert) for alert in alerts)
+
+
+def check(db: Session, item: models.Item, before: int) -> None:
+    """Called by crud within the write, after ``item.quantity`` changed from ``before``."""
+    view = points.get(db)
+    if view.empty():
+        return
+    threshold = view.threshold(item.id, item.set_name)
+    if threshold is None:
+        return
+    after = item.quantity or 0
+    now = datetime.now(timezone.utc)
+    if before > threshold >= after:
+        alert = models.StockAlert(item_id=item.id, barcode=item.barcode, name=item.name, set_name=item.set_name,
+                                  threshold=threshold, quantity=after, created_at=now)
+        db.add(alert)
+        db.flush()
+        _queue_for_publish(db, [alert])
+    elif before <= threshold < after:
+        db.execute(update(models.StockAlert)
+                   .where(models.StockAlert.item_id == item.id, models.StockAlert.resolved_at.is_(None))
+                   .values(resolved_at=now))
+
+
+def check_movements(db: Session, now: datetime) -> None:
+    """The set-based ``check``: items whose ledger rows stamped ``now`` crossed a threshold."""
+    if points.get(db).empty():
+        return
+    raised_ids = db.execute(_CROSSED_DOWN_SQL, {"now": now}).scalars().all()
+    db.execute(_CROSSED_UP_SQL, {"now": now})
+    if raised_ids:
+        raised = db.execute(select(models.StockAlert).where(models.StockAlert.id.in_(raised_ids))).scalars().all()
+        _queue_for_publish(db, raised)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        store = current_store.get()
+        hub.publish(database_key(session), pending)
+        if webhook.running():
+            webhook.send({"store": store.store_id if store is not None else None, "alerts": pending})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+# -- reorder points -----------------------------------------------------------
+
+def get_reorder_points(db: Session) -> list:
+    return db.execute(
+        select(models.ReorderPoint).order_by(models.ReorderPoint.set_name, models.ReorderPoint.item_id)
+    ).scalars().all()
+
+
+def set_reorder_point(db: Session, threshold, item_id: int = None, set_name: str = None):
+    """Set (or with ``threshold`` None, clear) one item's or one set's reorder point."""
+    column = models.ReorderPoint.item_id if item_id is not None else models.ReorderPoint.set_name
+    key = item_id if item_id is not None else set_name
+    point = db.execute(select(models.ReorderPoint).where(column == key)).scalars().first()
+    if threshold is None:
+        if point is not None:
+            db.delete(point)
+        point = None
+    elif point is None:
+        point = models.ReorderPoint(item_id=item_id, set_name=set_name, threshold=threshold)
+        db.add(point)
+    else:
+        point.threshold = threshold
+    db.commit()
+    if point is not None:
+        db.refresh(point)
+    view = points.get(db)
+    with view.lock:
+        target = view.by_item if item_id is not None else view.by_set
+        if threshold is None:
+            target.pop(key, None)
+        else:
+            target[key] = threshold
+    events.synced(db)
+    return point
+
+
+def get_alerts(db: Session, open_only: bool = False, item_id: int = None, limit: int = 100, before_id: int = None):
+    """Newest first; page with ``before_id``."""
+    query = select(models.StockAlert)
+    if open_only:
+        query = query.where(models.StockAlert.resolved_at.is_(None))
+    if item_id is not None:
+        query = query.where(models.StockAlert.item_id == item_id)
+    if before_id is not None:
+        query = query.where(models.StockAlert.id < before_id)
+    return db.execute(query.order_by(models.StockAlert.id.desc()).limit(limit)).scalars().all()
+
+
+# -- sinks --------------------------------------------------------------------
+
+class AlertHub:
+    """Fans committed alerts out to the event loops of stream subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.published = 0
+
+    def subscribe(self, key: str):
+        subscriber = (key, asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, key: str, alerts: list) -> None:
+        self.published += len(alerts)
+        with self._lock:
+            subscribers = [subscriber for subscriber in self._subscribers if subscriber[0] == key]
+        for _, loop, alert_queue in subscribers:
+            for alert in alerts:
+                loop.call_soon_threadsafe(_offer, alert_queue, alert)
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "published": self.published}
+
+
+def _offer(alert_queue: asyncio.Queue, alert: dict) -> None:
+    # A subscriber that stopped reading misses alerts rather than holding memory
+    if not alert_queue.full():
+        alert_queue.put_nowait(alert)
+
+
+class WebhookSink:
+    """POSTs alert batches to ``url`` from a background thread; failures are logged, not retried."""
+
+    def __init__(self, url: str = ALERT_WEBHOOK_URL, timeout: float = ALERT_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if not self.url or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="alert-webhook", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread = None
+
+    def send(self, body: dict) -> None:
+        try:
+            self._queue.put_nowait(body)
+        except queue.Full:
+            self.failed += 1
+
+    def _run(self) -> None:
+        while True:
+            body = self._queue.get()
+            if body is None:
+                return
+            request = urllib.request.Request(self.url, data=json.dumps(body).encode(), method="POST",
+                                             headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout):
+                    pass
+                self.sent += 1
+            except OSError as exc:
+                self.failed += 1
+                print(f"Alert webhook failed: {exc}")
+
+
+hub = AlertHub()
+webhook = WebhookSink()
+
+
+def stats() -> dict:
+    return {**hub.stats(), "webhook_sent": webhook.sent, "webhook_failed": webhook.failed}
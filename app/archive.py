@@ -0,0 +1,157 @@
+"""
+Hot/cold tiering: move long-dead, sold-out items into ``items_archive``.
+
+An item is archived once its quantity is 0, it is not in a batch, it has not
+been updated for ``CARD_INV_ARCHIVE_AFTER_DAYS`` days and its barcode has not
+been scanned in that time. Passes work in chunks of ``CARD_INV_ARCHIVE_CHUNK``
+rows, each copied and deleted in its own short transaction with a pause in
+between, so scanning is never held up for long.
+
+Archived items keep their id and come back automatically the next time their
+barcode is looked up (``crud.get_item_by_barcode``) or imported.
+
+Run a pass by hand with ``python -m app.archive run``; with
+``CARD_INV_ARCHIVE_AFTER_DAYS`` set, the app also runs one every
+``CARD_INV_ARCHIVE_INTERVAL_HOURS`` hours.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, delete, exists, func, insert, literal, select
+
+from . import events, models
+from .db import SessionLocal
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("CARD_INV_ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("CARD_INV_ARCHIVE_INTERVAL_HOURS", "24"))
+ARCHIVE_CHUNK = int(os.getenv("CARD_INV_ARCHIVE_CHUNK", "500"))
+ARCHIVE_PAUSE = 0.1
+
+_COLUMNS = [column.name for column in models.Item.__table__.columns]
+
+
+def _candidates(cutoff: datetime):
+    item = models.Item
+    recently_scanned = exists().where(
+        (models.ScanEvent.barcode == item.barcode) & (models.ScanEvent.created_at >= cutoff)
+    )
+    # SQLite can hand a deleted item's id to a new item; such an item stays hot
+    id_archived = exists().where(models.ItemArchive.id == item.id)
+    return (
+        select(item.id)
+        .where(item.quantity == 0, item.updated_at < cutoff, item.batch_id.is_(None),
+               ~recently_scanned, ~id_archived)
+        .order_by(item.quantity, item.updated_at)
+    )
+
+
+def count_candidates(db, days: float) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    return db.execute(select(func.count()).select_from(_candidates(cutoff).subquery())).scalar()
+
+
+def archive_items(db, days: float = None, chunk_size: int = None, pause: float = ARCHIVE_PAUSE,
+                  limit: int = None) -> int:
+    """Archive eligible items chunk by chunk; returns how many were moved."""
+    days = ARCHIVE_AFTER_DAYS if days is None else days
+    chunk_size = chunk_size or ARCHIVE_CHUNK
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    item_table = models.Item.__table__
+    archive_table = models.ItemArchive.__table__
+    moved = 0
+    while limit is None or moved < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - moved)
+        ids = db.execute(_candidates(cutoff).limit(size)).scalars().all()
+        # End the read snapshot so the write below starts from the latest commit
+        db.rollback()
+        if not ids:
+            break
+        now = datetime.now(timezone.utc)
+        # Re-check the conditions in the write itself: a scan may have revived an item
+        still_eligible = _candidates(cutoff).where(models.Item.id.in_(ids))
+        result = db.execute(insert(archive_table).from_select(
+            _COLUMNS + ["archived_at"],
+            select(*(item_table.c[column] for column in _COLUMNS), literal(now, DateTime))
+            .where(item_table.c.id.in_(still_eligible)),
+        ))
+        db.execute(delete(item_table).where(
+            item_table.c.id.in_(select(archive_table.c.id).where(archive_table.c.id.in_(ids)))
+        ))
+        db.commit()
+        moved += result.rowcount
+        if len(ids) < size:
+            break
+        time.sleep(pause)
+    if moved:
+        events.items_changed(db)
+    return moved
+
+
+class ArchiveScheduler:
+    """Background thread running an archive pass every ``interval_hours``."""
+
+    def __init__(self, after_days: float = ARCHIVE_AFTER_DAYS, interval_hours: float = ARCHIVE_INTERVAL_HOURS):
+        self.after_days = after_days
+        self.interval = interval_hours * 3600
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self.after_days <= 0 or self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="archive-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        from . import tenancy
+
+        while not self._stop.wait(self.interval):
+            for store_id, _url, session_factory in tenancy.each_database():
+                where = f" in store {store_id}" if store_id else ""
+                db = session_factory()
+                try:
+                    moved = archive_items(db, self.after_days)
+                    if moved:
+                        print(f"Archived {moved} sold-out items{where}")
+                except Exception as exc:
+                    print(f"Archive pass failed{where}: {exc}")
+                finally:
+                    db.close()
+
+
+scheduler = ArchiveScheduler()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.archive", description="Archive sold-out, inactive items")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Run an archive pass now")
+    run.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS or 180,
+                     help="Days without activity (default: CARD_INV_ARCHIVE_AFTER_DAYS or 180)")
+    run.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK)
+    run.add_argument("--limit", type=int, default=None, help="Archive at most this many items")
+    run.add_argument("--dry-run", action="store_true", help="Only count eligible items")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.dry_run:
+            print(f"{count_candidates(db, args.days)} item(s) eligible for archiving")
+        else:
+            moved = archive_items(db, args.days, chunk_size=args.chunk_size, limit=args.limit)
+            print(f"Archived {moved} item(s)")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+Online SQLite backups: ``python -m app.backup [create|list|verify|restore]``.
+
+Backups use SQLite's online backup API, copying ``CARD_INV_BACKUP_PAGES``
+pages per step and sleeping ``CARD_INV_BACKUP_PAUSE`` seconds in between.
+The source connection holds one read transaction for the whole copy, so in
+WAL mode the snapshot stays consistent while scans keep committing (without
+it, every concurrent write would restart the backup from the first page).
+
+Each backup is checked with ``PRAGMA integrity_check`` and described by a JSON
+sidecar (item count, schema version, duration). Set
+``CARD_INV_BACKUP_INTERVAL_HOURS`` to take snapshots on a schedule (of every
+store too, with tenancy on); the newest ``CARD_INV_BACKUP_KEEP`` of each
+database are retained.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy.engine import make_url
+
+from .db import DATABASE_URL, _is_sqlite, _is_sqlite_memory
+
+BACKUP_DIR = Path(os.getenv("CARD_INV_BACKUP_DIR", "./backups"))
+BACKUP_PAGES = int(os.getenv("CARD_INV_BACKUP_PAGES", "256"))
+BACKUP_PAUSE = float(os.getenv("CARD_INV_BACKUP_PAUSE", "0.05"))
+BACKUP_INTERVAL_HOURS = float(os.getenv("CARD_INV_BACKUP_INTERVAL_HOURS", "0"))
+BACKUP_KEEP = int(os.getenv("CARD_INV_BACKUP_KEEP", "14"))
+
+_running = threading.Lock()
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupInProgress(BackupError):
+    pass
+
+
+def database_path(db_url: str = DATABASE_URL) -> Path:
+    if not _is_sqlite(db_url) or _is_sqlite_memory(db_url):
+        raise BackupError("Online backups need a file-based SQLite database")
+    return Path(make_url(db_url).database)
+
+
+def store_directory(store_id: str = None) -> Path:
+    """Where a store's backups go: ``<CARD_INV_BACKUP_DIR>/stores/<id>``, the default database's in the top level."""
+    return BACKUP_DIR / "stores" / store_id if store_id else BACKUP_DIR
+
+
+def backup_running() -> bool:
+    return _running.locked()
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(str(path), timeout=30)
+    connection.execute("PRAGMA busy_timeout=30000")
+    return connection
+
+
+def inspect_database(path: Path) -> dict:
+    """Integrity check plus the facts recorded for a backup."""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        integrity = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        counts = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("items", "batches", "scan_events") if table in tables}
+        version = None
+        if "schema_version" in tables:
+            version = connection.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+    finally:
+        connection.close()
+    return {
+        "ok": integrity == ["ok"] and "items" in tables,
+        "integrity": integrity[:10],
+        "schema_version": version,
+        "counts": counts,
+    }
+
+
+def _sidecar(path: Path) -> Path:
+    return path.with_suffix(".json")
+
+
+def create_backup(db_url: str = DATABASE_URL, directory: Path = None, pages: int = None,
+                  pause: float = None, label: str = None) -> dict:
+    """Copy the live database page by page into ``directory`` and verify the copy."""
+    directory = Path(directory or BACKUP_DIR)
+    pages = pages or BACKUP_PAGES
+    pause = BACKUP_PAUSE if pause is None else pause
+    source_path = database_path(db_url)
+    if not _running.acquire(blocking=False):
+        raise BackupInProgress("A backup is already running")
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        name = f"{source_path.stem}-{stamp}{'-' + label if label else ''}.db"
+        target = directory / name
+        partial = target.with_suffix(".db.partial")
+
+        started = time.perf_counter()
+        source = _connect(source_path)
+        destination = sqlite3.connect(str(partial))
+        steps = []
+        try:
+            # Pin one snapshot for the whole copy so concurrent commits don't restart it
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(destination, pages=pages, sleep=pause,
+                          progress=lambda _status, remaining, total: steps.append(total))
+            source.rollback()
+            # The copy inherits WAL mode; a rollback journal keeps the backup a single file
+            destination.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            destination.close()
+            source.close()
+        duration = time.perf_counter() - started
+
+        report = inspect_database(partial)
+        if not report["ok"]:
+            partial.unlink(missing_ok=True)
+            raise BackupError(f"Backup failed verification: {report['integrity']}")
+        partial.rename(target)
+
+        info = {
+            "name": name,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "size_bytes": target.stat().st_size,
+            "pages": steps[-1] if steps else 0,
+            "steps": len(steps),
+            "duration_seconds": round(duration, 3),
+            "verified": True,
+            "schema_version": report["schema_version"],
+            "counts": report["counts"],
+        }
+        _sidecar(target).write_text(json.dumps(info, indent=2))
+        print(f"Backup {name} written in {duration:.1f}s ({info['pages']} pages, {len(steps)} steps)")
+        return info
+    finally:
+        _running.release()
+
+
+def list_backups(directory: Path = None) -> list:
+    """Backups in ``directory``, newest first."""
+    directory = Path(directory or BACKUP_DIR)
+    backups = []
+    for path in sorted(directory.glob("*.db"), key=lambda p: p.stat().st_mtime, reverse=True):
+        sidecar = _sidecar(path)
+        info = json.loads(sidecar.read_text()) if sidecar.exists() else {"name": path.name, "verified": False}
+        info["size_bytes"] = path.stat().st_size
+        backups.append(info)
+    return backups
+
+
+def prune_backups(keep: int = None, directory: Path = None) -> list:
+    """Delete all but the newest ``keep`` backups; returns the removed names."""
+    keep = BACKUP_KEEP if keep is None else keep
+    directory = Path(directory or BACKUP_DIR)
+    removed = []
+    for info in list_backups(directory)[keep:]:
+        path = directory / info["name"]
+        path.unlink(missing_ok=True)
+        _sidecar(path).unlink(missing_ok=True)
+        removed.append(info["name"])
+    return removed
+
+
+def _read_counters(connection: sqlite3.Connection) -> dict:
+    try:
+        return dict(connection.execute("SELECT name, value FROM change_counters"))
+    except sqlite3.OperationalError:  # schema before change counters
+        return {}
+
+
+def _advance_counters(connection: sqlite3.Connection, live_counters: dict) -> None:
+    """Set every change counter above both its restored and its pre-restore value (see app.events)."""
+    if not connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_counters'").fetchone():
+        return  # restored from before change counters; the app migrates it on start
+    restored = _read_counters(connection)
+    with connection:
+        for name in restored.keys() | live_counters.keys():
+            connection.execute(
+                "INSERT INTO change_counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (name, restored.get(name, 0) + live_counters.get(name, 0) + 1),
+            )
+
+
+def restore_backup(backup_path: Path, db_url: str = DATABASE_URL, directory: Path = None) -> dict:
+    """
+    Replace the live database with a verified backup.
+
+    The backup is checked first and the current database is snapshotted with
+    a ``pre-restore`` label, then copied over with the backup API and checked
+    again. Stop the app (and any station writing to it) first: the copy waits
+    for the write lock, but a write committed while it runs is overwritten.
+    The change counters are moved past every value seen before the restore,
+    so a process that was left running reloads its in-memory views anyway.
+    """
+    backup_path = Path(backup_path)
+    before = inspect_database(backup_path)
+    if not before["ok"]:
+        raise BackupError(f"{backup_path.name} failed verification: {before['integrity']}")
+
+    target_path = database_path(db_url)
+    if target_path.exists():
+        create_backup(db_url, directory=directory, label="pre-restore")
+
+    source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+    target = _connect(target_path)
+    try:
+        live_counters = _read_counters(target)
+        source.backup(target)
+        _advance_counters(target, live_counters)
+    finally:
+        target.close()
+        source.close()
+
+    after = inspect_database(target_path)
+    if not after["ok"] or after["counts"] != before["counts"]:
+        raise BackupError(f"Restored database does not match the backup: {after}")
+    return after
+
+
+class BackupScheduler:
+    """Background thread taking a snapshot every ``interval_hours`` and pruning old ones."""
+
+    def __init__(self, interval_hours: float = BACKUP_INTERVAL_HOURS, keep: int = BACKUP_KEEP):
+        self.interval = interval_hours * 3600
+        self.keep = keep
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        from . import tenancy
+
+        while not self._stop.wait(self.interval):
+            for store_id, url, _session_factory in tenancy.each_database():
+                directory = store_directory(store_id)
+                try:
+                    create_backup(url, directory)
+                    prune_backups(self.keep, directory)
+                except BackupInProgress:
+                    pass
+                except Exception as exc:
+                    print(f"Scheduled backup failed{f' for store {store_id}' if store_id else ''}: {exc}")
+
+
+scheduler = BackupScheduler()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.backup", description="Card inventory backups")
+    parser.add_argument("--db-url", default=DATABASE_URL, help="Database URL (default: CARD_INV_DB_URL)")
+    parser.add_argument("--dir", type=Path, default=BACKUP_DIR, help="Backup directory (default: CARD_INV_BACKUP_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    create = sub.add_parser("create", help="Take an online backup now")
+    create.add_argument("--pages", type=int, default=BACKUP_PAGES, help="Pages copied per step")
+    create.add_argument("--pause", type=float, default=BACKUP_PAUSE, help="Seconds to sleep between steps")
+    create.add_argument("--keep", type=int, default=None, help="Also prune to this many backups")
+
+    sub.add_parser("list", help="List backups, newest first")
+
+    verify = sub.add_parser("verify", help="Check a backup file")
+    verify.add_argument("file", type=Path)
+
+    restore = sub.add_parser("restore", help="Restore a backup over the database (stop the app first)")
+    restore.add_argument("file", type=Path)
+    restore.add_argument("--yes", action="store_true", help="Do not ask for confirmation")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "create":
+            create_backup(args.db_url, args.dir, pages=args.pages, pause=args.pause)
+            if args.keep is not None:
+                for name in prune_backups(args.keep, args.dir):
+                    print(f"Removed {name}")
+        elif args.command == "list":
+            for info in list_backups(args.dir):
+                counts = info.get("counts", {})
+                print(f"{info['name']:<48} {info['size_bytes'] / 1e6:>9.1f} MB  "
+                      f"{counts.get('items', '?'):>9} items  {'verified' if info.get('verified') else 'unverified'}")
+        elif args.command == "verify":
+            report = inspect_database(args.file)
+            print(json.dumps(report, indent=2))
+            return 0 if report["ok"] else 1
+        elif args.command == "restore":
+            path = args.file if args.file.exists() else args.dir / args.file
+            if not args.yes and input(f"Replace {database_path(args.db_url)} with {path.name}? [y/N] ").lower() != "y":
+                return 1
+            report = restore_backup(path, args.db_url, args.dir)
+            print(f"Restored {path.name}: {report['counts']}")
+    except BackupError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
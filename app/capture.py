@@ -0,0 +1,261 @@
+"""
+Opt-in capture of production API traffic, for replay with ``python -m app.replay``.
+
+Set ``CARD_INV_CAPTURE_DIR`` to record every ``/api/`` request (admin routes
+and the alert stream excepted): method, path, query, route template, a few
+headers, the body and its start time relative to the session, plus the
+response status, duration and a digest of the response. Records are gzipped
+NDJSON, written by a background thread; files rotate at
+``CARD_INV_CAPTURE_MAX_MB`` and the newest ``CARD_INV_CAPTURE_KEEP`` are kept.
+Bodies above ``CARD_INV_CAPTURE_BODY_LIMIT`` bytes (large imports) are not
+stored and their requests are skipped on replay.
+
+Each session starts with an online backup (``capture`` label, in
+``CARD_INV_BACKUP_DIR``) named in the file header, so a replay can start from
+the state the traffic first saw. ``CARD_INV_CAPTURE_BACKUP=0`` skips it.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .db import current_store
+from .profiling import route_path
+
+CAPTURE_DIR = os.getenv("CARD_INV_CAPTURE_DIR")
+CAPTURE_MAX_MB = float(os.getenv("CARD_INV_CAPTURE_MAX_MB", "64"))
+CAPTURE_KEEP = int(os.getenv("CARD_INV_CAPTURE_KEEP", "20"))
+CAPTURE_BODY_LIMIT = int(os.getenv("CARD_INV_CAPTURE_BODY_LIMIT", str(256 * 1024)))
+CAPTURE_BACKUP = os.getenv("CARD_INV_CAPTURE_BACKUP", "1") != "0"
+
+CAPTURED_PREFIX = "/api/"
+EXEMPT_PREFIXES = ("/api/admin", "/api/alerts/stream")
+# Enough to reproduce a request; credentials are never recorded
+CAPTURED_HEADERS = (b"content-type", b"accept", b"x-station-id", b"if-match", b"if-none-match")
+FORMAT_VERSION = 1
+
+# Response fields that legitimately differ between the original run and a replay
+_VOLATILE_SUFFIXES = ("_at",)
+_DIGEST_LIMIT = 4 * 1024 * 1024
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items() if not key.endswith(_VOLATILE_SUFFIXES)}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def response_digest(content_type: str, body: bytes) -> str:
+    """Short digest of a response, ignoring timestamps in JSON bodies."""
+    if "json" in (content_type or ""):
+        try:
+            body = json.dumps(_normalize(json.loads(body)), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+def encode_body(content_type: str, body: bytes) -> dict:
+    if not body:
+        return {}
+    if any(kind in (content_type or "") for kind in ("json", "text", "csv", "x-www-form-urlencoded")):
+        try:
+            return {"b": body.decode("utf-8")}
+        except UnicodeDecodeError:
+            pass
+    return {"b64": base64.b64encode(body).decode()}
+
+
+def decode_body(record: dict) -> bytes:
+    if "b" in record:
+        return record["b"].encode("utf-8")
+    if "b64" in record:
+        return base64.b64decode(record["b64"])
+    return b""
+
+
+class CaptureWriter:
+    """Appends records from any thread; a daemon thread compresses and rotates the files."""
+
+    def __init__(self, directory, max_mb: float = CAPTURE_MAX_MB, keep: int = CAPTURE_KEEP):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.keep = keep
+        self.session = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        self.started = time.monotonic()
+        self.header = {}
+        self.records = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._file = None
+        self._part = 0
+
+    def start(self, **header) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.header = {"capture": FORMAT_VERSION, "session": self.session,
+                       "started_at": datetime.now(timezone.utc).isoformat(), **header}
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def offset_ms(self) -> float:
+        return round((time.monotonic() - self.started) * 1000, 1)
+
+    def write(self, record: dict) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Never slow requests down for the capture
+            self.dropped += 1
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _open(self) -> None:
+        self._part += 1
+        path = self.directory / f"capture-{self.session}-{self._part:04d}.ndjson.gz"
+        self._file = gzip.open(path, "wb")
+        self._file.write(json.dumps({**self.header, "part": self._part}).encode() + b"\n")
+        self._rotate_old()
+
+    def _rotate_old(self) -> None:
+        files = sorted(self.directory.glob("capture-*.ndjson.gz"))
+        for path in files[:-self.keep] if self.keep > 0 else []:
+            path.unlink(missing_ok=True)
+
+    def _run(self) -> None:
+        self._open()
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+                self.records += 1
+                if self._queue.empty():
+                    self._file.flush()
+                if self._file.fileobj.tell() >= self.max_bytes:
+                    self._file.close()
+                    self._open()
+        finally:
+            self._file.close()
+
+    def stats(self) -> dict:
+        return {"session": self.session, "part": self._part, "records": self.records, "dropped": self.dropped,
+                "queued": self._queue.qsize()}
+
+
+writer = CaptureWriter(CAPTURE_DIR) if CAPTURE_DIR else None
+
+
+def enabled() -> bool:
+    return writer is not None
+
+
+def start() -> None:
+    """Begin a capture session, after a backup of the state it starts from."""
+    backup_name = None
+    if CAPTURE_BACKUP:
+        from . import backup
+
+        try:
+            backup_name = backup.create_backup(pause=0, label="capture")["name"]
+        except backup.BackupError as exc:
+            print(f"Capture starts without a backup: {exc}")
+    writer.start(backup=backup_name)
+
+
+def stop() -> None:
+    writer.stop()
+
+
+def stats():
+    return writer.stats() if writer is not None else None
+
+
+class CaptureMiddleware:
+    def __init__(self, app, capture_writer: CaptureWriter = None):
+        self.app = app
+        self.writer = capture_writer or writer
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(CAPTURED_PREFIX) or path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        offset = self.writer.offset_ms()
+        started = time.perf_counter()
+        request_body = bytearray()
+        truncated = False
+        response = {"status": 0, "content_type": "", "body": bytearray(), "hash": None}
+
+        async def capture_receive():
+            nonlocal truncated
+            message = await receive()
+            if message["type"] == "http.request" and not truncated:
+                request_body.extend(message.get("body", b""))
+                if len(request_body) > CAPTURE_BODY_LIMIT:
+                    truncated = True
+                    request_body.clear()
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type":
+                        response["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if response["hash"] is None and len(response["body"]) + len(chunk) <= _DIGEST_LIMIT:
+                    response["body"].extend(chunk)
+                else:
+                    # Too large to normalize: digest the raw bytes as they stream out
+                    if response["hash"] is None:
+                        response["hash"] = hashlib.sha1(response["body"])
+                        response["body"] = bytearray()
+                    response["hash"].update(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            headers = {name.decode(): value.decode("latin-1")
+                       for name, value in scope.get("headers", ()) if name in CAPTURED_HEADERS}
+            if response["hash"] is not None:
+                digest = response["hash"].hexdigest()[:16]
+            else:
+                digest = response_digest(response["content_type"], bytes(response["body"]))
+            record = {
+                "t": offset,
+                "m": scope["method"],
+                "p": path,
+                "q": scope.get("query_string", b"").decode("latin-1"),
+                "r": route_path(scope),
+                "h": headers,
+                "s": response["status"],
+                "d": round((time.perf_counter() - started) * 1000, 2),
+                "o": digest,
+            }
+            store = current_store.get()
+            if store is not None:
+                record["st"] = store.store_id
+            if truncated:
+                record["bt"] = True
+            else:
+                record.update(encode_body(headers.get("content-type"), bytes(request_body)))
+            self.writer.write(record)
@@ -0,0 +1,290 @@
+"""
+Vendor card catalog for autofilling new items: ``python -m app.catalog build|lookup|info``.
+
+``build`` turns a vendor CSV dump (a ``barcode`` column plus any of ``name``,
+``game``, ``set_name``, ``brand``; other headers can be mapped with
+``--map field=header``) into one read-only binary index:
+
+    header   magic, version, key width, entry count, section offsets
+    keys     sorted barcodes, fixed width, NUL padded
+    offsets  little-endian uint64 per key, into the record heap
+    heap     per entry: name, game, set_name, brand as uint16 length + UTF-8
+             (0xFFFF for a missing value)
+
+The app memory-maps the file named by ``CARD_INV_CATALOG_PATH`` on first use,
+so opening takes no time whatever the catalog size, pages are read on demand
+and shared by every worker process through the page cache. A lookup is a
+binary search over the key section (numpy ``searchsorted``) and one record
+decode, with no database or network involved. A scan of an unknown barcode
+creates the item with the catalog's fields (``ScanResponse.catalog_match``).
+
+Rebuilding writes a new file and renames it into place; running apps notice
+the new file within ``RELOAD_CHECK_SECONDS``.
+"""
+
+import argparse
+import csv
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+CATALOG_PATH = os.getenv("CARD_INV_CATALOG_PATH")
+FIELDS = ("name", "game", "set_name", "brand")
+MAGIC = b"CINVCAT1"
+VERSION = 1
+MAX_KEY_WIDTH = 64
+RELOAD_CHECK_SECONDS = 30.0
+
+# magic, version, key width, count, keys offset, offsets offset, heap offset
+_HEADER = struct.Struct("<8sIIQQQQ")
+_HEADER_SIZE = 64
+_LENGTH = struct.Struct("<H")
+_NULL = 0xFFFF
+_MAX_VALUE_BYTES = 0xFFFE
+
+
+class CatalogError(Exception):
+    pass
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def encode_record(values) -> bytes:
+    parts = []
+    for value in values:
+        if value is None or value == "":
+            parts.append(_LENGTH.pack(_NULL))
+            continue
+        data = value.encode("utf-8")[:_MAX_VALUE_BYTES]
+        parts.append(_LENGTH.pack(len(data)) + data)
+    return b"".join(parts)
+
+
+def decode_record(buffer, offset: int) -> dict:
+    record = {}
+    for field in FIELDS:
+        (length,) = _LENGTH.unpack_from(buffer, offset)
+        offset += _LENGTH.size
+        if length == _NULL:
+            record[field] = None
+        else:
+            record[field] = bytes(buffer[offset:offset + length]).decode("utf-8", "replace")
+            offset += length
+    return record
+
+
+class CatalogIndex:
+    """A memory-mapped catalog file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as handle:
+            self.stat = os.fstat(handle.fileno())
+            if self.stat.st_size < _HEADER_SIZE:
+                raise CatalogError(f"{self.path} is not a catalog index")
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, count, keys_at, offsets_at, heap_at = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise CatalogError(f"{self.path} is not a version {VERSION} catalog index")
+        self.key_width = width
+        self.count = count
+        self._keys = np.frombuffer(self._mmap, dtype=f"S{width}", count=count, offset=keys_at)
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=count, offset=offsets_at)
+        self._heap_at = heap_at
+
+    def get(self, barcode: str):
+        key = barcode.encode("utf-8")
+        if not key or len(key) > self.key_width or not self.count:
+            return None
+        position = int(np.searchsorted(self._keys, key))
+        if position >= self.count or self._keys[position] != key:
+            return None
+        return decode_record(self._mmap, self._heap_at + int(self._offsets[position]))
+
+    def close(self) -> None:
+        # Arrays viewing the map must go first, or mmap refuses to close
+        self._keys = self._offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+class Catalog:
+    """The configured catalog, opened lazily and reopened when the file is replaced."""
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = Path(path) if path else None
+        self._index = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.matches = 0
+
+    def _current(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked < RELOAD_CHECK_SECONDS:
+            return self._index
+        with self._lock:
+            self._checked = now
+            try:
+                stat = self.path.stat()
+            except OSError:
+                return self._index
+            index = self._index
+            if index is None or (stat.st_ino, stat.st_mtime_ns) != (index.stat.st_ino, index.stat.st_mtime_ns):
+                try:
+                    # The old map stays valid for lookups still using it
+                    self._index = CatalogIndex(self.path)
+                    print(f"Catalog {self.path}: {self._index.count} entries")
+                except (OSError, ValueError, CatalogError) as exc:
+                    print(f"Catalog {self.path} not loaded: {exc}")
+            return self._index
+
+    def lookup(self, barcode: str):
+        if self.path is None:
+            return None
+        index = self._current()
+        if index is None:
+            return None
+        self.lookups += 1
+        entry = index.get(barcode)
+        if entry is not None:
+            self.matches += 1
+        return entry
+
+
+catalog = Catalog()
+
+
+def lookup(barcode: str):
+    """Catalog fields for a barcode (``name``, ``game``, ``set_name``, ``brand``), or None."""
+    return catalog.lookup(barcode)
+
+
+def build(source, target, column_map: dict = None, delimiter: str = ",") -> dict:
+    """Write a catalog index for a CSV file; later rows win for a repeated barcode."""
+    column_map = {"barcode": "barcode", **{field: field for field in FIELDS}, **(column_map or {})}
+    target = Path(target)
+    started = time.perf_counter()
+    barcodes, offsets = [], []
+    skipped = 0
+    with tempfile.TemporaryFile(dir=target.parent) as heap, \
+            open(source, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.reader(handle, delimiter=delimiter)
+        header = [name.strip().lower() for name in next(reader, [])]
+        try:
+            barcode_column = header.index(column_map["barcode"].lower())
+        except ValueError:
+            raise CatalogError(f"No {column_map['barcode']!r} column in {source}")
+        columns = [header.index(column_map[field].lower()) if column_map[field].lower() in header else None
+                   for field in FIELDS]
+        heap_size = 0
+        for row in reader:
+            barcode = row[barcode_column].strip() if barcode_column < len(row) else ""
+            key = barcode.encode("utf-8")
+            if not key or len(key) > MAX_KEY_WIDTH:
+                skipped += 1
+                continue
+            values = [row[column].strip() if column is not None and column < len(row) else None
+                      for column in columns]
+            record = encode_record(values)
+            barcodes.append(key)
+            offsets.append(heap_size)
+            heap.write(record)
+            heap_size += len(record)
+
+        width = max(map(len, barcodes), default=1)
+        keys = np.array(barcodes, dtype=f"S{width}")
+        del barcodes
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        offset_array = np.asarray(offsets, dtype="<u8")[order]
+        del offsets, order
+        # Equal keys are adjacent in input order; keep the last of each run
+        if len(keys):
+            last = np.append(keys[1:] != keys[:-1], True)
+            keys, offset_array = keys[last], offset_array[last]
+
+        count = len(keys)
+        keys_at = _HEADER_SIZE
+        offsets_at = _align(keys_at + count * width)
+        heap_at = _align(offsets_at + count * 8)
+        partial = target.with_name(target.name + ".partial")
+        with open(partial, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, VERSION, width, count, keys_at, offsets_at, heap_at).ljust(_HEADER_SIZE, b"\0"))
+            out.write(keys.tobytes())
+            out.write(b"\0" * (offsets_at - out.tell()))
+            out.write(offset_array.tobytes())
+            out.write(b"\0" * (heap_at - out.tell()))
+            heap.seek(0)
+            while True:
+                chunk = heap.read(1 << 20)
+                if not chunk:
+                    break
+                out.write(chunk)
+        os.replace(partial, target)
+    return {
+        "entries": count,
+        "skipped": skipped,
+        "size_bytes": target.stat().st_size,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _column_mapping(value: str) -> tuple:
+    field, _, header = value.partition("=")
+    if field not in ("barcode",) + FIELDS or not header:
+        raise argparse.ArgumentTypeError(f"use FIELD=HEADER with FIELD one of barcode, {', '.join(FIELDS)}")
+    return field, header
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.catalog", description="Vendor catalog barcode index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="Build an index from a vendor CSV")
+    build_parser.add_argument("csv", type=Path)
+    build_parser.add_argument("-o", "--output", type=Path, default=CATALOG_PATH or "catalog.idx",
+                              help="Index file (default: CARD_INV_CATALOG_PATH or catalog.idx)")
+    build_parser.add_argument("--map", dest="columns", type=_column_mapping, action="append", default=[],
+                              help="Map a field to a CSV header, e.g. --map name=product_name")
+    build_parser.add_argument("--delimiter", default=",")
+    for name, help_text in (("lookup", "Look up barcodes"), ("info", "Describe an index")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("--index", type=Path, default=CATALOG_PATH or "catalog.idx")
+        if name == "lookup":
+            command.add_argument("barcodes", nargs="+")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            report = build(args.csv, args.output, dict(args.columns), args.delimiter)
+            print(f"Wrote {args.output}: {report['entries']} entries, {report['size_bytes'] / 1e6:.1f} MB "
+                  f"in {report['seconds']}s ({report['skipped']} rows without a usable barcode)")
+        elif args.command == "info":
+            index = CatalogIndex(args.index)
+            print(f"{args.index}: {index.count} entries, key width {index.key_width}, "
+                  f"{index.stat.st_size / 1e6:.1f} MB")
+        elif args.command == "lookup":
+            index = CatalogIndex(args.index)
+            for barcode in args.barcodes:
+                entry = index.get(barcode)
+                print(f"{barcode}: " + (", ".join(f"{k}={v}" for k, v in entry.items() if v) if entry else "not found"))
+    except (OSError, CatalogError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Reporting command line: ``python -m app.cli [--db-url URL] <command>``.
+
+Commands:
+    items   list items (filters, sorting, table/csv/json output)
+    item    show one item by barcode
+    stats   totals plus per-game and per-location breakdowns
+    scans   most recent scan events
+
+Item listings are streamed from a server-side cursor and written as they
+arrive, so even a million-row inventory exports with flat memory use.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from decimal import Decimal
+
+ITEM_COLUMNS = ["id", "barcode", "name", "game", "set_name", "brand", "quantity", "location", "notes", "price",
+                "description", "batch_id", "created_at", "updated_at"]
+LIST_COLUMNS = ["id", "barcode", "name", "game", "set_name", "brand", "quantity", "location", "price", "created_at"]
+TABLE_WIDTHS = {"id": 7, "barcode": 16, "name": 30, "game": 14, "set_name": 22, "brand": 12,
+                "quantity": 6, "location": 9, "price": 10, "created_at": 10}
+TABLE_HEADERS = {"id": "ID", "barcode": "Barcode", "name": "Name", "game": "Game", "set_name": "Set",
+                 "brand": "Brand", "quantity": "Qty", "location": "Location", "price": "Price", "created_at": "Added"}
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _cell(column: str, value) -> str:
+    if value is None:
+        return ""
+    if column == "price":
+        return f"${value:.2f}"
+    if column == "created_at":
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def _write_table(rows, columns, out) -> int:
+    # Fixed widths (long values are cut) so rows can be printed as they stream in
+    widths = [TABLE_WIDTHS.get(column, 16) for column in columns]
+    out.write(" ".join(f"{TABLE_HEADERS.get(c, c):<{w}}" for c, w in zip(columns, widths)).rstrip() + "\n")
+    out.write("-" * (sum(widths) + len(widths) - 1) + "\n")
+    count = 0
+    for row in rows:
+        cells = (_cell(column, row[column]) for column in columns)
+        out.write(" ".join(f"{cell[:w]:<{w}}" for cell, w in zip(cells, widths)).rstrip() + "\n")
+        count += 1
+    return count
+
+
+def _write_csv(rows, columns, out) -> int:
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(["" if row[column] is None else row[column] for column in columns])
+        count += 1
+    return count
+
+
+def _write_json(rows, columns, out) -> int:
+    # A JSON array written element by element
+    count = 0
+    out.write("[")
+    for row in rows:
+        out.write(",\n" if count else "\n")
+        out.write(json.dumps({column: row[column] for column in columns}, default=_json_default))
+        count += 1
+    out.write("\n]\n" if count else "]\n")
+    return count
+
+
+WRITERS = {"table": _write_table, "csv": _write_csv, "json": _write_json}
+
+
+def cmd_items(db, args, out) -> None:
+    from . import crud
+
+    rows = crud.iter_items(
+        db,
+        columns=args.columns,
+        search=args.search,
+        game=args.game,
+        set_name=args.set_name,
+        location=args.location,
+        batch_id=args.batch_id,
+        min_quantity=args.min_quantity,
+        order_by=args.sort,
+        descending=args.desc,
+        limit=args.limit,
+    )
+    count = WRITERS[args.format](rows, args.columns, out)
+    if args.format == "table":
+        out.write(f"\n{count} item(s)\n")
+
+
+def cmd_item(db, args, out) -> int:
+    from . import crud, models
+
+    # Reports never write, so archived items are shown where they are
+    item = crud.get_item_by_barcode(db, args.barcode, restore=False) or crud.get_archived_item_by_barcode(db, args.barcode)
+    if not item:
+        print(f"No item found with barcode: {args.barcode}", file=sys.stderr)
+        return 1
+    data = {column: getattr(item, column) for column in ITEM_COLUMNS}
+    if isinstance(item, models.ItemArchive):
+        data["archived_at"] = item.archived_at
+    if args.format == "json":
+        out.write(json.dumps(data, default=_json_default, indent=2) + "\n")
+    else:
+        for key, value in data.items():
+            out.write(f"  {key + ':':<13} {'' if value is None else value}\n")
+    return 0
+
+
+def cmd_stats(db, args, out) -> None:
+    from . import crud
+
+    stats = crud.get_inventory_stats(db, days=args.days)
+    if args.format == "json":
+        out.write(json.dumps(stats, default=_json_default, indent=2) + "\n")
+        return
+    out.write("Database Statistics:\n")
+    out.write(f"  Total items:           {stats['total_items']}\n")
+    out.write(f"  Items with names:      {stats['named_items']}\n")
+    out.write(f"  Total quantity:        {stats['total_quantity']}\n")
+    out.write(f"  Estimated total value: ${stats['total_value']:.2f}\n")
+    out.write(f"  Scans in last {stats['recent_scan_days']} days:  {stats['recent_scans']}\n")
+    for title, key in (("By game", "by_game"), ("By location", "by_location")):
+        out.write(f"\n{title}:\n")
+        for group in stats[key]:
+            label = group["value"] or "(none)"
+            out.write(f"  {label[:24]:<24} {group['items']:>8} items {group['quantity']:>9} qty  ${group['total_value']:.2f}\n")
+
+
+def cmd_scans(db, args, out) -> None:
+    from . import crud
+
+    scans = crud.get_recent_scans(db, limit=args.limit, barcode=args.barcode)
+    if args.format == "table":
+        out.write(f"{'Date':<20} {'Barcode':<16} Name\n")
+        out.write("-" * 70 + "\n")
+        for scan in scans:
+            out.write(f"{scan['created_at']:%Y-%m-%d %H:%M:%S}  {scan['barcode'][:16]:<16} {scan['name'] or 'Unknown'}\n")
+    else:
+        WRITERS[args.format](scans, ["created_at", "barcode", "name"], out)
+
+
+def _column_list(value: str) -> list:
+    columns = [column.strip() for column in value.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in ITEM_COLUMNS]
+    if unknown or not columns:
+        raise argparse.ArgumentTypeError(f"choose from {', '.join(ITEM_COLUMNS)}")
+    return columns
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Card inventory reports")
+    parser.add_argument("--db-url", default=None, help="Database URL (default: CARD_INV_DB_URL)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    items = sub.add_parser("items", help="List items")
+    items.add_argument("-s", "--search", help="Match name, game, set, brand or barcode")
+    items.add_argument("--game")
+    items.add_argument("--set", dest="set_name")
+    items.add_argument("--location", choices=["Storage", "Show"])
+    items.add_argument("--batch", dest="batch_id", type=int)
+    items.add_argument("--min-quantity", type=int)
+    items.add_argument("--sort", default="id",
+                       choices=[column for column in ITEM_COLUMNS if column not in ("notes", "description")])
+    items.add_argument("--desc", action="store_true", help="Sort descending")
+    items.add_argument("--limit", type=int)
+    items.add_argument("--columns", type=_column_list, default=LIST_COLUMNS,
+                       help=f"Comma-separated columns (default: {','.join(LIST_COLUMNS)})")
+    items.add_argument("-f", "--format", default="table", choices=sorted(WRITERS))
+
+    item = sub.add_parser("item", help="Show one item by barcode")
+    item.add_argument("barcode")
+    item.add_argument("-f", "--format", default="table", choices=["table", "json"])
+
+    stats = sub.add_parser("stats", help="Inventory statistics")
+    stats.add_argument("--days", type=int, default=7, help="Window for the recent scan count")
+    stats.add_argument("-f", "--format", default="table", choices=["table", "json"])
+
+    scans = sub.add_parser("scans", help="Recent scan events")
+    scans.add_argument("--limit", type=int, default=10)
+    scans.add_argument("--barcode")
+    scans.add_argument("-f", "--format", default="table", choices=sorted(WRITERS))
+    return parser
+
+
+COMMANDS = {"items": cmd_items, "item": cmd_item, "stats": cmd_stats, "scans": cmd_scans}
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.db_url:
+        # app.db reads the URL when first imported
+        os.environ["CARD_INV_DB_URL"] = args.db_url
+    from .db import ReadSessionLocal
+
+    db = ReadSessionLocal()
+    try:
+        return COMMANDS[args.command](db, args, sys.stdout) or 0
+    except BrokenPipeError:
+        # Output piped into head/less that exited early
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
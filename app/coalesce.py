@@ -0,0 +1,178 @@
+"""
+Server-side debouncing of repeated scans.
+
+Camera scanners decode the same barcode several times a second. Requests from
+one station for the same key (barcode, plus batch or action where relevant)
+that arrive within a short window are coalesced, per endpoint, in one of two
+modes:
+
+- ``ack``: the first request is processed; repeats within the window get its
+  result back, flagged as duplicates, without touching the database.
+- ``merge``: the first request waits out the window, then applies the summed
+  increment of every request that joined it in a single write; all of them
+  receive the combined result.
+
+Endpoints are configured with ``CARD_INV_COALESCE_<ENDPOINT>`` set to
+``off``, ``ack:<ms>`` or ``merge:<ms>``. Only requests that identify their
+station with an ``X-Station-Id`` header (the web UI sends one) are coalesced:
+behind a proxy every station shares one client address, and two stations
+scanning the same card must never be merged. Responses that caused no write
+of their own carry ``X-Coalesced: ack|merge``.
+"""
+
+import os
+import threading
+import time
+
+from .db import current_store
+
+STATION_HEADER = "X-Station-Id"
+# Set on responses that did not cause a write of their own
+COALESCED_HEADER = "X-Coalesced"
+
+_PRUNE_THRESHOLD = 256
+
+
+class _Window:
+    __slots__ = ("opened", "increment", "requests", "closed", "done", "result", "error")
+
+    def __init__(self, increment: int):
+        self.opened = time.monotonic()
+        self.increment = increment
+        self.requests = 1
+        self.closed = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    def __init__(self, name: str, mode: str = "off", window_ms: float = 0):
+        if mode not in ("off", "ack", "merge"):
+            raise ValueError(f"Unknown coalescing mode {mode!r} for {name}")
+        self.name = name
+        self.mode = mode
+        self.window = window_ms / 1000
+        self._lock = threading.Lock()
+        self._windows = {}
+        self.requests = 0
+        self.writes = 0
+        self.avoided_writes = 0
+
+    @classmethod
+    def from_env(cls, name: str, default: str) -> "Coalescer":
+        setting = os.getenv(f"CARD_INV_COALESCE_{name.upper()}", default).strip().lower()
+        mode, _, window_ms = setting.partition(":")
+        return cls(name, mode, float(window_ms or 0))
+
+    def _prune(self, now: float) -> None:
+        expired = [key for key, window in self._windows.items()
+                   if window.done.is_set() and now - window.opened >= self.window]
+        for key in expired:
+            del self._windows[key]
+
+    def submit(self, key, increment: int, apply):
+        """
+        Run ``apply(increment)`` for this request, or share another request's run.
+
+        Returns ``(result, coalesced)``; ``coalesced`` is True when this request
+        caused no write of its own. Exceptions from a shared run are re-raised
+        for every request that joined it. A ``None`` key (no station id) is
+        never coalesced.
+        """
+        with self._lock:
+            self.requests += 1
+            if self.mode == "off" or self.window <= 0 or key is None:
+                self.writes += 1
+                leader = True
+                window = None
+            else:
+                now = time.monotonic()
+                window = self._windows.get(key)
+                if self.mode == "ack":
+                    joined = window is not None and now - window.opened < self.window
+                else:
+                    joined = window is not None and not window.closed
+                if joined:
+                    window.increment += increment
+                    window.requests += 1
+                    self.avoided_writes += 1
+                    leader = False
+                else:
+                    if len(self._windows) >= _PRUNE_THRESHOLD:
+                        self._prune(now)
+                    window = _Window(increment)
+                    self._windows[key] = window
+                    self.writes += 1
+                    leader = True
+
+        if window is None:
+            return apply(increment), False
+
+        if leader:
+            if self.mode == "merge":
+                time.sleep(self.window)
+                with self._lock:
+                    window.closed = True
+                    if self._windows.get(key) is window:
+                        del self._windows[key]
+                    increment = window.increment
+            try:
+                window.result = apply(increment)
+                return window.result, False
+            except Exception as exc:
+                window.error = exc
+                raise
+            finally:
+                window.done.set()
+
+        window.done.wait()
+        if window.error is not None:
+            raise window.error
+        return window.result, True
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "window_ms": self.window * 1000,
+            "requests": self.requests,
+            "writes": self.writes,
+            "avoided_writes": self.avoided_writes,
+        }
+
+
+def station_name(request) -> str:
+    """The scanner a request came from, as sent in ``X-Station-Id`` (else the client address)."""
+    return request.headers.get(STATION_HEADER) or (request.client.host if request.client else "-")
+
+
+def station_id(request):
+    """The station's coalescing identity, or None when the request did not send ``X-Station-Id``."""
+    station = request.headers.get(STATION_HEADER)
+    if not station:
+        return None
+    # The same station id in two stores must never share a window
+    store = current_store.get()
+    return f"{store.store_id}/{station}" if store is not None else station
+
+
+def key(request, *parts):
+    """Coalescing key for this request's station, or None (not coalesced) without a station id."""
+    station = station_id(request)
+    return None if station is None else (station, *parts)
+
+
+# Camera double-reads on /api/scan are acknowledged by default: it only looks
+# items up or creates them, so a dropped repeat loses nothing. Batch scans add
+# quantity, where a real second scan inside the window would be lost, and
+# quantity changes are explicit button presses; both are only coalesced when
+# configured
+scan = Coalescer.from_env("scan", "ack:500")
+batch_scan = Coalescer.from_env("batch_scan", "off")
+update_quantity = Coalescer.from_env("update_quantity", "off")
+
+coalescers = [scan, batch_scan, update_quantity]
+
+
+def stats() -> dict:
+    return {coalescer.name: coalescer.stats() for coalescer in coalescers}
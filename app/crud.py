@@ -1,60 +1,458 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from datetime import datetime, timedelta, timezone
 
-from . import models, schemas
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import DateTime, Integer, String, bindparam, delete, func, insert, literal, select, tuple_, update
+
+from . import alerts, events, models, schemas
+
+# Columns a bulk import may set; barcode is the upsert key
+IMPORT_FIELDS = ("barcode", "name", "game", "set_name", "brand", "quantity", "location", "notes", "price", "description")
+# Why a quantity changed, as recorded on the stock_movements ledger
+MOVEMENT_REASONS = ("scan", "sell", "batch", "adjust", "import", "delete", "opening", "reconcile")
+# Times a write without an expected version is re-applied after losing a race with another writer
+VERSION_RETRIES = 3
+# Returned by set-based item writes, so in-memory views apply the new rows without reading them again
+_ITEM_COLUMNS = tuple(models.Item.__table__.columns)
+
+
+def _record_quantity_change(db: Session, item: models.Item, delta: int, reason: str, station: str = None):
+    """Add a ledger row (and any low-stock alert) to the session; they commit together with the quantity change."""
+    if delta:
+        db.add(models.StockMovement(item_id=item.id, delta=delta, reason=reason, station=station))
+        if reason != "delete":
+            alerts.check(db, item, before=(item.quantity or 0) - delta)
+
+
+def check_version(obj, expected_version: int = None) -> None:
+    if expected_version is not None and obj.version != expected_version:
+        raise StaleDataError(f"{type(obj).__name__} {obj.id} is at version {obj.version}, not {expected_version}")
+
+
+def _commit_versioned(db: Session, obj, apply, expected_version: int = None):
+    """
+    Run ``apply()`` (changes to ``obj``, a versioned Item or Batch) and commit.
+
+    The ORM's UPDATE or DELETE of ``obj`` requires the version it was loaded
+    at in its WHERE clause and bumps it, so a write committed by someone else
+    in between matches no row and raises StaleDataError. With
+    ``expected_version`` (a client's If-Match) that, or an already different
+    version, is the caller's to report; otherwise the changes are re-applied
+    to the row as it is now.
+    """
+    for attempt in range(VERSION_RETRIES):
+        check_version(obj, expected_version)
+        try:
+            result = apply()
+            db.commit()
+            return result
+        except StaleDataError:
+            db.rollback()
+            if expected_version is not None or attempt == VERSION_RETRIES - 1:
+                raise
+
+
+def _movements_from(select_stmt):
+    """INSERT ... SELECT of (item_id, delta, reason, station, created_at) rows into the ledger."""
+    return insert(models.StockMovement.__table__).from_select(
+        ["item_id", "delta", "reason", "station", "created_at"], select_stmt
+    )
+
+
+# The hot lookups are built once, so each call reuses the same statement and its cached compiled form
+_ITEM_BY_ID = select(models.Item).where(models.Item.id == bindparam("item_id"))
+_ITEM_BY_BARCODE = select(models.Item).where(models.Item.barcode == bindparam("barcode"))
+_ARCHIVED_BY_BARCODE = select(models.ItemArchive).where(models.ItemArchive.barcode == bindparam("barcode"))
+_BATCH_BY_ID = select(models.Batch).where(models.Batch.id == bindparam("batch_id"))
+# Existence checks stay in Core: no ORM entity is built for a yes/no answer
+_ITEM_EXISTS = select(literal(1)).select_from(models.Item.__table__).where(
+    models.Item.__table__.c.id == bindparam("item_id")).limit(1)
+_BATCH_EXISTS = select(literal(1)).select_from(models.Batch.__table__).where(
+    models.Batch.__table__.c.id == bindparam("batch_id")).limit(1)
+_BATCH_ITEM_COUNT = select(func.count()).select_from(models.Item.__table__).where(
+    models.Item.__table__.c.batch_id == bindparam("batch_id"))
 
 
 def get_item(db: Session, item_id: int):
-    return db.query(models.Item).filter(models.Item.id == item_id).first()
+    return db.execute(_ITEM_BY_ID, {"item_id": item_id}).scalars().first()
 
 
-def get_item_by_barcode(db: Session, barcode: str):
-    return db.query(models.Item).filter(models.Item.barcode == barcode).first()
+def item_exists(db: Session, item_id: int) -> bool:
+    return db.connection().execute(_ITEM_EXISTS, {"item_id": item_id}).first() is not None
 
 
-def get_items(db: Session, skip: int = 0, limit: int = 100, search: str = None):
-    query = db.query(models.Item)
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            models.Item.name.ilike(search_term) |
-            models.Item.game.ilike(search_term) |
-            models.Item.set_name.ilike(search_term) |
-            models.Item.brand.ilike(search_term) |
-            models.Item.barcode.ilike(search_term)
-        )
-    return query.offset(skip).limit(limit).all()
+def get_item_by_barcode(db: Session, barcode: str, restore: bool = True):
+    """Look up an item; an archived one is moved back into ``items`` unless ``restore`` is off"""
+    item = db.execute(_ITEM_BY_BARCODE, {"barcode": barcode}).scalars().first()
+    if item is None and restore and restore_archived_items(db, [barcode]):
+        item = db.execute(_ITEM_BY_BARCODE, {"barcode": barcode}).scalars().first()
+        events.item_saved(db, item)
+    return item
 
 
-def create_item(db: Session, **kwargs):
+def get_archived_item_by_barcode(db: Session, barcode: str):
+    return db.execute(_ARCHIVED_BY_BARCODE, {"barcode": barcode}).scalars().first()
+
+
+def restore_archived_items(db: Session, barcodes, commit: bool = True) -> int:
+    """Move archived items with these barcodes back into ``items``; returns how many. ``commit=False`` leaves it to the caller"""
+    archive = models.ItemArchive.__table__
+    barcodes = list(barcodes)
+    archived = db.execute(select(archive.c.id).where(archive.c.barcode.in_(barcodes))).scalars().all()
+    if not archived:
+        return 0
+    columns = [column.name for column in models.Item.__table__.columns if column.name != "updated_at"]
+    now = datetime.now(timezone.utc)
+    taken = set(db.execute(select(models.Item.id).where(models.Item.id.in_(archived))).scalars())
+    for keep_id in (True, False):
+        # Keep the original id unless a new item has taken it meanwhile
+        ids = [item_id for item_id in archived if (item_id in taken) != keep_id]
+        if not ids:
+            continue
+        copied = [column for column in columns if keep_id or column != "id"]
+        db.execute(insert(models.Item).from_select(
+            copied + ["updated_at"],
+            select(*(archive.c[column] for column in copied), literal(now, DateTime)).where(archive.c.id.in_(ids)),
+        ))
+    db.execute(delete(archive).where(archive.c.id.in_(archived)))
+    if commit:
+        db.commit()
+    return len(archived)
+
+
+def _search_filter(model, search: str):
+    search_term = f"%{search}%"
+    return (
+        model.name.ilike(search_term) |
+        model.game.ilike(search_term) |
+        model.set_name.ilike(search_term) |
+        model.brand.ilike(search_term) |
+        model.barcode.ilike(search_term)
+    )
+
+
+ITEM_LIST_SORTS = ("id", "name", "game", "set_name", "brand", "quantity", "location", "price", "created_at", "updated_at")
+
+
+def _item_list_conditions(model, search: str = None, filters: dict = None) -> list:
+    conditions = [_search_filter(model, search)] if search else []
+    for column, value in (filters or {}).items():
+        if value is not None:
+            conditions.append(getattr(model, column) == value)
+    return conditions
+
+
+def _item_list_query(model, search: str = None, filters: dict = None, sort: str = "id", descending: bool = False):
+    stmt = select(model).where(*_item_list_conditions(model, search, filters))
+    sort_column = getattr(model, sort)
+    # Unnamed/unpriced items go last either way; id breaks ties so offset pages never overlap
+    if descending:
+        return stmt.order_by(sort_column.desc().nulls_last(), model.id.desc())
+    return stmt.order_by(sort_column.asc().nulls_last(), model.id)
+
+
+def get_items(db: Session, skip: int = 0, limit: int = 100, search: str = None, include_archived: bool = False,
+              filters: dict = None, sort: str = "id", descending: bool = False):
+    stmt = _item_list_query(models.Item, search, filters, sort, descending)
+    items = db.execute(stmt.offset(skip).limit(limit)).scalars().all()
+    if not include_archived or len(items) >= limit:
+        return items
+
+    # Archived items follow the live ones
+    if items or not skip:
+        hot_count = skip + len(items)
+    else:
+        hot_count = db.execute(select(func.count()).select_from(models.Item).where(
+            *_item_list_conditions(models.Item, search, filters))).scalar()
+    archived = _item_list_query(models.ItemArchive, search, filters, sort, descending)
+    return items + db.execute(archived.offset(max(0, skip - hot_count)).limit(limit - len(items))).scalars().all()
+
+
+def iter_items(db: Session, columns=None, search: str = None, game: str = None, set_name: str = None,
+               location: str = None, batch_id: int = None, min_quantity: int = None,
+               order_by: str = "id", descending: bool = False, limit: int = None, batch_size: int = 1000):
+    """
+    Stream item rows (as mappings) without loading the whole table.
+
+    Rows are fetched ``batch_size`` at a time from a server-side cursor, so
+    memory stays flat however many items match.
+    """
+    columns = columns or [column.name for column in models.Item.__table__.columns]
+    stmt = select(*(getattr(models.Item, name) for name in columns))
+    if search:
+        stmt = stmt.where(_search_filter(models.Item, search))
+    for column, value in (("game", game), ("set_name", set_name), ("location", location), ("batch_id", batch_id)):
+        if value is not None:
+            stmt = stmt.where(getattr(models.Item, column) == value)
+    if min_quantity is not None:
+        stmt = stmt.where(models.Item.quantity >= min_quantity)
+    order_column = getattr(models.Item, order_by)
+    stmt = stmt.order_by(order_column.desc() if descending else order_column, models.Item.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    yield from result.mappings()
+
+
+def get_inventory_stats(db: Session, days: int = 7):
+    """Totals, per-game and per-location breakdowns, and recent scan count"""
+    item = models.Item
+    value = func.coalesce(func.sum(item.quantity * func.coalesce(item.price, 0)), 0)
+    totals = db.execute(select(
+        func.count(item.id),
+        func.count(item.id).filter((item.name.isnot(None)) & (item.name != "")),
+        func.coalesce(func.sum(item.quantity), 0),
+        value,
+    )).one()
+
+    def breakdown(column):
+        rows = db.execute(
+            select(column, func.count(item.id), func.coalesce(func.sum(item.quantity), 0), value)
+            .group_by(column).order_by(func.count(item.id).desc())
+        )
+        return [{"value": row[0], "items": row[1], "quantity": row[2], "total_value": float(row[3])} for row in rows]
+
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    recent_scans = db.execute(
+        select(func.count(models.ScanEvent.id)).where(models.ScanEvent.created_at > since)
+    ).scalar()
+    return {
+        "total_items": totals[0],
+        "named_items": totals[1],
+        "total_quantity": totals[2],
+        "total_value": float(totals[3]),
+        "recent_scans": recent_scans,
+        "recent_scan_days": days,
+        "by_game": breakdown(item.game),
+        "by_location": breakdown(item.location),
+    }
+
+
+def get_recent_scans(db: Session, limit: int = 10, barcode: str = None):
+    """Latest scan events with the scanned item's name, newest first"""
+    stmt = (
+        select(models.ScanEvent.created_at, models.ScanEvent.barcode, models.Item.name)
+        .outerjoin(models.Item, models.Item.barcode == models.ScanEvent.barcode)
+        .order_by(models.ScanEvent.id.desc())
+        .limit(limit)
+    )
+    if barcode:
+        stmt = stmt.where(models.ScanEvent.barcode == barcode)
+    return db.execute(stmt).mappings().all()
+
+
+def get_item_movements(db: Session, item_id: int, limit: int = 100, before_id: int = None):
+    """An item's ledger rows, newest first; page with ``before_id``"""
+    stmt = select(models.StockMovement).where(models.StockMovement.item_id == item_id)
+    if before_id is not None:
+        stmt = stmt.where(models.StockMovement.id < before_id)
+    return db.execute(stmt.order_by(models.StockMovement.id.desc()).limit(limit)).scalars().all()
+
+
+def _snapshot_before(db: Session, at: datetime):
+    return db.execute(
+        select(models.StockSnapshot).where(models.StockSnapshot.taken_at <= at)
+        .order_by(models.StockSnapshot.taken_at.desc()).limit(1)
+    ).scalars().first()
+
+
+def get_quantity_as_of(db: Session, at: datetime, item_id: int = None):
+    """
+    Quantity of one item (or of all stock) at time ``at``: the latest snapshot
+    taken by then plus the movements recorded after it, up to ``at``.
+    """
+    movement = models.StockMovement
+    snapshot = _snapshot_before(db, at)
+    base, after_id = 0, 0
+    if snapshot is not None:
+        after_id = snapshot.last_movement_id
+        if item_id is None:
+            base = snapshot.total_quantity
+        else:
+            base = db.execute(
+                select(models.StockSnapshotItem.quantity)
+                .where(models.StockSnapshotItem.snapshot_id == snapshot.id, models.StockSnapshotItem.item_id == item_id)
+            ).scalar() or 0
+    stmt = select(func.coalesce(func.sum(movement.delta), 0), func.count(movement.id)).where(
+        movement.id > after_id, movement.created_at <= at
+    )
+    if item_id is not None:
+        stmt = stmt.where(movement.item_id == item_id)
+    delta, replayed = db.execute(stmt).one()
+    return {
+        "item_id": item_id,
+        "at": at,
+        "quantity": base + delta,
+        "snapshot_at": snapshot.taken_at if snapshot is not None else None,
+        "movements_replayed": replayed,
+    }
+
+
+def get_sales_per_day(db: Session, start: datetime, end: datetime, item_id: int = None):
+    """Units sold per calendar day (UTC) in ``[start, end)``, zero-filled"""
+    movement = models.StockMovement
+    day = func.date(movement.created_at)
+    stmt = (
+        select(day, -func.sum(movement.delta), func.count(movement.id))
+        .where(movement.reason == "sell", movement.created_at >= start, movement.created_at < end)
+        .group_by(day)
+    )
+    if item_id is not None:
+        stmt = stmt.where(movement.item_id == item_id)
+    sold = {str(row[0]): (row[1], row[2]) for row in db.execute(stmt)}
+    days = []
+    current = start.date()
+    while current < end.date() or (current == end.date() and end.time() != datetime.min.time()):
+        units, sales = sold.get(current.isoformat(), (0, 0))
+        days.append({"day": current, "units": units, "sales": sales})
+        current += timedelta(days=1)
+    return days
+
+
+def create_item(db: Session, reason: str = "adjust", station: str = None, **kwargs):
     db_item = models.Item(**kwargs)
     db.add(db_item)
+    if db_item.quantity:
+        db.flush()
+        _record_quantity_change(db, db_item, db_item.quantity, reason, station)
     db.commit()
     db.refresh(db_item)
+    events.item_saved(db, db_item)
     return db_item
 
 
-def update_item(db: Session, item: models.Item, **kwargs):
-    for key, value in kwargs.items():
-        if hasattr(item, key):
-            setattr(item, key, value)
-    db.commit()
+def update_item(db: Session, item: models.Item, reason: str = "adjust", station: str = None,
+                expected_version: int = None, **kwargs):
+    """Apply ``kwargs`` to ``item``; with ``expected_version`` raises StaleDataError unless it is still current"""
+    def apply():
+        before = item.quantity or 0
+        for key, value in kwargs.items():
+            if hasattr(item, key) and key != "version":
+                setattr(item, key, value)
+        _record_quantity_change(db, item, (item.quantity or 0) - before, reason, station)
+
+    _commit_versioned(db, item, apply, expected_version)
     db.refresh(item)
+    events.item_saved(db, item, fields=kwargs.keys())
     return item
 
 
-def delete_item(db: Session, item_id: int):
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
+def upsert_items(db: Session, rows: list, fields, add_quantity: bool = False):
+    """
+    Insert or update many items by barcode in one executemany and commit.
+
+    Every row must carry the same keys: ``barcode`` plus the ``fields`` being
+    imported; only those fields are overwritten on existing items. A barcode
+    repeated within ``rows`` is applied once, from its last row (with
+    ``add_quantity`` the repeated quantities are added up). With
+    ``add_quantity`` an existing item's quantity is increased instead of replaced.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    by_barcode = {}
+    for row in rows:
+        earlier = by_barcode.pop(row["barcode"], None)
+        if earlier is not None and add_quantity and "quantity" in fields:
+            row = {**row, "quantity": (earlier["quantity"] or 0) + (row["quantity"] or 0)}
+        by_barcode[row["barcode"]] = row
+
+    # Imported barcodes that were archived come back with their history first, in the same transaction
+    restore_archived_items(db, list(by_barcode), commit=False)
+
+    table = models.Item.__table__
+    existing = set(db.scalars(select(table.c.barcode).where(table.c.barcode.in_(list(by_barcode)))))
+    now = datetime.now(timezone.utc)
+    params = [{**row, "created_at": now, "updated_at": now} for row in by_barcode.values()]
+    for row in params:
+        row.setdefault("quantity", 0)
+
+    if "quantity" in fields and existing:
+        # Ledger rows for existing items go first, computed against the quantities being replaced
+        new_quantity = bindparam("new_quantity", type_=Integer)
+        delta = new_quantity if add_quantity else new_quantity - table.c.quantity
+        db.execute(
+            _movements_from(
+                select(table.c.id, delta, literal("import"), literal(None, String), literal(now, DateTime))
+                .where(table.c.barcode == bindparam("match_barcode"), delta != 0)
+            ),
+            [{"match_barcode": row["barcode"], "new_quantity": row["quantity"]}
+             for row in params if row["barcode"] in existing],
+        )
+
+    stmt = insert(table)
+    changes = {field: stmt.excluded[field] for field in fields if field not in ("barcode", "quantity")}
+    if "quantity" in fields:
+        changes["quantity"] = table.c.quantity + stmt.excluded.quantity if add_quantity else stmt.excluded.quantity
+    changes["updated_at"] = stmt.excluded.updated_at
+    changes["version"] = table.c.version + 1
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.barcode], set_=changes).returning(*_ITEM_COLUMNS)
+
+    item_rows = db.execute(stmt, params).all()
+    inserted = [barcode for barcode in by_barcode if barcode not in existing]
+    if inserted:
+        # Opening movements for the items this upsert created
+        db.execute(_movements_from(
+            select(table.c.id, table.c.quantity, literal("import"), literal(None, String), literal(now, DateTime))
+            .where(table.c.barcode.in_(inserted), table.c.quantity != 0)
+        ))
+    if "quantity" in fields:
+        alerts.check_movements(db, now)
+    db.commit()
+    events.items_changed(db, fields=fields, rows=item_rows)
+    return len(rows)
+
+
+def bulk_update_items(db: Session, changes: dict, ids=None, barcodes=None, filters=None, station: str = None):
+    """Apply ``changes`` to every selected item with a single UPDATE; returns the row count"""
+    now = datetime.now(timezone.utc)
+    conditions = []
+    if ids is not None:
+        conditions.append(models.Item.id.in_(ids))
+    if barcodes is not None:
+        conditions.append(models.Item.barcode.in_(barcodes))
+    for column, value in (filters or {}).items():
+        conditions.append(getattr(models.Item, column) == value)
+    if "quantity" in changes:
+        # Same transaction and selection as the UPDATE below, read before it overwrites
+        delta = literal(changes["quantity"], Integer) - models.Item.quantity
+        db.execute(_movements_from(
+            select(models.Item.id, delta, literal("adjust"), literal(station, String), literal(now, DateTime))
+            .where(*conditions, delta != 0)
+        ))
+    stmt = (update(models.Item).values(**changes, updated_at=now, version=models.Item.version + 1)
+            .where(*conditions).returning(*_ITEM_COLUMNS))
+    rows = db.execute(stmt.execution_options(synchronize_session=False)).all()
+    if "quantity" in changes:
+        alerts.check_movements(db, now)
+    db.commit()
+    events.items_changed(db, fields=changes.keys(), rows=rows)
+    return len(rows)
+
+
+def delete_item(db: Session, item_id: int, station: str = None, expected_version: int = None):
+    item = get_item(db, item_id)
     if item:
-        db.delete(item)
-        db.commit()
+        def apply():
+            # Close the item's ledger at zero, so a reused id starts from nothing
+            _record_quantity_change(db, item, -(item.quantity or 0), "delete", station)
+            db.delete(item)
+
+        _commit_versioned(db, item, apply, expected_version)
+        events.item_deleted(db, item_id)
     return item
 
 
-def increment_item_quantity(db: Session, item: models.Item, by: int = 1):
-    item.quantity += by
-    db.commit()
+def increment_item_quantity(db: Session, item: models.Item, by: int = 1, reason: str = "scan", station: str = None):
+    def apply():
+        item.quantity += by
+        _record_quantity_change(db, item, by, reason, station)
+
+    _commit_versioned(db, item, apply)
     db.refresh(item)
+    events.item_saved(db, item, fields=["quantity"])
     return item
 
 
@@ -68,15 +466,20 @@ def create_scan_event(db: Session, barcode: str):
 
 # Batch CRUD operations
 def get_batch(db: Session, batch_id: int):
-    return db.query(models.Batch).filter(models.Batch.id == batch_id).first()
+    return db.execute(_BATCH_BY_ID, {"batch_id": batch_id}).scalars().first()
+
+
+def batch_exists(db: Session, batch_id: int) -> bool:
+    return db.connection().execute(_BATCH_EXISTS, {"batch_id": batch_id}).first() is not None
 
 
 def get_active_batches(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Batch).filter(models.Batch.is_active == True).offset(skip).limit(limit).all()
+    stmt = select(models.Batch).where(models.Batch.is_active.is_(True)).offset(skip).limit(limit)
+    return db.execute(stmt).scalars().all()
 
 
 def get_all_batches(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Batch).offset(skip).limit(limit).all()
+    return db.execute(select(models.Batch).offset(skip).limit(limit)).scalars().all()
 
 
 def create_batch(db: Session, **kwargs):
@@ -87,26 +490,34 @@ def create_batch(db: Session, **kwargs):
     return db_batch
 
 
-def update_batch(db: Session, batch: models.Batch, **kwargs):
-    for key, value in kwargs.items():
-        if hasattr(batch, key):
-            setattr(batch, key, value)
-    db.commit()
+def update_batch(db: Session, batch: models.Batch, expected_version: int = None, **kwargs):
+    def apply():
+        for key, value in kwargs.items():
+            if hasattr(batch, key) and key != "version":
+                setattr(batch, key, value)
+
+    _commit_versioned(db, batch, apply, expected_version)
     db.refresh(batch)
     return batch
 
 
 def delete_batch(db: Session, batch_id: int):
-    batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
+    batch = get_batch(db, batch_id)
     if batch:
-        # Remove batch_id from all items in this batch
-        db.query(models.Item).filter(models.Item.batch_id == batch_id).update({"batch_id": None})
-        db.delete(batch)
-        db.commit()
+        def apply():
+            # Remove batch_id from all items in this batch
+            rows = db.execute(update(models.Item).where(models.Item.batch_id == batch_id)
+                              .values(batch_id=None, version=models.Item.version + 1)
+                              .returning(*_ITEM_COLUMNS)).all()
+            db.delete(batch)
+            return rows
+
+        rows = _commit_versioned(db, batch, apply)
+        events.items_changed(db, fields=["batch_id"], rows=rows)
     return batch
 
 
-def add_item_to_batch(db: Session, barcode: str, batch_id: int, quantity: int = 1):
+def add_item_to_batch(db: Session, barcode: str, batch_id: int, quantity: int = 1, station: str = None):
     """Add an item to a batch and update its location to the batch target location"""
     item = get_item_by_barcode(db, barcode)
     if not item:
@@ -117,12 +528,15 @@ def add_item_to_batch(db: Session, barcode: str, batch_id: int, quantity: int =
         return None
     
     # Update item to be part of the batch and set location to batch target
-    item.batch_id = batch_id
-    item.location = batch.target_location
-    item.quantity += quantity
-    
-    db.commit()
+    def apply():
+        item.batch_id = batch_id
+        item.location = batch.target_location
+        item.quantity += quantity
+        _record_quantity_change(db, item, quantity, "batch", station)
+
+    _commit_versioned(db, item, apply)
     db.refresh(item)
+    events.item_saved(db, item, fields=["batch_id", "location", "quantity"])
     return item
 
 
@@ -132,17 +546,20 @@ def transfer_batch_items(db: Session, batch_id: int):
     if not batch:
         return None
     
-    # Update all items in the batch to have the target location and remove batch_id
-    items_updated = db.query(models.Item).filter(models.Item.batch_id == batch_id).update({
-        "location": batch.target_location,
-        "batch_id": None
-    })
-    
-    # Deactivate the batch
-    batch.is_active = False
-    
-    db.commit()
-    return {"batch": batch, "items_transferred": items_updated}
+    def apply():
+        # Update all items in the batch to have the target location and remove batch_id
+        rows = db.execute(update(models.Item).where(models.Item.batch_id == batch_id).values(
+            location=batch.target_location,
+            batch_id=None,
+            version=models.Item.version + 1,
+        ).returning(*_ITEM_COLUMNS)).all()
+        # Deactivate the batch
+        batch.is_active = False
+        return rows
+
+    rows = _commit_versioned(db, batch, apply)
+    events.items_changed(db, fields=["location", "batch_id"], rows=rows)
+    return {"batch": batch, "items_transferred": len(rows)}
 
 
 def cancel_batch(db: Session, batch_id: int):
@@ -151,22 +568,95 @@ def cancel_batch(db: Session, batch_id: int):
     if not batch:
         return None
     
-    # Remove batch_id from all items in this batch
-    items_updated = db.query(models.Item).filter(models.Item.batch_id == batch_id).update({"batch_id": None})
-    
-    # Deactivate the batch
-    batch.is_active = False
-    
-    db.commit()
-    return {"batch": batch, "items_removed": items_updated}
+    def apply():
+        # Remove batch_id from all items in this batch
+        rows = db.execute(
+            update(models.Item).where(models.Item.batch_id == batch_id).values(batch_id=None,
+                                                                               version=models.Item.version + 1)
+            .returning(*_ITEM_COLUMNS)
+        ).all()
+        # Deactivate the batch
+        batch.is_active = False
+        return rows
+
+    rows = _commit_versioned(db, batch, apply)
+    events.items_changed(db, fields=["batch_id"], rows=rows)
+    return {"batch": batch, "items_removed": len(rows)}
 
 
 def get_batch_items(db: Session, batch_id: int):
     """Get all items in a specific batch"""
-    return db.query(models.Item).filter(models.Item.batch_id == batch_id).all()
+    return db.execute(select(models.Item).where(models.Item.batch_id == batch_id)).scalars().all()
+
+
+# Sort keys for batch item pages; NULLs are folded into a value so keyset comparisons stay total
+BATCH_ITEM_SORTS = {
+    "id": models.Item.id,
+    "name": func.coalesce(models.Item.name, ""),
+    "game": func.coalesce(models.Item.game, ""),
+    "set_name": func.coalesce(models.Item.set_name, ""),
+    "quantity": models.Item.quantity,
+    "price": func.coalesce(models.Item.price, -1),
+    "created_at": models.Item.created_at,
+    "updated_at": models.Item.updated_at,
+}
+
+
+def get_batch_summary(db: Session, batch_id: int):
+    """Batch header plus item count, quantity and value totals per game, in one query"""
+    item = models.Item
+    rows = db.execute(
+        select(
+            models.Batch,
+            item.game,
+            func.count(item.id),
+            func.coalesce(func.sum(item.quantity), 0),
+            func.coalesce(func.sum(item.quantity * func.coalesce(item.price, 0)), 0),
+        )
+        .outerjoin(item, item.batch_id == models.Batch.id)
+        .where(models.Batch.id == batch_id)
+        .group_by(models.Batch.id, item.game)
+        .order_by(func.count(item.id).desc())
+    ).all()
+    if not rows:
+        return None
+    games = [
+        {"game": game, "item_count": count, "total_quantity": quantity, "total_value": float(value)}
+        for _batch, game, count, quantity, value in rows
+        if count
+    ]
+    return {
+        "batch": rows[0][0],
+        "item_count": sum(game["item_count"] for game in games),
+        "total_quantity": sum(game["total_quantity"] for game in games),
+        "total_value": round(sum(game["total_value"] for game in games), 2),
+        "games": games,
+    }
+
+
+def get_batch_items_page(db: Session, batch_id: int, columns, sort: str = "id", descending: bool = False,
+                         after=None, limit: int = 100):
+    """
+    One keyset page of a batch's items as mappings of ``columns``.
+
+    ``after`` is the ``(sort_value, id)`` of the last row of the previous page.
+    Returns up to ``limit + 1`` rows so callers can tell whether more follow.
+    """
+    sort_key = BATCH_ITEM_SORTS[sort]
+    stmt = select(*(getattr(models.Item, name) for name in columns), sort_key.label("sort_key"))
+    stmt = stmt.where(models.Item.batch_id == batch_id)
+    if after is not None:
+        position = tuple_(sort_key, models.Item.id)
+        bound = tuple_(literal(after[0]), literal(after[1]))
+        stmt = stmt.where(position < bound if descending else position > bound)
+    if descending:
+        stmt = stmt.order_by(sort_key.desc(), models.Item.id.desc())
+    else:
+        stmt = stmt.order_by(sort_key, models.Item.id)
+    return db.execute(stmt.limit(limit + 1)).mappings().all()
 
 
 def get_batch_stats(db: Session, batch_id: int):
     """Get statistics for a batch including item count"""
-    item_count = db.query(func.count(models.Item.id)).filter(models.Item.batch_id == batch_id).scalar()
+    item_count = db.connection().execute(_BATCH_ITEM_COUNT, {"batch_id": batch_id}).scalar()
     return {"item_count": item_count}
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import create_engine
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 
@@ -7,18 +8,97 @@ def _is_sqlite(url: str) -> bool:
     return url.startswith("sqlite://")
 
 
+def _is_sqlite_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
 DATABASE_URL = os.getenv("CARD_INV_DB_URL", "sqlite:///./card_inventory.db")
+# Optional replica for non-SQLite backends; SQLite readers open the same file
+READ_DATABASE_URL = os.getenv("CARD_INV_READ_DB_URL") or DATABASE_URL
+READ_POOL_SIZE = int(os.getenv("CARD_INV_READ_POOL_SIZE", str(os.cpu_count() or 4)))
+
+
+def _configure_sqlite(engine, read_only: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # WAL lets readers proceed while a scan is being written
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        else:
+            # query_only rather than a mode=ro URI: ro connections cannot create
+            # the WAL index when no writer currently has the file open
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+
+def create_engines(url: str, read_url: str = None, read_pool_size: int = READ_POOL_SIZE):
+    """The writer engine and the reader engine for one database."""
+    read_url = read_url or url
+    connect_args = {"check_same_thread": False} if _is_sqlite(url) else {}
+    write = create_engine(url, echo=False, future=True, connect_args=connect_args)
+    if _is_sqlite(url) and not _is_sqlite_memory(url):
+        _configure_sqlite(write, read_only=False)
+
+    if read_url == url and _is_sqlite_memory(url):
+        # A private in-memory database cannot be shared with a second engine
+        return write, write
+    read_connect_args = {"check_same_thread": False} if _is_sqlite(read_url) else {}
+    read = create_engine(
+        read_url,
+        echo=False,
+        future=True,
+        connect_args=read_connect_args,
+        pool_size=read_pool_size,
+        max_overflow=read_pool_size,
+    )
+    if _is_sqlite(read_url):
+        _configure_sqlite(read, read_only=True)
+    return write, read
+
+
+def session_factories(write_engine, read_engine, key: str):
+    # Both session factories carry the same database_key so in-memory views of
+    # the inventory are shared between reads and writes of one database
+    return (
+        sessionmaker(bind=write_engine, autoflush=False, autocommit=False, future=True, info={"database_key": key}),
+        sessionmaker(bind=read_engine, autoflush=False, autocommit=False, future=True, info={"database_key": key}),
+    )
+
 
-connect_args = {"check_same_thread": False} if _is_sqlite(DATABASE_URL) else {}
-engine = create_engine(DATABASE_URL, echo=False, future=True, connect_args=connect_args)
+engine, read_engine = create_engines(DATABASE_URL, READ_DATABASE_URL)
+SessionLocal, ReadSessionLocal = session_factories(engine, read_engine, DATABASE_URL)
+# Set per request by the store router (app.tenancy) to an object with its own
+# SessionLocal / ReadSessionLocal; None means the default database above
+current_store = ContextVar("current_store", default=None)
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
+def database_key(db) -> str:
+    """Identify which database a session belongs to (used to key in-memory caches)."""
+    return db.info.get("database_key", DATABASE_URL)
+
+
+def get_write_db():
+    store = current_store.get()
+    db = store.SessionLocal() if store is not None else SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    store = current_store.get()
+    db = store.ReadSessionLocal() if store is not None else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Backwards-compatible alias; writes are the safe default
+get_db = get_write_db
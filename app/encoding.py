@@ -0,0 +1,120 @@
+"""
+MessagePack as an alternative to JSON for scanner stations on slow links.
+
+Routers built with ``route_class=MsgPackRoute`` and
+``default_response_class=NegotiatedResponse`` (items, scan, batches) accept
+request bodies sent as ``Content-Type: application/msgpack`` and answer in
+MessagePack when the ``Accept`` header prefers ``application/msgpack`` over
+JSON. The schema is the same as the JSON one, field for field, timestamps
+included as ISO strings; MessagePack just spends fewer bytes on it and is
+cheaper to produce than ``json.dumps`` (``python benchmarks/encoding.py``).
+Error responses stay JSON.
+
+MessagePack support needs the ``msgpack`` package; without it the API serves
+JSON whatever the ``Accept`` header says and refuses MessagePack bodies with
+415.
+"""
+
+from contextvars import ContextVar
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MSGPACK_MEDIA_TYPE = MSGPACK_TYPES[0]
+JSON_TYPES = ("application/json", "application/*", "*/*")
+
+# Set by MsgPackRoute for the request being handled; read when the response renders
+_respond_msgpack = ContextVar("respond_msgpack", default=False)
+
+
+def _media_type(value: str) -> str:
+    return value.split(";", 1)[0].strip().lower()
+
+
+def accepts_msgpack(accept: str) -> bool:
+    """True when ``accept`` ranks a MessagePack type at least as high as JSON (and above zero)."""
+    if not accept or msgpack is None:
+        return False
+    best_msgpack = best_json = 0.0
+    for entry in accept.split(","):
+        media_type, *params = entry.split(";")
+        media_type = media_type.strip().lower()
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type in MSGPACK_TYPES:
+            best_msgpack = max(best_msgpack, quality)
+        elif media_type in JSON_TYPES:
+            best_json = max(best_json, quality)
+    return best_msgpack > 0 and best_msgpack >= best_json
+
+
+def is_msgpack(content_type: str) -> bool:
+    return bool(content_type) and _media_type(content_type) in MSGPACK_TYPES
+
+
+def packb(content) -> bytes:
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def unpackb(body: bytes):
+    return msgpack.unpackb(body, raw=False)
+
+
+class NegotiatedResponse(JSONResponse):
+    """JSON, or MessagePack of the same content when the route negotiated it."""
+
+    def render(self, content) -> bytes:
+        if _respond_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return packb(content)
+        return super().render(content)
+
+
+async def _as_json_request(request: Request) -> Request:
+    """The request with its MessagePack body decoded, looking like a JSON request to FastAPI."""
+    if msgpack is None:
+        raise HTTPException(status_code=415, detail="MessagePack is not supported by this server")
+    body = await request.body()
+    try:
+        content = unpackb(body)
+    except (ValueError, msgpack.UnpackException) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid MessagePack body ({type(exc).__name__})")
+    scope = dict(request.scope)
+    scope["headers"] = [(name, value) for name, value in request.scope["headers"] if name != b"content-type"]
+    scope["headers"].append((b"content-type", b"application/json"))
+    decoded = Request(scope, request.receive)
+    decoded._body = body
+    decoded._json = content
+    return decoded
+
+
+class MsgPackRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        takes_body = self.body_field is not None
+
+        async def negotiating_handler(request: Request):
+            if takes_body and is_msgpack(request.headers.get("content-type")):
+                request = await _as_json_request(request)
+            token = _respond_msgpack.set(accepts_msgpack(request.headers.get("accept")))
+            try:
+                response = await handler(request)
+            finally:
+                _respond_msgpack.reset(token)
+            response.headers.append("Vary", "Accept")
+            return response
+
+        return negotiating_handler
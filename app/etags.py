@@ -0,0 +1,44 @@
+"""
+ETags for items and batches, taken from their row version.
+
+Responses carrying one item or batch send ``ETag: "<version>"``. A write
+sent with ``If-Match: "<version>"`` only applies while the row is still at
+that version, checked by the UPDATE itself (``crud``), and fails with 412
+otherwise; writes without ``If-Match`` apply unconditionally, as before.
+``GET`` of an item answers 304 to a matching ``If-None-Match``.
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _tags(value: str) -> list:
+    # Weak validators compare like strong ones: the version is the whole representation state
+    return [tag.strip().removeprefix("W/").strip('"') for tag in value.split(",") if tag.strip()]
+
+
+def if_match(request: Request) -> Optional[int]:
+    """The version a write requires, or None without ``If-Match`` (or with ``*``)."""
+    value = request.headers.get("if-match")
+    if not value or value.strip() == "*":
+        return None
+    tags = _tags(value)
+    if len(tags) != 1 or not tags[0].isdigit():
+        raise HTTPException(status_code=400, detail="If-Match must be a single ETag from this API")
+    return int(tags[0])
+
+
+def not_modified(request: Request, version: int) -> bool:
+    value = request.headers.get("if-none-match")
+    if not value:
+        return False
+    return value.strip() == "*" or str(version) in _tags(value)
+
+
+def precondition_failed(what: str) -> HTTPException:
+    return HTTPException(status_code=412, detail=f"{what} was changed by someone else; reload it and try again")
@@ -0,0 +1,245 @@
+"""
+In-process notifications for item writes, and change counters for the writes
+of other processes.
+
+In-memory views of the inventory subscribe here and are kept current by
+``crud`` after each commit, instead of re-querying the database. Listeners
+implement ``item_saved``, ``item_deleted`` and ``items_changed`` and are
+called with the session's ``database_key`` so one process can serve
+several databases.
+
+Events never leave the process, so every transaction that writes a watched
+table also bumps that table's row in ``change_counters`` (just before it
+commits, while it holds the write lock). A view remembers the counter value
+it reflects: a commit of this process whose bump follows on directly from it
+is applied through the events alone, anything else (another worker, the CLI
+importer, an archive run, a restore) shows up as a gap. Views look at the
+counter at most every ``CARD_INV_VIEW_CHECK_SECONDS`` (1) seconds and reload
+when it moved, so they trail writes made elsewhere by at most that long.
+Writes that bypass SQLAlchemy sessions (the sqlite3 shell) are not counted.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from .db import database_key
+
+logger = logging.getLogger(__name__)
+
+VIEW_CHECK_SECONDS = float(os.getenv("CARD_INV_VIEW_CHECK_SECONDS", "1"))
+# Set-based writes naming at most this many items are re-read and applied item by item
+VIEW_REFRESH_LIMIT = int(os.getenv("CARD_INV_VIEW_REFRESH_LIMIT", "1000"))
+# Tables whose writes in-memory views must learn about
+WATCHED_TABLES = ("items", "reorder_points")
+
+_CHANGED = "changed_tables"
+_BUMPED = "bumped_counters"
+_COMMITTED = "committed_counters"
+
+_BUMP_COUNTER = text(
+    "INSERT INTO change_counters (name, value) VALUES (:name, 1) "
+    "ON CONFLICT (name) DO UPDATE SET value = change_counters.value + 1"
+)
+_READ_COUNTER = text("SELECT value FROM change_counters WHERE name = :name")
+
+_listeners = []
+_registries = []
+
+
+def _mark_changed(session, table) -> None:
+    if table is not None and table.name in WATCHED_TABLES:
+        session.info.setdefault(_CHANGED, set()).add(table.name)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, _flush_context) -> None:
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        _mark_changed(session, getattr(obj, "__table__", None))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_changed(orm_execute_state.session, getattr(orm_execute_state.statement, "table", None))
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_counters(session) -> None:
+    # Flush first: pending ORM changes only reach the database (and _track_flush) here
+    session.flush()
+    changed = session.info.pop(_CHANGED, None)
+    if not changed:
+        return
+    bumped = {}
+    for name in sorted(changed):
+        session.execute(_BUMP_COUNTER, {"name": name})
+        bumped[name] = session.execute(_READ_COUNTER, {"name": name}).scalar()
+    session.info[_BUMPED] = bumped
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_counters(session) -> None:
+    session.info[_COMMITTED] = session.info.pop(_BUMPED, {})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_counters(session) -> None:
+    session.info.pop(_CHANGED, None)
+    session.info.pop(_BUMPED, None)
+
+
+def read_counter(db, name: str) -> int:
+    return db.execute(_READ_COUNTER, {"name": name}).scalar() or 0
+
+
+def subscribe(listener) -> None:
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def _notify(key, method: str, *args) -> None:
+    for listener in _listeners:
+        try:
+            getattr(listener, method)(key, *args)
+        except Exception:  # a stale view must never fail the write that triggered it
+            logger.exception("Item listener %r failed in %s", listener, method)
+
+
+def _dispatch(db, method: str, *args) -> None:
+    _notify(database_key(db), method, *args)
+    synced(db)
+
+
+def synced(db) -> None:
+    """
+    The session's last commit is now reflected in the views; call after
+    applying it to them by hand (``item_saved`` and friends do this).
+    """
+    counters = db.info.pop(_COMMITTED, None)
+    if counters:
+        key = database_key(db)
+        for registry in _registries:
+            registry.synced(key, counters)
+
+
+def item_saved(db, item, fields=None) -> None:
+    """An item was created or updated; ``fields`` names the changed columns (None = unknown)."""
+    _dispatch(db, "item_saved", item, set(fields) if fields is not None else None)
+
+
+def item_deleted(db, item_id: int) -> None:
+    _dispatch(db, "item_deleted", item_id)
+
+
+def items_changed(db, fields=None, rows=None) -> None:
+    """
+    A set-based statement touched many items. Views keeping item rows
+    (``uses_items``) apply the touched ``rows``, as returned by the statement,
+    like ``item_saved``; without rows, or beyond ``CARD_INV_VIEW_REFRESH_LIMIT``
+    of them, and for the other views, those depending on ``fields`` invalidate.
+    """
+    if rows is not None and len(rows) > VIEW_REFRESH_LIMIT:
+        rows = None
+    _dispatch(db, "items_changed", set(fields) if fields is not None else None, rows)
+
+
+def drop_views(key) -> None:
+    """Release every in-memory view of one database."""
+    for registry in _registries:
+        registry.drop(key)
+
+
+class ViewRegistry:
+    """
+    One lazily loaded in-memory view per database, kept current by item events
+    and reloaded when the ``counter`` table changes in another process.
+
+    Views provide ``load(db)``, ``upsert_item(item, fields)``,
+    ``remove(item_id)`` and ``invalidate(fields)``, plus a ``lock`` held
+    while loading, ``loaded`` / ``stale`` flags and ``uses_items``: whether
+    set-based writes should hand it their rows rather than invalidate it.
+    """
+
+    def __init__(self, factory, counter: str = "items", check_seconds: float = VIEW_CHECK_SECONDS):
+        self._factory = factory
+        self.counter = counter
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._views = {}
+        # Per database: [counter value the view reflects, when it was last compared]
+        self._synced = {}
+        subscribe(self)
+        _registries.append(self)
+
+    def get(self, db):
+        key = database_key(db)
+        with self._lock:
+            view = self._views.get(key)
+            if view is None:
+                view = self._views[key] = self._factory()
+                self._synced[key] = [None, 0.0]
+            synced = self._synced[key]
+        now = time.monotonic()
+        if view.loaded and not view.stale and now - synced[1] >= self.check_seconds:
+            synced[1] = now
+            if read_counter(db, self.counter) != synced[0]:
+                view.stale = True
+        if not view.loaded or view.stale:
+            with view.lock:
+                if not view.loaded or view.stale:
+                    # Read before loading: a write landing in between only causes one more reload
+                    value = read_counter(db, self.counter)
+                    view.load(db)
+                    synced[:] = [value, time.monotonic()]
+        return view
+
+    def synced(self, key, counters: dict) -> None:
+        """This process committed ``counters`` and has applied the write to its views."""
+        value = counters.get(self.counter)
+        view = self._views.get(key)
+        if value is None or view is None:
+            return
+        with view.lock:
+            synced = self._synced.get(key)
+            if synced is None:
+                return
+            if synced[0] is not None and synced[0] == value - 1:
+                synced[0] = value
+            else:
+                # Another process wrote in between (or this commit overtook one of ours)
+                view.stale = True
+
+    def views(self) -> dict:
+        return dict(self._views)
+
+    def drop(self, key) -> None:
+        """Forget the view of a database that was closed (it is rebuilt on next use)."""
+        with self._lock:
+            self._views.pop(key, None)
+            self._synced.pop(key, None)
+
+    def item_saved(self, key, item, fields) -> None:
+        view = self._views.get(key)
+        if view is not None:
+            view.upsert_item(item, fields)
+
+    def item_deleted(self, key, item_id) -> None:
+        view = self._views.get(key)
+        if view is not None:
+            view.remove(item_id)
+
+    def items_changed(self, key, fields, rows=None) -> None:
+        view = self._views.get(key)
+        if view is None:
+            return
+        if rows is not None and view.uses_items:
+            for row in rows:
+                view.upsert_item(row, fields)
+        else:
+            view.invalidate(fields)
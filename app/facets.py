@@ -0,0 +1,288 @@
+"""
+Columnar in-memory snapshot of the items table for faceted search.
+
+Facet columns (game, set_name, brand, location) are dictionary-encoded, and
+every distinct combination of their codes is a "cell" with running count,
+quantity and value totals. Without a search term a facet query only touches
+the cells (a few thousand at most, however many items there are); with one,
+the matching rows are folded into cells with a single ``bincount``. Either
+way the per-facet counts are vectorized masks over the cell arrays instead
+of one GROUP BY per facet.
+
+The snapshot is loaded lazily on the first facet query and then kept current
+through ``events`` as crud commits writes. Text search scans one joined,
+lower-cased string of all rows at C speed (and remembers the result per
+term); rows written since that string was built are checked individually
+until enough of them accumulate to rebuild it.
+
+Each process keeps its own snapshot. Writes made by other processes (another
+worker, the CLI importer, an archive run, a restore) never reach it as
+events; they are noticed through the ``items`` change counter, checked at most
+every ``CARD_INV_VIEW_CHECK_SECONDS``, and the snapshot is then reloaded.
+"""
+
+import re
+import threading
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+FACETS = ("game", "set_name", "brand", "location")
+SEARCH_FIELDS = ("name", "game", "set_name", "brand", "barcode")
+
+_INITIAL_CAPACITY = 1024
+_LOAD_BATCH = 10000
+_MAX_DIRTY_ROWS = 5000
+_MAX_CACHED_TERMS = 64
+_SEPARATOR = "\x00"
+
+
+class _Dictionary:
+    """Maps facet values to small integer codes; code 0 is NULL."""
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def encode(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+def _grown(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros(capacity, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class InventorySnapshot:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.stale = False
+        self.uses_items = True
+        self._reset()
+
+    def _reset(self) -> None:
+        self.dictionaries = {facet: _Dictionary() for facet in FACETS}
+
+        # Per row (one row per item id ever seen; deleted rows stay dead)
+        self.size = 0
+        self.row_of = {}
+        self.row_cell = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self.quantity = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.value_cents = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.alive = np.zeros(_INITIAL_CAPACITY, dtype=bool)
+        self.texts = []
+
+        # Per cell (distinct facet-code combination)
+        self.cell_of = {}
+        self.cell_codes = {facet: np.zeros(_INITIAL_CAPACITY, dtype=np.int32) for facet in FACETS}
+        self.cell_count = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.cell_quantity = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.cell_value_cents = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+
+        self._blob = None
+        self._blob_offsets = None
+        self._blob_masks = {}
+        self._dirty = set()
+
+    # -- maintenance -------------------------------------------------------
+
+    def _cell(self, values: dict) -> int:
+        key = tuple(self.dictionaries[facet].encode(values[facet]) for facet in FACETS)
+        cell = self.cell_of.get(key)
+        if cell is None:
+            cell = len(self.cell_of)
+            if cell == len(self.cell_count):
+                capacity = cell * 2
+                self.cell_codes = {facet: _grown(codes, capacity) for facet, codes in self.cell_codes.items()}
+                self.cell_count = _grown(self.cell_count, capacity)
+                self.cell_quantity = _grown(self.cell_quantity, capacity)
+                self.cell_value_cents = _grown(self.cell_value_cents, capacity)
+            for facet, code in zip(FACETS, key):
+                self.cell_codes[facet][cell] = code
+            self.cell_of[key] = cell
+        return cell
+
+    def _retract(self, row: int) -> None:
+        """Remove a live row's contribution from its cell totals."""
+        cell = self.row_cell[row]
+        self.cell_count[cell] -= 1
+        self.cell_quantity[cell] -= self.quantity[row]
+        self.cell_value_cents[cell] -= self.value_cents[row]
+        self.alive[row] = False
+
+    def _upsert(self, values: dict) -> None:
+        row = self.row_of.get(values["id"])
+        if row is None:
+            if self.size == len(self.quantity):
+                capacity = self.size * 2
+                self.row_cell = _grown(self.row_cell, capacity)
+                self.quantity = _grown(self.quantity, capacity)
+                self.value_cents = _grown(self.value_cents, capacity)
+                self.alive = _grown(self.alive, capacity)
+            row = self.size
+            self.size += 1
+            self.row_of[values["id"]] = row
+        elif self.alive[row]:
+            self._retract(row)
+
+        cell = self._cell(values)
+        quantity = values["quantity"] or 0
+        price_cents = int(round(float(values["price"]) * 100)) if values["price"] is not None else 0
+        self.row_cell[row] = cell
+        self.quantity[row] = quantity
+        self.value_cents[row] = quantity * price_cents
+        self.alive[row] = True
+        self.cell_count[cell] += 1
+        self.cell_quantity[cell] += quantity
+        self.cell_value_cents[cell] += quantity * price_cents
+
+        text = _SEPARATOR.join((values[field] or "") for field in SEARCH_FIELDS).lower()
+        if row < len(self.texts):
+            self.texts[row] = text
+        else:
+            self.texts.append(text)
+        self._dirty.add(row)
+
+    def load(self, db: Session) -> None:
+        columns = [models.Item.id, models.Item.quantity, models.Item.price]
+        columns += [getattr(models.Item, name) for name in set(FACETS) | set(SEARCH_FIELDS)]
+        with self.lock:
+            self._reset()
+            result = db.execute(select(*columns).execution_options(yield_per=_LOAD_BATCH))
+            for row in result.mappings():
+                self._upsert(row)
+            self._build_blob()
+            self.loaded = True
+            self.stale = False
+
+    def upsert_item(self, item, fields=None) -> None:
+        values = {name: getattr(item, name) for name in ("id", "quantity", "price") + FACETS + SEARCH_FIELDS}
+        with self.lock:
+            # Waits out a load in progress; an unloaded snapshot will read the row itself
+            if self.loaded:
+                self._upsert(values)
+
+    def remove(self, item_id: int) -> None:
+        with self.lock:
+            row = self.row_of.pop(item_id, None)
+            if row is not None and self.alive[row]:
+                self._retract(row)
+
+    def invalidate(self, fields=None) -> None:
+        tracked = set(FACETS) | set(SEARCH_FIELDS) | {"quantity", "price"}
+        if fields is None or fields & tracked:
+            self.stale = True
+
+    # -- search ------------------------------------------------------------
+
+    def _build_blob(self) -> None:
+        texts = self.texts[:self.size]
+        lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=len(texts))
+        self._blob_offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self._blob = _SEPARATOR.join(texts)
+        self._blob_masks = {}
+        self._dirty = set()
+
+    def _blob_mask(self, term: str) -> np.ndarray:
+        # Only depends on the blob, so it stays valid across writes until a rebuild
+        mask = self._blob_masks.get(term)
+        if mask is None:
+            mask = np.zeros(len(self._blob_offsets) - 1, dtype=bool)
+            positions = [match.start() for match in re.finditer(re.escape(term), self._blob)]
+            if positions:
+                rows = np.searchsorted(self._blob_offsets, np.asarray(positions, dtype=np.int64), side="right") - 1
+                mask[rows] = True
+            if len(self._blob_masks) >= _MAX_CACHED_TERMS:
+                self._blob_masks.pop(next(iter(self._blob_masks)))
+            self._blob_masks[term] = mask
+        return mask
+
+    def _search_rows(self, term: str) -> np.ndarray:
+        if len(self._dirty) > _MAX_DIRTY_ROWS:
+            self._build_blob()
+        blob_mask = self._blob_mask(term)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[:len(blob_mask)] = blob_mask
+        for row in self._dirty:
+            mask[row] = term in self.texts[row]
+        mask &= self.alive[:self.size]
+        return np.flatnonzero(mask)
+
+    # -- queries -----------------------------------------------------------
+
+    def query(self, filters: dict, search: str = None) -> dict:
+        with self.lock:
+            cells = len(self.cell_of)
+            term = (search or "").strip().lower().replace(_SEPARATOR, "")
+            if term:
+                rows = self._search_rows(term)
+                row_cells = self.row_cell[rows]
+                count = np.bincount(row_cells, minlength=cells)
+                quantity = np.bincount(row_cells, weights=self.quantity[rows], minlength=cells).astype(np.int64)
+                value = np.bincount(row_cells, weights=self.value_cents[rows], minlength=cells).astype(np.int64)
+            else:
+                count = self.cell_count[:cells]
+                quantity = self.cell_quantity[:cells]
+                value = self.cell_value_cents[:cells]
+
+            filter_masks = {}
+            for facet, wanted in filters.items():
+                if wanted is None:
+                    continue
+                code = self.dictionaries[facet].codes.get(wanted)
+                if code is None:
+                    filter_masks[facet] = np.zeros(cells, dtype=bool)
+                else:
+                    filter_masks[facet] = self.cell_codes[facet][:cells] == code
+
+            selected = np.ones(cells, dtype=bool)
+            for mask in filter_masks.values():
+                selected &= mask
+
+            facets = {}
+            for facet in FACETS:
+                # Each facet ignores its own filter so the alternatives stay visible
+                mask = np.ones(cells, dtype=bool)
+                for other, other_mask in filter_masks.items():
+                    if other != facet:
+                        mask &= other_mask
+                codes = self.cell_codes[facet][:cells][mask]
+                size = len(self.dictionaries[facet].values)
+                counts = np.bincount(codes, weights=count[mask], minlength=size).astype(np.int64)
+                quantities = np.bincount(codes, weights=quantity[mask], minlength=size)
+                values = np.bincount(codes, weights=value[mask], minlength=size)
+                nonzero = np.flatnonzero(counts)
+                order = nonzero[np.argsort(-counts[nonzero], kind="stable")]
+                facets[facet] = [
+                    {
+                        "value": self.dictionaries[facet].values[code],
+                        "count": int(counts[code]),
+                        "quantity": int(quantities[code]),
+                        "total_value": float(values[code]) / 100,
+                    }
+                    for code in order
+                ]
+
+            return {
+                "count": int(count[selected].sum()),
+                "quantity": int(quantity[selected].sum()),
+                "total_value": int(value[selected].sum()) / 100,
+                "facets": facets,
+            }
+
+
+snapshots = events.ViewRegistry(InventorySnapshot)
+
+
+def facet_counts(db: Session, search: str = None, **filters) -> dict:
+    return snapshots.get(db).query(filters, search=search)
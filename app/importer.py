@@ -0,0 +1,167 @@
+"""
+Streaming bulk import of catalog rows (CSV or NDJSON) with upsert by barcode.
+
+The request body is decoded and split into records as it arrives, so memory
+use is bounded by one chunk of rows regardless of upload size. Each chunk is
+validated, upserted with a single ``executemany`` and committed in the
+threadpool before the next one is read, keeping the event loop free.
+"""
+
+import codecs
+import csv
+import json
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import crud, schemas
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+async def _iter_lines(stream):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _iter_csv(stream):
+    """Yield ``(row_number, dict)``; quoted fields may span lines."""
+    header = None
+    record = ""
+    row_number = 0
+    async for line in _iter_lines(stream):
+        record += line
+        if record.count('"') % 2:
+            continue  # inside a quoted field that continues on the next line
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [value.strip().lower() for value in values]
+            continue
+        row_number += 1
+        yield row_number, dict(zip(header, values))
+    if record.strip():
+        row_number += 1
+        yield row_number, ValueError("Unterminated quoted field")
+
+
+async def _iter_ndjson(stream):
+    row_number = 0
+    async for line in _iter_lines(stream):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield row_number, ValueError(f"Invalid JSON: {exc}")
+            continue
+        if not isinstance(row, dict):
+            yield row_number, ValueError("Each line must be a JSON object")
+            continue
+        yield row_number, row
+
+
+def _validate(raw: dict, fields: tuple) -> dict:
+    missing = [field for field in fields if field not in raw]
+    if missing:
+        # A missing key would overwrite the stored value with NULL
+        raise ValueError(f"missing {', '.join(missing)} (every row must carry the columns of the first row)")
+    data = {}
+    for field in fields:
+        value = raw.get(field)
+        if isinstance(value, str):
+            value = value.strip() or None
+        data[field] = value
+    if not data.get("barcode"):
+        raise ValueError("barcode is required")
+    item = schemas.ItemCreate(**data)
+    if item.quantity is not None and item.quantity < 0:
+        raise ValueError("Quantity cannot be negative")
+    row = {field: getattr(item, field) for field in fields}
+    if row.get("quantity") is None and "quantity" in fields:
+        row["quantity"] = 0
+    if row.get("price") is not None:
+        row["price"] = float(row["price"])
+    return row
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in exc.errors())
+    return str(exc)
+
+
+def _import_chunk(db: Session, records: list, fields: tuple, add_quantity: bool) -> tuple:
+    """Validate and upsert one chunk (runs in the threadpool). Returns ``(imported, errors)``."""
+    rows = []
+    row_numbers = []
+    errors = []
+    for row_number, raw in records:
+        try:
+            rows.append(_validate(raw, fields))
+            row_numbers.append(row_number)
+        except (ValidationError, ValueError, TypeError) as exc:
+            errors.append((row_number, exc))
+    if not rows:
+        return 0, errors
+    try:
+        return crud.upsert_items(db, rows, fields, add_quantity=add_quantity), errors
+    except SQLAlchemyError as exc:
+        # Earlier chunks stay committed; report the whole failed chunk
+        db.rollback()
+        reason = getattr(exc, "orig", None) or exc
+        error = ValueError(f"rows {row_numbers[0]}-{row_numbers[-1]} not imported: {reason}")
+        return 0, errors + [(row_number, error) for row_number in row_numbers]
+
+
+async def import_stream(stream, db: Session, fmt: str, add_quantity: bool = False,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    records = _iter_csv(stream) if fmt == "csv" else _iter_ndjson(stream)
+    summary = {"rows_read": 0, "rows_imported": 0, "rows_failed": 0, "chunks": 0, "errors": []}
+    fields = None
+    chunk = []
+
+    def fail(row_number, exc):
+        summary["rows_failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"row": row_number, "error": _error_message(exc)})
+
+    async def flush():
+        if chunk:
+            imported, errors = await run_in_threadpool(_import_chunk, db, list(chunk), fields, add_quantity)
+            summary["rows_imported"] += imported
+            summary["chunks"] += 1
+            for row_number, exc in errors:
+                fail(row_number, exc)
+            chunk.clear()
+
+    async for row_number, raw in records:
+        summary["rows_read"] += 1
+        if isinstance(raw, Exception):
+            fail(row_number, raw)
+            continue
+        if fields is None:
+            # The first row fixes which columns this import sets
+            fields = tuple(field for field in crud.IMPORT_FIELDS if field in raw)
+            if "barcode" not in fields:
+                fields = ("barcode",) + fields
+        chunk.append((row_number, raw))
+        if len(chunk) >= chunk_size:
+            await flush()
+    await flush()
+    return summary
@@ -0,0 +1,221 @@
+"""
+Stock movement ledger: snapshots and reconciliation.
+
+Every quantity change appends a ``stock_movements`` row in the same
+transaction (``crud._record_quantity_change``), so an item's movements sum
+to its ``items.quantity``. Snapshots record every item's quantity after a
+given movement id; "quantity as of T" then reads the latest snapshot before
+T plus the movements after it instead of replaying the whole ledger. Each
+snapshot is built from the previous one and the movements since.
+
+With ``CARD_INV_SNAPSHOT_INTERVAL_HOURS`` set (default 24) the app takes a
+snapshot on that schedule and keeps the newest ``CARD_INV_SNAPSHOT_KEEP``.
+``python -m app.ledger check`` compares the ledger with ``items.quantity``;
+``rebuild`` appends ``reconcile`` movements for any difference (history is
+never rewritten), chunk by chunk.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, bindparam, delete, func, select, text
+
+from . import models
+from .db import SessionLocal
+
+SNAPSHOT_INTERVAL_HOURS = float(os.getenv("CARD_INV_SNAPSHOT_INTERVAL_HOURS", "24"))
+SNAPSHOT_KEEP = int(os.getenv("CARD_INV_SNAPSHOT_KEEP", "30"))
+RECONCILE_CHUNK = 5000
+RECONCILE_PAUSE = 0.05
+
+# Previous snapshot plus the movements since; zero rows are left out
+_SNAPSHOT_ITEMS_SQL = text("""
+INSERT INTO stock_snapshot_items (snapshot_id, item_id, quantity)
+SELECT :snapshot_id, item_id, SUM(quantity) FROM (
+    SELECT item_id, quantity FROM stock_snapshot_items WHERE snapshot_id = :previous_id
+    UNION ALL
+    SELECT item_id, delta FROM stock_movements WHERE id > :after_id AND id <= :upto_id
+) AS changes
+GROUP BY item_id
+HAVING SUM(quantity) != 0
+""")
+
+# Items (live or archived) in one id range whose ledger does not sum to their quantity
+_DIFFERENCES_SQL = """
+SELECT ids.item_id, COALESCE(i.quantity, a.quantity, 0) - COALESCE(m.total, 0) AS difference
+FROM (
+    SELECT id AS item_id FROM items WHERE id >= :lo AND id < :hi
+    UNION SELECT id FROM items_archive WHERE id >= :lo AND id < :hi
+    UNION SELECT DISTINCT item_id FROM stock_movements WHERE item_id >= :lo AND item_id < :hi
+) AS ids
+LEFT JOIN items i ON i.id = ids.item_id
+LEFT JOIN items_archive a ON a.id = ids.item_id AND i.id IS NULL
+LEFT JOIN (
+    SELECT item_id, SUM(delta) AS total FROM stock_movements
+    WHERE item_id >= :lo AND item_id < :hi GROUP BY item_id
+) AS m ON m.item_id = ids.item_id
+WHERE COALESCE(i.quantity, a.quantity, 0) != COALESCE(m.total, 0)
+"""
+
+
+def take_snapshot(db) -> models.StockSnapshot:
+    """Record every item's quantity as of the latest movement, in one transaction."""
+    previous = db.execute(
+        select(models.StockSnapshot.id, models.StockSnapshot.last_movement_id)
+        .order_by(models.StockSnapshot.last_movement_id.desc()).limit(1)
+    ).first() or (0, 0)
+    db.rollback()
+    # The INSERT takes the write lock: no movement can commit between reading the
+    # high-water mark and the timestamp below, so both describe the same moment
+    snapshot = models.StockSnapshot(taken_at=datetime.now(timezone.utc), last_movement_id=0)
+    db.add(snapshot)
+    db.flush()
+    snapshot.taken_at = datetime.now(timezone.utc)
+    snapshot.last_movement_id = db.execute(select(func.coalesce(func.max(models.StockMovement.id), 0))).scalar()
+    db.execute(_SNAPSHOT_ITEMS_SQL, {
+        "snapshot_id": snapshot.id,
+        "previous_id": previous[0],
+        "after_id": previous[1],
+        "upto_id": snapshot.last_movement_id,
+    })
+    item_count, total = db.execute(
+        select(func.count(), func.coalesce(func.sum(models.StockSnapshotItem.quantity), 0))
+        .where(models.StockSnapshotItem.snapshot_id == snapshot.id)
+    ).one()
+    snapshot.item_count = item_count
+    snapshot.total_quantity = total
+    db.commit()
+    return snapshot
+
+
+def prune_snapshots(db, keep: int = SNAPSHOT_KEEP) -> int:
+    """Delete all but the newest ``keep`` snapshots; returns how many were removed."""
+    old_ids = db.execute(
+        select(models.StockSnapshot.id).order_by(models.StockSnapshot.id.desc()).offset(keep)
+    ).scalars().all()
+    db.rollback()
+    for snapshot_id in old_ids:
+        db.execute(delete(models.StockSnapshotItem).where(models.StockSnapshotItem.snapshot_id == snapshot_id))
+        db.execute(delete(models.StockSnapshot).where(models.StockSnapshot.id == snapshot_id))
+        db.commit()
+    return len(old_ids)
+
+
+def _max_item_id(db) -> int:
+    return max(
+        db.execute(select(func.coalesce(func.max(models.Item.id), 0))).scalar(),
+        db.execute(select(func.coalesce(func.max(models.ItemArchive.id), 0))).scalar(),
+        db.execute(select(func.coalesce(func.max(models.StockMovement.item_id), 0))).scalar(),
+    )
+
+
+def reconcile(db, apply: bool = False, chunk_size: int = RECONCILE_CHUNK, pause: float = RECONCILE_PAUSE) -> dict:
+    """
+    Compare each item's ledger sum with its quantity, ``chunk_size`` ids at a time.
+
+    With ``apply`` each difference gets a ``reconcile`` movement; the check is
+    repeated inside the writing transaction so concurrent changes are not
+    corrected twice.
+    """
+    checked_through = _max_item_id(db)
+    db.rollback()
+    items, units = 0, 0
+    for lo in range(0, checked_through + 1, chunk_size):
+        params = {"lo": lo, "hi": lo + chunk_size}
+        if not apply:
+            rows = db.execute(text(_DIFFERENCES_SQL), params).all()
+            db.rollback()
+        else:
+            now = datetime.now(timezone.utc)
+            # INSERT first: holding the write lock, the differences cannot change before we fix them
+            db.execute(text(
+                "INSERT INTO stock_movements (item_id, delta, reason, created_at) "
+                f"SELECT item_id, difference, 'reconcile', :now FROM ({_DIFFERENCES_SQL}) AS differences"
+            ).bindparams(bindparam("now", type_=DateTime)), {**params, "now": now})
+            rows = db.execute(
+                select(models.StockMovement.item_id, models.StockMovement.delta)
+                .where(models.StockMovement.reason == "reconcile", models.StockMovement.created_at == now,
+                       models.StockMovement.item_id >= lo, models.StockMovement.item_id < lo + chunk_size)
+            ).all()
+            db.commit()
+            time.sleep(pause)
+        items += len(rows)
+        units += sum(abs(row[1]) for row in rows)
+    return {"items_off": items, "units_off": units, "applied": apply}
+
+
+class SnapshotScheduler:
+    """Background thread taking a ledger snapshot every ``interval_hours``."""
+
+    def __init__(self, interval_hours: float = SNAPSHOT_INTERVAL_HOURS, keep: int = SNAPSHOT_KEEP):
+        self.interval = interval_hours * 3600
+        self.keep = keep
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="ledger-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        from . import tenancy
+
+        while not self._stop.wait(self.interval):
+            for store_id, _url, session_factory in tenancy.each_database():
+                where = f" in store {store_id}" if store_id else ""
+                db = session_factory()
+                try:
+                    snapshot = take_snapshot(db)
+                    prune_snapshots(db, self.keep)
+                    print(f"Stock snapshot {snapshot.id}{where}: {snapshot.item_count} items, "
+                          f"{snapshot.total_quantity} units")
+                except Exception as exc:
+                    print(f"Stock snapshot failed{where}: {exc}")
+                finally:
+                    db.close()
+
+
+scheduler = SnapshotScheduler()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ledger", description="Stock movement ledger maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    snapshot = sub.add_parser("snapshot", help="Take a snapshot now")
+    snapshot.add_argument("--keep", type=int, default=None, help="Also prune to this many snapshots")
+    sub.add_parser("check", help="Report items whose ledger does not match their quantity")
+    rebuild = sub.add_parser("rebuild", help="Append reconcile movements so the ledger matches items.quantity")
+    rebuild.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "snapshot":
+            taken = take_snapshot(db)
+            print(f"Snapshot {taken.id} after movement {taken.last_movement_id}: "
+                  f"{taken.item_count} items, {taken.total_quantity} units")
+            if args.keep is not None:
+                print(f"Removed {prune_snapshots(db, args.keep)} old snapshot(s)")
+        elif args.command == "check":
+            report = reconcile(db)
+            print(f"{report['items_off']} item(s) off by {report['units_off']} unit(s) in total")
+            return 1 if report["items_off"] else 0
+        elif args.command == "rebuild":
+            report = reconcile(db, apply=True, chunk_size=args.chunk_size)
+            print(f"Reconciled {report['items_off']} item(s), {report['units_off']} unit(s)")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
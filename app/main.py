@@ -1,18 +1,26 @@
+import os
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from .db import Base, engine
+from . import admission, alerts, archive, backup, capture, ledger, profiling, serve, singleflight, tenancy
+from .db import engine, read_engine
+from .migrations import ensure_schema
 from .routes import items as items_routes
 from .routes import scan as scan_routes
 from .routes import batches as batches_routes
+from .routes import admin as admin_routes
+from .routes import stock as stock_routes
+from .routes import alerts as alerts_routes
 
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 STATIC_DIR = PROJECT_ROOT / "app" / "static"
 INDEX_HTML = STATIC_DIR / "index.html"
+# Off in the workers of a multi-worker launch (app.serve), whose supervisor runs them once
+RUN_SCHEDULERS = os.getenv("CARD_INV_SCHEDULERS", "1") != "0"
 
 app = FastAPI(title="Card Inventory")
 
@@ -27,11 +35,54 @@ app.add_middleware(
 app.include_router(items_routes.router)
 app.include_router(scan_routes.router)
 app.include_router(batches_routes.router)
+app.include_router(stock_routes.router)
+app.include_router(alerts_routes.router)
+app.include_router(admin_routes.router)
+
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware)
+
+profiling.install(app, [engine, read_engine])
+
+if singleflight.SINGLE_FLIGHT_ENABLED:
+    # Outside admission control and profiling: requests that share a response take no slot
+    app.add_middleware(singleflight.SingleFlightMiddleware)
+
+if capture.enabled():
+    # Outside admission control, so rejected requests are recorded too
+    app.add_middleware(capture.CaptureMiddleware)
+
+if tenancy.enabled():
+    # Outermost, so the other middlewares see paths with the /stores/<id> prefix removed
+    app.add_middleware(tenancy.StoreMiddleware)
 
 
 @app.on_event("startup")
 def on_startup() -> None:
-    Base.metadata.create_all(bind=engine)
+    # Creates a fresh database, otherwise refuses to start on an outdated schema
+    ensure_schema(engine, auto_upgrade=os.getenv("CARD_INV_AUTO_MIGRATE") == "1")
+    serve.configure_threadpool()
+    if RUN_SCHEDULERS:
+        backup.scheduler.start()
+        archive.scheduler.start()
+        ledger.scheduler.start()
+    alerts.webhook.start()
+    if tenancy.enabled():
+        tenancy.router.start()
+    if capture.enabled():
+        capture.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    backup.scheduler.stop()
+    archive.scheduler.stop()
+    ledger.scheduler.stop()
+    alerts.webhook.stop()
+    if tenancy.enabled():
+        tenancy.router.stop()
+    if capture.enabled():
+        capture.stop()
 
 
 @app.get("/health")
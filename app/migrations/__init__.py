@@ -0,0 +1,37 @@
+"""
+Schema migrations for the card inventory database.
+
+Add a migration by creating ``mNNNN_<name>.py`` with ``VERSION``, ``NAME``
+and ``upgrade(ctx)`` and appending it to ``MIGRATIONS``. Run pending
+migrations with ``python -m app.migrations upgrade``.
+"""
+
+from . import (
+    m0001_baseline,
+    m0002_items_archive,
+    m0003_items_batch_index,
+    m0004_stock_ledger,
+    m0005_stock_alerts,
+    m0006_row_versions,
+    m0007_change_counters,
+)
+from .runner import (
+    SchemaVersionError,
+    MigrationContext,
+    current_version,
+    head_version,
+    pending_migrations,
+    stamp,
+    upgrade,
+    ensure_schema,
+)
+
+MIGRATIONS = [
+    m0001_baseline,
+    m0002_items_archive,
+    m0003_items_batch_index,
+    m0004_stock_ledger,
+    m0005_stock_alerts,
+    m0006_row_versions,
+    m0007_change_counters,
+]
@@ -0,0 +1,47 @@
+"""
+Command line entry point: ``python -m app.migrations [status|upgrade|stamp]``.
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import create_engine
+
+from ..db import DATABASE_URL
+from .runner import DEFAULT_BATCH_SIZE, DEFAULT_PAUSE, current_version, head_version, pending_migrations, stamp, upgrade
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrations", description="Card inventory schema migrations")
+    parser.add_argument("--db-url", default=DATABASE_URL, help="Database URL (default: CARD_INV_DB_URL)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="Show current and pending schema versions")
+
+    up = sub.add_parser("upgrade", help="Apply pending migrations (resumable)")
+    up.add_argument("--to", type=int, default=None, help="Stop at this version")
+    up.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per copy/backfill batch")
+    up.add_argument("--pause", type=float, default=DEFAULT_PAUSE, help="Seconds to sleep between batches")
+
+    st = sub.add_parser("stamp", help="Record a version as applied without running migrations")
+    st.add_argument("version", type=int, nargs="?", default=None)
+
+    args = parser.parse_args(argv)
+    engine = create_engine(args.db_url, future=True)
+
+    if args.command == "status":
+        print(f"Current version: {current_version(engine)}")
+        print(f"Head version:    {head_version()}")
+        for module in pending_migrations(engine):
+            print(f"  pending {module.VERSION:04d} {module.NAME}")
+    elif args.command == "upgrade":
+        version = upgrade(engine, target=args.to, batch_size=args.batch_size, pause=args.pause)
+        print(f"Database is at version {version}")
+    elif args.command == "stamp":
+        stamp(engine, args.version)
+        print(f"Database stamped at version {current_version(engine)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Bring any pre-versioning database up to the baseline schema.
+
+This folds in what ``migrate_db.py``, ``migrate_brand.py`` and
+``migrate_batch_system.py`` used to do:
+
+- drop the old ``condition`` column (online table rebuild)
+- rename ``number_in_set`` to ``brand``
+- add ``price``, ``description`` and ``batch_id``
+- create the ``batches`` and ``scan_events`` tables
+- normalize item locations to 'Storage' / 'Show'
+"""
+
+import sqlite3
+
+VERSION = 1
+NAME = "baseline"
+
+BATCHES_SQL = """
+CREATE TABLE batches (
+    id INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    target_location VARCHAR(64) NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+)
+"""
+
+SCAN_EVENTS_SQL = """
+CREATE TABLE scan_events (
+    id INTEGER NOT NULL,
+    barcode VARCHAR(64) NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+)
+"""
+
+ITEMS_SQL = """
+CREATE TABLE {table} (
+    id INTEGER NOT NULL,
+    barcode VARCHAR(64),
+    name VARCHAR(255),
+    game VARCHAR(64),
+    set_name VARCHAR(128),
+    brand VARCHAR(64),
+    quantity INTEGER NOT NULL,
+    location VARCHAR(64),
+    notes TEXT,
+    price NUMERIC(10, 2),
+    description TEXT,
+    batch_id INTEGER,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT uq_items_barcode UNIQUE (barcode),
+    FOREIGN KEY(batch_id) REFERENCES batches (id)
+)
+"""
+
+ITEMS_COLUMNS = [
+    "id", "barcode", "name", "game", "set_name", "brand", "quantity", "location",
+    "notes", "price", "description", "batch_id", "created_at", "updated_at",
+]
+
+ITEMS_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_items_barcode ON items (barcode)",
+    "CREATE INDEX IF NOT EXISTS ix_items_id ON items (id)",
+)
+
+# Columns we can add in place (metadata-only ALTER in SQLite)
+ADDABLE_COLUMNS = {
+    "price": "NUMERIC(10, 2)",
+    "description": "TEXT",
+    "batch_id": "INTEGER REFERENCES batches(id)",
+}
+
+
+def upgrade(ctx):
+    if not ctx.table_exists("batches"):
+        ctx.log("Creating batches table...")
+        ctx.execute(BATCHES_SQL, "CREATE INDEX IF NOT EXISTS ix_batches_id ON batches (id)")
+
+    if not ctx.table_exists("scan_events"):
+        ctx.log("Creating scan_events table...")
+        ctx.execute(
+            SCAN_EVENTS_SQL,
+            "CREATE INDEX IF NOT EXISTS ix_scan_events_barcode ON scan_events (barcode)",
+            "CREATE INDEX IF NOT EXISTS ix_scan_events_id ON scan_events (id)",
+        )
+
+    if not ctx.table_exists("items"):
+        ctx.log("Creating items table...")
+        ctx.execute(ITEMS_SQL.format(table="items"), *ITEMS_INDEXES)
+        return
+
+    columns = ctx.columns("items")
+
+    # RENAME COLUMN is a metadata-only change from SQLite 3.25 on
+    if "number_in_set" in columns and "brand" not in columns and sqlite3.sqlite_version_info >= (3, 25, 0):
+        ctx.log("Renaming items.number_in_set to brand...")
+        ctx.execute("ALTER TABLE items RENAME COLUMN number_in_set TO brand")
+        columns = ctx.columns("items")
+
+    for column, ddl in ADDABLE_COLUMNS.items():
+        ctx.add_column("items", column, ddl)
+    columns = ctx.columns("items")
+
+    if set(columns) != set(ITEMS_COLUMNS):
+        column_map = {col: (col if col in columns else None) for col in ITEMS_COLUMNS}
+        if "brand" not in columns and "number_in_set" in columns:
+            column_map["brand"] = "number_in_set"
+        ctx.rebuild_table("rebuild_items", "items", ITEMS_SQL, column_map, post_sql=ITEMS_INDEXES)
+
+    ctx.backfill(
+        "normalize_locations",
+        "items",
+        "location = 'Storage'",
+        "location IS NULL OR location = '' OR location NOT IN ('Storage', 'Show')",
+    )
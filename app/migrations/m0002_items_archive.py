@@ -0,0 +1,36 @@
+"""
+Add the ``items_archive`` table for sold-out, inactive items (see app.archive)
+and an index on ``items (quantity, updated_at)`` to find them.
+"""
+
+VERSION = 2
+NAME = "items_archive"
+
+ARCHIVE_SQL = """
+CREATE TABLE items_archive (
+    id INTEGER NOT NULL,
+    barcode VARCHAR(64),
+    name VARCHAR(255),
+    game VARCHAR(64),
+    set_name VARCHAR(128),
+    brand VARCHAR(64),
+    quantity INTEGER NOT NULL,
+    location VARCHAR(64),
+    notes TEXT,
+    price NUMERIC(10, 2),
+    description TEXT,
+    batch_id INTEGER,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+)
+"""
+
+
+def upgrade(ctx):
+    if not ctx.table_exists("items_archive"):
+        ctx.log("Creating items_archive table...")
+        ctx.execute(ARCHIVE_SQL, "CREATE UNIQUE INDEX IF NOT EXISTS ix_items_archive_barcode ON items_archive (barcode)")
+    ctx.log("Indexing items by quantity and updated_at...")
+    ctx.execute("CREATE INDEX IF NOT EXISTS ix_items_quantity_updated_at ON items (quantity, updated_at)")
@@ -0,0 +1,12 @@
+"""
+Index ``items.batch_id`` so batch summaries and batch item pages only read
+the batch's own rows.
+"""
+
+VERSION = 3
+NAME = "items_batch_index"
+
+
+def upgrade(ctx):
+    ctx.log("Indexing items by batch_id...")
+    ctx.execute("CREATE INDEX IF NOT EXISTS ix_items_batch_id ON items (batch_id)")
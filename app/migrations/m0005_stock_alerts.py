@@ -0,0 +1,48 @@
+"""
+Add ``reorder_points`` (low-stock thresholds per item or per set) and the
+``stock_alerts`` raised when an item's quantity crosses one (see app.alerts).
+"""
+
+VERSION = 5
+NAME = "stock_alerts"
+
+REORDER_POINTS_SQL = """
+CREATE TABLE reorder_points (
+    id INTEGER NOT NULL,
+    item_id INTEGER,
+    set_name VARCHAR(255),
+    threshold INTEGER NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (item_id),
+    UNIQUE (set_name)
+)
+"""
+
+STOCK_ALERTS_SQL = """
+CREATE TABLE stock_alerts (
+    id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    barcode VARCHAR(64),
+    name VARCHAR(255),
+    set_name VARCHAR(255),
+    threshold INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    created_at DATETIME NOT NULL,
+    resolved_at DATETIME,
+    PRIMARY KEY (id)
+)
+"""
+
+
+def upgrade(ctx):
+    if not ctx.table_exists("reorder_points"):
+        ctx.log("Creating reorder_points table...")
+        ctx.execute(REORDER_POINTS_SQL)
+    if not ctx.table_exists("stock_alerts"):
+        ctx.log("Creating stock_alerts table...")
+        ctx.execute(
+            STOCK_ALERTS_SQL,
+            "CREATE INDEX IF NOT EXISTS ix_stock_alerts_item_id_resolved_at ON stock_alerts (item_id, resolved_at)",
+            "CREATE INDEX IF NOT EXISTS ix_stock_alerts_created_at ON stock_alerts (created_at)",
+        )
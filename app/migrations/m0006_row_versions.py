@@ -0,0 +1,13 @@
+"""
+Add a ``version`` column to ``items``, ``batches`` and ``items_archive`` for
+optimistic concurrency (ETag / If-Match). Existing rows start at version 1;
+adding a column with a constant default rewrites no rows.
+"""
+
+VERSION = 6
+NAME = "row_versions"
+
+
+def upgrade(ctx):
+    for table in ("items", "batches", "items_archive"):
+        ctx.add_column(table, "version", "INTEGER NOT NULL DEFAULT 1")
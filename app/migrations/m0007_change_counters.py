@@ -0,0 +1,23 @@
+"""
+Add ``change_counters``: one row per watched table (``items``,
+``reorder_points``), bumped by every transaction that writes it (see
+app.events), so a process can tell that another one changed the rows behind
+its in-memory views.
+"""
+
+VERSION = 7
+NAME = "change_counters"
+
+CHANGE_COUNTERS_SQL = """
+CREATE TABLE change_counters (
+    name VARCHAR(64) NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (name)
+)
+"""
+
+
+def upgrade(ctx):
+    if not ctx.table_exists("change_counters"):
+        ctx.log("Creating change_counters table...")
+        ctx.execute(CHANGE_COUNTERS_SQL)
@@ -0,0 +1,292 @@
+"""
+Versioned, online schema migrations.
+
+Every migration module exposes ``VERSION``, ``NAME`` and ``upgrade(ctx)``.
+Applied versions are recorded in the ``schema_version`` table. Long-running
+steps (table rebuilds and backfills) work through the table in bounded id
+ranges, committing after each range and recording their position in
+``migration_progress`` so an interrupted run resumes where it stopped
+instead of starting over.
+"""
+
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+
+SCHEMA_VERSION_TABLE = "schema_version"
+PROGRESS_TABLE = "migration_progress"
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PAUSE = 0.05  # seconds between batches, lets app writers grab the lock
+
+
+class SchemaVersionError(RuntimeError):
+    """Raised when the database schema does not match the application."""
+
+
+def _ensure_bookkeeping(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} ("
+            " version INTEGER NOT NULL PRIMARY KEY,"
+            " name VARCHAR(128) NOT NULL,"
+            " applied_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} ("
+            " version INTEGER NOT NULL,"
+            " step VARCHAR(128) NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " updated_at DATETIME NOT NULL,"
+            " PRIMARY KEY (version, step))"
+        ))
+
+
+def _record_version(conn, version: int, name: str) -> None:
+    conn.execute(
+        text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": version, "n": name, "t": datetime.now(timezone.utc)},
+    )
+
+
+def current_version(engine: Engine) -> int:
+    """Return the highest applied migration version, 0 for an unversioned database."""
+    if not inspect(engine).has_table(SCHEMA_VERSION_TABLE):
+        return 0
+    with engine.connect() as conn:
+        version = conn.execute(text(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+    return version or 0
+
+
+class MigrationContext:
+    """Helpers handed to ``upgrade(ctx)``; each one commits in small transactions."""
+
+    def __init__(self, engine: Engine, version: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                 pause: float = DEFAULT_PAUSE, log=print):
+        self.engine = engine
+        self.version = version
+        self.batch_size = batch_size
+        self.pause = pause
+        self.log = log
+
+    # -- introspection -----------------------------------------------------
+
+    def table_exists(self, table: str) -> bool:
+        return inspect(self.engine).has_table(table)
+
+    def columns(self, table: str) -> list:
+        return [col["name"] for col in inspect(self.engine).get_columns(table)]
+
+    def execute(self, *statements: str, **params) -> None:
+        """Run one or more DDL/DML statements in a single short transaction."""
+        with self.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement), params)
+
+    # -- progress bookkeeping ----------------------------------------------
+
+    def get_progress(self, step: str):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text(f"SELECT position FROM {PROGRESS_TABLE} WHERE version = :v AND step = :s"),
+                {"v": self.version, "s": step},
+            ).scalar()
+
+    def _save_progress(self, conn, step: str, position: int) -> None:
+        params = {"v": self.version, "s": step, "p": position, "t": datetime.now(timezone.utc)}
+        updated = conn.execute(
+            text(f"UPDATE {PROGRESS_TABLE} SET position = :p, updated_at = :t WHERE version = :v AND step = :s"),
+            params,
+        ).rowcount
+        if not updated:
+            conn.execute(
+                text(f"INSERT INTO {PROGRESS_TABLE} (version, step, position, updated_at) VALUES (:v, :s, :p, :t)"),
+                params,
+            )
+
+    def _clear_progress(self, conn, step: str) -> None:
+        conn.execute(
+            text(f"DELETE FROM {PROGRESS_TABLE} WHERE version = :v AND step = :s"),
+            {"v": self.version, "s": step},
+        )
+
+    def _next_upper_bound(self, conn, table: str, after: int):
+        """Largest id of the next ``batch_size`` rows after ``after`` (None when exhausted)."""
+        return conn.execute(
+            text(f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > :after ORDER BY id LIMIT :n) AS page"),
+            {"after": after, "n": self.batch_size},
+        ).scalar()
+
+    # -- schema helpers ----------------------------------------------------
+
+    def add_column(self, table: str, column: str, ddl: str) -> None:
+        """``ALTER TABLE ... ADD COLUMN`` unless the column is already there."""
+        if column not in self.columns(table):
+            self.log(f"Adding {table}.{column}...")
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def run_batches(self, step: str, table: str, statement: str, **params) -> int:
+        """
+        Run ``statement`` once per id range of ``table``, bound as ``:lo`` / ``:hi``.
+
+        Each range is its own transaction, so writers are never blocked for
+        longer than one batch, and progress survives an interrupted run.
+        """
+        position = self.get_progress(step) or 0
+        total = 0
+        while True:
+            with self.engine.begin() as conn:
+                upper = self._next_upper_bound(conn, table, position)
+                if upper is None:
+                    self._clear_progress(conn, step)
+                    break
+                total += conn.execute(text(statement), {"lo": position, "hi": upper, **params}).rowcount
+                self._save_progress(conn, step, upper)
+                position = upper
+            time.sleep(self.pause)
+        return total
+
+    def backfill(self, step: str, table: str, assignments: str, where: str = "1 = 1", **params) -> int:
+        """Apply ``UPDATE table SET assignments WHERE where`` one id range at a time."""
+        total = self.run_batches(
+            step, table, f"UPDATE {table} SET {assignments} WHERE id > :lo AND id <= :hi AND ({where})", **params
+        )
+        self.log(f"Backfill {step}: {total} rows updated")
+        return total
+
+    def rebuild_table(self, step: str, table: str, create_sql: str, column_map: dict,
+                      post_sql: tuple = ()) -> None:
+        """
+        Rebuild ``table`` online (SQLite only).
+
+        ``create_sql`` is the new table definition with ``{table}`` as the
+        name placeholder. ``column_map`` maps each new column to the old
+        column it is copied from, or ``None`` for NULL. Triggers mirror live
+        writes into the shadow table while existing rows are copied in id
+        ranges; the final swap and ``post_sql`` (index creation) run in one
+        short transaction.
+        """
+        shadow = f"{table}__new"
+        targets = list(column_map)
+        sources = [column_map[col] or "NULL" for col in targets]
+        new_values = ", ".join(f"NEW.{src}" if src != "NULL" else "NULL" for src in sources)
+        target_list = ", ".join(targets)
+
+        position = self.get_progress(step)
+        if position is None:
+            self.log(f"Rebuilding {table}: creating shadow table and sync triggers...")
+            self.execute(
+                f"DROP TABLE IF EXISTS {shadow}",
+                create_sql.format(table=shadow),
+                f"CREATE TRIGGER {shadow}_ins AFTER INSERT ON {table} BEGIN "
+                f"INSERT OR REPLACE INTO {shadow} ({target_list}) VALUES ({new_values}); END",
+                f"CREATE TRIGGER {shadow}_upd AFTER UPDATE ON {table} BEGIN "
+                f"DELETE FROM {shadow} WHERE id = OLD.id; "
+                f"INSERT OR REPLACE INTO {shadow} ({target_list}) VALUES ({new_values}); END",
+                f"CREATE TRIGGER {shadow}_del AFTER DELETE ON {table} BEGIN "
+                f"DELETE FROM {shadow} WHERE id = OLD.id; END",
+            )
+            with self.engine.begin() as conn:
+                self._save_progress(conn, step, 0)
+            position = 0
+
+        copied = 0
+        while True:
+            with self.engine.begin() as conn:
+                upper = self._next_upper_bound(conn, table, position)
+                if upper is None:
+                    break
+                # OR IGNORE: rows already mirrored by a trigger are newer than our copy
+                copied += conn.execute(
+                    text(
+                        f"INSERT OR IGNORE INTO {shadow} ({target_list}) "
+                        f"SELECT {', '.join(sources)} FROM {table} WHERE id > :lo AND id <= :hi"
+                    ),
+                    {"lo": position, "hi": upper},
+                ).rowcount
+                self._save_progress(conn, step, upper)
+                position = upper
+            time.sleep(self.pause)
+
+        self.log(f"Rebuilding {table}: copied {copied} rows, swapping tables...")
+        with self.engine.begin() as conn:
+            for suffix in ("ins", "upd", "del"):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {shadow}_{suffix}"))
+            conn.execute(text(f"DROP TABLE {table}"))
+            conn.execute(text(f"ALTER TABLE {shadow} RENAME TO {table}"))
+            for statement in post_sql:
+                conn.execute(text(statement))
+            self._clear_progress(conn, step)
+
+
+def _load_migrations():
+    from . import MIGRATIONS
+    return sorted(MIGRATIONS, key=lambda module: module.VERSION)
+
+
+def head_version() -> int:
+    migrations = _load_migrations()
+    return migrations[-1].VERSION if migrations else 0
+
+
+def pending_migrations(engine: Engine) -> list:
+    version = current_version(engine)
+    return [m for m in _load_migrations() if m.VERSION > version]
+
+
+def stamp(engine: Engine, version: int = None) -> None:
+    """Mark every migration up to ``version`` (default: head) as applied without running it."""
+    _ensure_bookkeeping(engine)
+    target = head_version() if version is None else version
+    applied = current_version(engine)
+    with engine.begin() as conn:
+        for module in _load_migrations():
+            if applied < module.VERSION <= target:
+                _record_version(conn, module.VERSION, module.NAME)
+
+
+def upgrade(engine: Engine, target: int = None, batch_size: int = DEFAULT_BATCH_SIZE,
+            pause: float = DEFAULT_PAUSE, log=print) -> int:
+    """Apply pending migrations up to ``target`` (default: head). Returns the new version."""
+    _ensure_bookkeeping(engine)
+    for module in pending_migrations(engine):
+        if target is not None and module.VERSION > target:
+            break
+        log(f"Applying migration {module.VERSION:04d} {module.NAME}...")
+        module.upgrade(MigrationContext(engine, module.VERSION, batch_size=batch_size, pause=pause, log=log))
+        with engine.begin() as conn:
+            _record_version(conn, module.VERSION, module.NAME)
+    return current_version(engine)
+
+
+def ensure_schema(engine: Engine, auto_upgrade: bool = False) -> int:
+    """
+    Startup check: create and stamp a brand-new database, otherwise verify
+    that it is at the head version (optionally upgrading in-process).
+    """
+    from ..db import Base
+    from .. import models  # noqa: F401  registers tables on Base.metadata
+
+    inspector = inspect(engine)
+    if not inspector.has_table(SCHEMA_VERSION_TABLE) and not inspector.has_table("items"):
+        Base.metadata.create_all(bind=engine)
+        stamp(engine)
+        return head_version()
+
+    version = current_version(engine)
+    head = head_version()
+    if version == head:
+        return version
+    if version > head:
+        raise SchemaVersionError(
+            f"Database schema version {version} is newer than this application (expects {head})"
+        )
+    if auto_upgrade:
+        return upgrade(engine)
+    raise SchemaVersionError(
+        f"Database schema is at version {version}, application expects {head}. "
+        "Run `python -m app.migrations upgrade` (safe while the app is serving)."
+    )
@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, DateTime, Text, UniqueConstraint, Numeric, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, UniqueConstraint, Numeric, ForeignKey, Boolean, Index
 from sqlalchemy.orm import validates, relationship
 
 from .db import Base
@@ -15,15 +15,21 @@ class Batch(Base):
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    # Row version, served as the ETag; every UPDATE requires and bumps it (see crud)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationship to items in this batch
     items = relationship("Item", back_populates="batch")
 
+    __mapper_args__ = {"version_id_col": version}
+
 
 class Item(Base):
     __tablename__ = "items"
     __table_args__ = (
         UniqueConstraint("barcode", name="uq_items_barcode"),
+        # Finds sold-out items for archiving without scanning the table
+        Index("ix_items_quantity_updated_at", "quantity", "updated_at"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -37,14 +43,18 @@ class Item(Base):
     notes = Column(Text, nullable=True)
     price = Column(Numeric(10, 2), nullable=True)
     description = Column(Text, nullable=True)
-    batch_id = Column(Integer, ForeignKey("batches.id"), nullable=True)
+    batch_id = Column(Integer, ForeignKey("batches.id"), nullable=True, index=True)
 
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    # Row version, served as the ETag; every UPDATE requires and bumps it, bulk ones included (see crud)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationship to batch
     batch = relationship("Batch", back_populates="items")
 
+    __mapper_args__ = {"version_id_col": version}
+
     @validates("quantity")
     def validate_quantity(self, _key, value):  # noqa: D401
         if value is None:
@@ -60,9 +70,106 @@ class Item(Base):
         return value
 
 
+class ItemArchive(Base):
+    """Sold-out items with no recent activity, moved out of ``items`` by app.archive"""
+    __tablename__ = "items_archive"
+
+    id = Column(Integer, primary_key=True)
+    barcode = Column(String(64), nullable=True, unique=True, index=True)
+    name = Column(String(255), nullable=True)
+    game = Column(String(64), nullable=True)
+    set_name = Column(String(128), nullable=True)
+    brand = Column(String(64), nullable=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    location = Column(String(64), nullable=True)
+    notes = Column(Text, nullable=True)
+    price = Column(Numeric(10, 2), nullable=True)
+    description = Column(Text, nullable=True)
+    batch_id = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
 class ScanEvent(Base):
     __tablename__ = "scan_events"
 
     id = Column(Integer, primary_key=True, index=True)
     barcode = Column(String(64), nullable=False, index=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
\ No newline at end of file
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class StockMovement(Base):
+    """Append-only ledger: one row per quantity change, written with the change itself (see app.ledger)"""
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        # Movements of one item after a snapshot's high-water mark
+        Index("ix_stock_movements_item_id_id", "item_id", "id"),
+        Index("ix_stock_movements_created_at", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # No foreign key: the history outlives deleted and archived items
+    item_id = Column(Integer, nullable=False)
+    delta = Column(Integer, nullable=False)
+    reason = Column(String(16), nullable=False)  # scan, sell, batch, adjust, import, delete, opening, reconcile
+    station = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class StockSnapshot(Base):
+    """Every item's quantity after movement ``last_movement_id``, taken periodically by app.ledger"""
+    __tablename__ = "stock_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    taken_at = Column(DateTime, nullable=False, index=True)
+    last_movement_id = Column(Integer, nullable=False)
+    item_count = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(Integer, nullable=False, default=0)
+
+
+class StockSnapshotItem(Base):
+    __tablename__ = "stock_snapshot_items"
+
+    snapshot_id = Column(Integer, ForeignKey("stock_snapshots.id"), primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+
+
+class ReorderPoint(Base):
+    """Low-stock threshold for one item, or for every item of a set (the item's own wins); see app.alerts"""
+    __tablename__ = "reorder_points"
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=True, unique=True)
+    set_name = Column(String(255), nullable=True, unique=True)
+    threshold = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class StockAlert(Base):
+    """An item's quantity fell to or below its reorder point; resolved once it is back above"""
+    __tablename__ = "stock_alerts"
+    __table_args__ = (
+        Index("ix_stock_alerts_item_id_resolved_at", "item_id", "resolved_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False)
+    barcode = Column(String(64), nullable=True)
+    name = Column(String(255), nullable=True)
+    set_name = Column(String(255), nullable=True)
+    threshold = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    resolved_at = Column(DateTime, nullable=True)
+
+
+class ChangeCounter(Base):
+    """Bumped once by every transaction that writes the table ``name`` (see app.events)"""
+    __tablename__ = "change_counters"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,187 @@
+"""
+Opt-in request profiling and slow-query logging.
+
+Neither is installed unless configured, so a default deployment pays nothing:
+
+- ``CARD_INV_PROFILE_SAMPLE_RATE`` (0-1) profiles that fraction of requests;
+  with ``CARD_INV_ADMIN_TOKEN`` set, a request carrying ``X-Profile: <token>``
+  is always profiled. Profiles are pstats files written to
+  ``CARD_INV_PROFILE_DIR`` (newest ``CARD_INV_PROFILE_KEEP`` kept); open them
+  with ``python -m pstats`` or snakeviz.
+- ``CARD_INV_SLOW_QUERY_MS`` logs every statement slower than the threshold
+  with its parameter shape, duration and the route that issued it.
+
+A profile combines the event loop thread (routing, async endpoints, response
+encoding) with the worker thread running a sync endpoint. The loop part also
+sees whatever other requests were doing at the same time.
+"""
+
+import contextvars
+import cProfile
+import inspect
+import json
+import os
+import pstats
+import random
+import re
+import time
+from pathlib import Path
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+PROFILE_SAMPLE_RATE = float(os.getenv("CARD_INV_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = Path(os.getenv("CARD_INV_PROFILE_DIR", "./profiles"))
+PROFILE_KEEP = int(os.getenv("CARD_INV_PROFILE_KEEP", "100"))
+ADMIN_TOKEN = os.getenv("CARD_INV_ADMIN_TOKEN")
+SLOW_QUERY_MS = float(os.getenv("CARD_INV_SLOW_QUERY_MS", "0"))
+
+PROFILE_HEADER = b"x-profile"
+
+# The ASGI scope of the request being handled; the router adds "route" to it
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+# Profiler for the worker thread of a profiled request
+_request_profile = contextvars.ContextVar("request_profile", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def profiling_enabled() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 or bool(ADMIN_TOKEN)
+
+
+def route_path(scope) -> str:
+    route = scope.get("route") if scope else None
+    return getattr(route, "path", None) or (scope or {}).get("path", "-")
+
+
+# -- request profiles ---------------------------------------------------------
+
+def _wants_profile(scope) -> bool:
+    if ADMIN_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return value.decode("latin-1") == ADMIN_TOKEN
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _profiled_endpoint(call):
+    """Wrap a sync endpoint so its worker thread joins the request's profile."""
+    def endpoint(**values):
+        profile = _request_profile.get()
+        if profile is None:
+            return call(**values)
+        profile.enable()
+        try:
+            return call(**values)
+        finally:
+            profile.disable()
+    return endpoint
+
+
+def _rotate(directory: Path) -> None:
+    files = sorted(directory.glob("*.prof"), key=lambda path: path.stat().st_mtime)
+    for path in files[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else files:
+        path.unlink(missing_ok=True)
+
+
+def _save_profile(scope, loop_profile, worker_profile, elapsed_ms: float) -> str:
+    stats = pstats.Stats(loop_profile)
+    if worker_profile.getstats():
+        stats.add(worker_profile)
+    route = re.sub(r"[^A-Za-z0-9]+", "_", route_path(scope)).strip("_") or "root"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    name = f"{stamp}-{int(time.time() * 1000) % 1000:03d}-{scope['method']}-{route}-{elapsed_ms:.0f}ms.prof"
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stats.dump_stats(str(PROFILE_DIR / name))
+    _rotate(PROFILE_DIR)
+    return name
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        loop_profile = cProfile.Profile()
+        worker_profile = cProfile.Profile()
+        token = _request_profile.set(worker_profile)
+        started = time.perf_counter()
+        loop_profile.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            loop_profile.disable()
+            _request_profile.reset(token)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            name = _save_profile(scope, loop_profile, worker_profile, elapsed_ms)
+            print(f"Profiled {scope['method']} {route_path(scope)} ({elapsed_ms:.1f} ms) -> {PROFILE_DIR / name}")
+
+
+# -- slow query log -----------------------------------------------------------
+
+class RequestScopeMiddleware:
+    """Makes the current request visible to the slow-query log, including in worker threads."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Describe parameters by type without logging their values."""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameter_shape(parameters[0]) if parameters else None
+        return {"rows": len(parameters), "each": first}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def install_slow_query_log(engine, threshold_ms: float) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < threshold_ms:
+            return
+        record = {
+            "duration_ms": round(duration_ms, 2),
+            "route": route_path(_request_scope.get()),
+            "statement": _WHITESPACE.sub(" ", statement).strip()[:1000],
+            "parameters": parameter_shape(parameters, executemany),
+        }
+        print(f"Slow query: {json.dumps(record, default=str)}")
+
+
+def install(app, engines) -> None:
+    """Attach whichever of profiling and the slow-query log is configured."""
+    if profiling_enabled():
+        for route in app.routes:
+            if isinstance(route, APIRoute) and not inspect.iscoroutinefunction(route.dependant.call):
+                # Sync endpoints run in the threadpool; async ones are covered by the loop profile
+                route.dependant.call = _profiled_endpoint(route.dependant.call)
+        app.add_middleware(ProfilingMiddleware)
+    if SLOW_QUERY_MS > 0:
+        for engine in set(engines):
+            install_slow_query_log(engine, SLOW_QUERY_MS)
+        app.add_middleware(RequestScopeMiddleware)
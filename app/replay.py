@@ -0,0 +1,234 @@
+"""
+Replay a captured traffic session (see ``app.capture``) against a copy of the database.
+
+    python -m app.replay CAPTURE_DIR_OR_FILES [--db PATH] [--speed 1] [--store ID]
+
+The database copy is taken from ``--db`` or, by default, from the backup named
+in the capture header (looked up in ``CARD_INV_BACKUP_DIR``); the original is
+never touched. The app runs in-process behind an ASGI transport with its
+background jobs, capture and tenancy switched off, and every request is sent
+at its captured offset divided by ``--speed``, so overlapping requests overlap
+again. ``--speed 0`` sends them one after another as fast as possible.
+
+The report gives per-route latency percentiles next to the captured ones and
+lists divergences: a different status or a different response digest
+(timestamps are ignored). Run it before and after a change to compare.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+MAX_EXAMPLES = 10
+
+
+def read_capture(paths) -> tuple:
+    """``(header, records)`` for one session, from files or capture directories."""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("capture-*.ndjson.gz")) if path.is_dir() else [path])
+    if not files:
+        raise ValueError("No capture files found")
+    sessions = defaultdict(list)
+    headers = {}
+    for path in files:
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            try:
+                header = json.loads(handle.readline())
+                for line in handle:
+                    sessions[header["session"]].append(json.loads(line))
+            except (EOFError, ValueError):
+                # The newest file of a session that is still running may end mid-line
+                print(f"Warning: {path.name} is truncated")
+            headers.setdefault(header["session"], header)
+    if len(sessions) > 1:
+        raise ValueError(f"Files from {len(sessions)} sessions given; pick one of {', '.join(sorted(sessions))}")
+    session, records = next(iter(sessions.items()))
+    records.sort(key=lambda record: record["t"])
+    return headers[session], records
+
+
+def copy_database(source: Path, target: Path) -> None:
+    """Consistent copy of a (possibly live) SQLite file."""
+    if not source.exists():
+        raise FileNotFoundError(f"Database {source} not found")
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(str(target))
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+async def _send(client, record: dict) -> dict:
+    from .capture import decode_body, response_digest
+
+    headers = record.get("h", {})
+    url = record["p"] + ("?" + record["q"] if record.get("q") else "")
+    started = time.perf_counter()
+    try:
+        response = await client.request(record["m"], url, content=decode_body(record), headers=headers)
+        body = response.content
+        status = response.status_code
+        digest = response_digest(response.headers.get("content-type", ""), body)
+    except Exception as exc:
+        status, digest = 0, f"error: {exc}"
+    return {"record": record, "status": status, "digest": digest,
+            "ms": (time.perf_counter() - started) * 1000}
+
+
+async def replay(app, records: list, speed: float) -> list:
+    import httpx
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=None) as client:
+            if speed <= 0:
+                return [await _send(client, record) for record in records]
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+
+            async def scheduled(record):
+                await asyncio.sleep(max(0.0, started + record["t"] / 1000 / speed - loop.time()))
+                return await _send(client, record)
+
+            return await asyncio.gather(*(scheduled(record) for record in records))
+    finally:
+        await app.router.shutdown()
+
+
+def summarize(results: list) -> dict:
+    routes = defaultdict(lambda: {"replayed": [], "captured": [], "diverged": 0})
+    divergences = []
+    for result in results:
+        record = result["record"]
+        route = routes[f"{record['m']} {record['r']}"]
+        route["replayed"].append(result["ms"])
+        route["captured"].append(record["d"])
+        if result["status"] != record["s"] or result["digest"] != record["o"]:
+            route["diverged"] += 1
+            divergences.append({
+                "t": record["t"], "method": record["m"], "path": record["p"], "query": record.get("q", ""),
+                "status": [record["s"], result["status"]],
+                "digest": [record["o"], result["digest"]],
+            })
+    report = {}
+    for name, route in sorted(routes.items()):
+        replayed, captured = sorted(route["replayed"]), sorted(route["captured"])
+        report[name] = {
+            "count": len(replayed),
+            "p50_ms": round(percentile(replayed, 0.50), 2),
+            "p95_ms": round(percentile(replayed, 0.95), 2),
+            "p99_ms": round(percentile(replayed, 0.99), 2),
+            "max_ms": round(replayed[-1], 2),
+            "captured_p50_ms": round(percentile(captured, 0.50), 2),
+            "captured_p95_ms": round(percentile(captured, 0.95), 2),
+            "diverged": route["diverged"],
+        }
+    return {"requests": len(results), "diverged": len(divergences), "routes": report, "divergences": divergences}
+
+
+def _print_report(summary: dict, wall_seconds: float, out) -> None:
+    out.write(f"{'Route':<44} {'N':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  "
+              f"{'was p50':>8} {'was p95':>8} {'diff':>5}\n")
+    out.write("-" * 112 + "\n")
+    for name, route in summary["routes"].items():
+        out.write(f"{name[:44]:<44} {route['count']:>6} {route['p50_ms']:>8.1f} {route['p95_ms']:>8.1f} "
+                  f"{route['p99_ms']:>8.1f} {route['max_ms']:>8.1f}  {route['captured_p50_ms']:>8.1f} "
+                  f"{route['captured_p95_ms']:>8.1f} {route['diverged']:>5}\n")
+    out.write(f"\n{summary['requests']} request(s) in {wall_seconds:.1f}s, {summary['diverged']} diverged\n")
+    for divergence in summary["divergences"][:MAX_EXAMPLES]:
+        query = "?" + divergence["query"] if divergence["query"] else ""
+        out.write(f"  +{divergence['t'] / 1000:.3f}s {divergence['method']} {divergence['path']}{query}: "
+                  f"status {divergence['status'][0]} -> {divergence['status'][1]}, "
+                  f"digest {divergence['digest'][0]} -> {divergence['digest'][1]}\n")
+    if summary["diverged"] > MAX_EXAMPLES:
+        out.write(f"  ... and {summary['diverged'] - MAX_EXAMPLES} more\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.replay", description="Replay captured API traffic")
+    parser.add_argument("captures", nargs="+", help="Capture files or directories (one session)")
+    parser.add_argument("--db", type=Path, default=None,
+                        help="Database to start from (default: the backup named in the capture)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale; 0 sends requests back to back")
+    parser.add_argument("--store", default=None, help="Only replay requests for this store (pass its database with --db)")
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most this many requests")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        header, records = read_capture(args.captures)
+    except (OSError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    records = [record for record in records if record.get("st") == args.store]
+    skipped = sum(1 for record in records if record.get("bt"))
+    records = [record for record in records if not record.get("bt")][:args.limit]
+    if skipped:
+        print(f"Skipping {skipped} request(s) whose bodies were too large to capture")
+
+    source = args.db
+    if source is None:
+        if not header.get("backup"):
+            print("Error: the capture names no backup; pass --db", file=sys.stderr)
+            return 1
+        source = Path(os.getenv("CARD_INV_BACKUP_DIR", "./backups")) / header["backup"]
+
+    with tempfile.TemporaryDirectory(prefix="card-inv-replay-") as workdir:
+        copy = Path(workdir) / "replay.db"
+        try:
+            copy_database(source, copy)
+        except (OSError, sqlite3.Error) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        # The app reads its configuration on import: point it at the copy, quietly
+        os.environ.update({
+            "CARD_INV_DB_URL": f"sqlite:///{copy}",
+            "CARD_INV_AUTO_MIGRATE": "1",
+            "CARD_INV_BACKUP_INTERVAL_HOURS": "0",
+            "CARD_INV_ARCHIVE_AFTER_DAYS": "0",
+            "CARD_INV_SNAPSHOT_INTERVAL_HOURS": "0",
+        })
+        for name in ("CARD_INV_CAPTURE_DIR", "CARD_INV_STORES_DIR"):
+            os.environ.pop(name, None)
+        from .main import app
+
+        print(f"Replaying {len(records)} request(s) from session {header['session']} "
+              f"on a copy of {source} at {'full' if args.speed <= 0 else f'{args.speed:g}x'} speed")
+        started = time.perf_counter()
+        results = asyncio.run(replay(app, records, args.speed))
+        wall_seconds = time.perf_counter() - started
+
+        from .db import engine, read_engine
+
+        engine.dispose()
+        read_engine.dispose()
+
+    summary = summarize(results)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        _print_report(summary, wall_seconds, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
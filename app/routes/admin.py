@@ -0,0 +1,68 @@
+import hmac
+import os
+import threading
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from .. import admission, alerts, backup, capture, coalesce, search_cache, singleflight, tenancy
+from ..db import current_store
+
+ADMIN_TOKEN = os.getenv("CARD_INV_ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Admin routes need X-Admin-Token; without CARD_INV_ADMIN_TOKEN they are disabled"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled; set CARD_INV_ADMIN_TOKEN to enable them")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    return {
+        "admission": admission.stats(),
+        "coalescing": coalesce.stats(),
+        "stores": tenancy.stats(),
+        "capture": capture.stats(),
+        "search_cache": search_cache.stats(),
+        "alerts": alerts.stats(),
+        "single_flight": singleflight.stats(),
+    }
+
+
+def _backup_directory():
+    """This store's backup directory, the one its scheduled backups use"""
+    store = current_store.get()
+    return backup.store_directory(store.store_id if store is not None else None)
+
+
+@router.get("/backups")
+def list_backups():
+    return backup.list_backups(_backup_directory())
+
+
+@router.post("/backups", status_code=202)
+def create_backup():
+    """Start an online backup of this store's database in the background; poll GET /backups for the result"""
+    db_url = tenancy.current_database_url()
+    directory = _backup_directory()
+    try:
+        backup.database_path(db_url)
+    except backup.BackupError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if backup.backup_running():
+        raise HTTPException(status_code=409, detail="A backup is already running")
+
+    def run():
+        try:
+            backup.create_backup(db_url, directory)
+        except backup.BackupError as exc:
+            print(f"Backup failed: {exc}")
+
+    threading.Thread(target=run, name="admin-backup", daemon=True).start()
+    return {"status": "started"}
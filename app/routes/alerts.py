@@ -0,0 +1,65 @@
+import asyncio
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from ..db import get_read_db, get_write_db
+from .. import alerts, crud, schemas, tenancy
+
+router = APIRouter(prefix="/api/alerts", tags=["alerts"])
+
+# Comment lines keep idle streams open through proxies
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/", response_model=List[schemas.StockAlertRead])
+def list_alerts(
+    open_only: bool = Query(False, description="Only alerts whose item is still at or below its reorder point"),
+    item_id: int = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    before_id: int = Query(None, description="Page: alerts older than this id"),
+    db: Session = Depends(get_read_db)
+):
+    """Low-stock alerts, newest first"""
+    return alerts.get_alerts(db, open_only=open_only, item_id=item_id, limit=limit, before_id=before_id)
+
+
+@router.get("/reorder-points", response_model=List[schemas.ReorderPointRead])
+def list_reorder_points(db: Session = Depends(get_read_db)):
+    return alerts.get_reorder_points(db)
+
+
+@router.put("/reorder-points", response_model=Optional[schemas.ReorderPointRead])
+def set_reorder_point(payload: schemas.ReorderPointUpdate, db: Session = Depends(get_write_db)):
+    """Set an item's or a set's reorder point; a null threshold clears it"""
+    if payload.item_id is not None and not crud.item_exists(db, payload.item_id):
+        raise HTTPException(status_code=404, detail="Item not found")
+    return alerts.set_reorder_point(db, payload.threshold, item_id=payload.item_id, set_name=payload.set_name)
+
+
+@router.get("/stream")
+async def stream_alerts(request: Request):
+    """Server-sent events: one ``stock-alert`` event per alert as it is raised"""
+    subscriber = alerts.hub.subscribe(tenancy.current_database_url())
+    alert_queue = subscriber[2]
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    alert = await asyncio.wait_for(alert_queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {alert['id']}\nevent: stock-alert\ndata: {json.dumps(alert)}\n\n"
+        finally:
+            alerts.hub.unsubscribe(subscriber)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
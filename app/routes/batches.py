@@ -1,23 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import json
+from decimal import Decimal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List
 from datetime import datetime
 
-from ..db import get_db
-from .. import crud, schemas
+from ..db import get_read_db, get_write_db
+from .. import catalog, coalesce, crud, encoding, etags, schemas
 
-router = APIRouter(prefix="/api/batches", tags=["batches"])
+router = APIRouter(prefix="/api/batches", tags=["batches"], route_class=encoding.MsgPackRoute,
+                   default_response_class=encoding.NegotiatedResponse)
 
 
 @router.post("/", response_model=schemas.BatchRead)
-def create_batch(batch_data: schemas.BatchCreate, db: Session = Depends(get_db)):
+def create_batch(batch_data: schemas.BatchCreate, db: Session = Depends(get_write_db)):
     """Create a new batch"""
     db_batch = crud.create_batch(db, **batch_data.dict())
     return db_batch
 
 
 @router.get("/", response_model=List[schemas.BatchRead])
-def list_batches(active_only: bool = True, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def list_batches(active_only: bool = True, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """List all batches, optionally filtering by active status"""
     if active_only:
         batches = crud.get_active_batches(db, skip=skip, limit=limit)
@@ -35,35 +40,99 @@ def list_batches(active_only: bool = True, skip: int = 0, limit: int = 100, db:
     return result
 
 
-@router.get("/{batch_id}", response_model=schemas.BatchWithItems)
-def get_batch(batch_id: int, db: Session = Depends(get_db)):
-    """Get a specific batch with all its items"""
-    db_batch = crud.get_batch(db, batch_id=batch_id)
-    if not db_batch:
+@router.get("/{batch_id}", response_model=schemas.BatchSummary)
+def get_batch(batch_id: int, response: Response, db: Session = Depends(get_read_db)):
+    """Get a batch with item count, quantity and value totals (items are paged via /items)"""
+    summary = crud.get_batch_summary(db, batch_id)
+    if not summary:
         raise HTTPException(status_code=404, detail="Batch not found")
-    
-    items = crud.get_batch_items(db, batch_id)
-    stats = crud.get_batch_stats(db, batch_id)
-    
-    batch_dict = schemas.BatchRead.from_orm(db_batch)
-    batch_dict.item_count = stats["item_count"]
-    
-    return schemas.BatchWithItems(**batch_dict.dict(), items=items)
+
+    batch_dict = schemas.BatchRead.from_orm(summary.pop("batch")).dict()
+    response.headers["ETag"] = etags.etag(batch_dict["version"])
+    return schemas.BatchSummary(**{**batch_dict, **summary})
+
+
+# Item fields a batch page can return; id is always included
+BATCH_ITEM_FIELDS = ("id", "barcode", "name", "game", "set_name", "brand", "quantity", "location",
+                     "notes", "price", "description", "created_at", "updated_at")
+
+
+def _encode_cursor(sort_value, item_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        value = ["dt", sort_value.isoformat()]
+    elif isinstance(sort_value, Decimal):
+        value = ["dec", str(sort_value)]
+    else:
+        value = ["raw", sort_value]
+    raw = json.dumps(value + [item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        kind, value, item_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if kind == "dt":
+            value = datetime.fromisoformat(value)
+        elif kind == "dec":
+            value = Decimal(value)
+        return value, int(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/{batch_id}/items", response_model=schemas.BatchItemsPage)
+def get_batch_items(
+    batch_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    sort: str = Query("id", pattern="^(" + "|".join(crud.BATCH_ITEM_SORTS) + ")$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fields: str = Query(None, description="Comma-separated item fields to return (default: all)"),
+    db: Session = Depends(get_read_db)
+):
+    """Page through a batch's items, sorted, with only the requested fields"""
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in BATCH_ITEM_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        columns = ["id"] + [field for field in requested if field != "id"]
+    else:
+        columns = list(BATCH_ITEM_FIELDS)
+    if not crud.batch_exists(db, batch_id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    after = _decode_cursor(cursor) if cursor else None
+    rows = crud.get_batch_items_page(db, batch_id, columns, sort=sort, descending=order == "desc",
+                                     after=after, limit=limit)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["sort_key"], rows[-1]["id"])
+    items = [{column: row[column] for column in columns} for row in rows]
+    return schemas.BatchItemsPage(items=items, next_cursor=next_cursor)
 
 
 @router.put("/{batch_id}", response_model=schemas.BatchRead)
-def update_batch(batch_id: int, batch_data: schemas.BatchUpdate, db: Session = Depends(get_db)):
-    """Update a batch"""
+def update_batch(batch_id: int, batch_data: schemas.BatchUpdate, request: Request, response: Response,
+                 db: Session = Depends(get_write_db)):
+    """Update a batch; with If-Match only while it is still at that version"""
+    expected_version = etags.if_match(request)
     db_batch = crud.get_batch(db, batch_id=batch_id)
     if not db_batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     
-    updated_batch = crud.update_batch(db, db_batch, **batch_data.dict(exclude_unset=True))
+    try:
+        updated_batch = crud.update_batch(db, db_batch, expected_version=expected_version,
+                                          **batch_data.dict(exclude_unset=True))
+    except StaleDataError:
+        raise etags.precondition_failed("Batch")
+    response.headers["ETag"] = etags.etag(updated_batch.version)
     return updated_batch
 
 
 @router.delete("/{batch_id}")
-def delete_batch(batch_id: int, db: Session = Depends(get_db)):
+def delete_batch(batch_id: int, db: Session = Depends(get_write_db)):
     """Delete a batch and remove all items from it"""
     db_batch = crud.get_batch(db, batch_id=batch_id)
     if not db_batch:
@@ -74,56 +143,70 @@ def delete_batch(batch_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{batch_id}/scan", response_model=schemas.ScanResponse)
-def scan_item_to_batch(batch_id: int, scan_data: schemas.BatchScanRequest, db: Session = Depends(get_db)):
+def scan_item_to_batch(batch_id: int, scan_data: schemas.BatchScanRequest, request: Request, response: Response,
+                       db: Session = Depends(get_write_db)):
     """Add an item to a batch by scanning its barcode"""
     if scan_data.batch_id != batch_id:
         raise HTTPException(status_code=400, detail="Batch ID mismatch")
-    
-    # Check if batch exists and is active
-    batch = crud.get_batch(db, batch_id)
-    if not batch:
-        raise HTTPException(status_code=404, detail="Batch not found")
-    if not batch.is_active:
-        raise HTTPException(status_code=400, detail="Batch is not active")
-    
-    # Check if item exists
-    item = crud.get_item_by_barcode(db, scan_data.barcode)
-    is_new = False
-    
-    if item:
-        # Item exists, add to batch
-        item = crud.add_item_to_batch(db, scan_data.barcode, batch_id, scan_data.quantity)
-        if not item:
-            raise HTTPException(status_code=500, detail="Failed to add item to batch")
-    else:
-        # Item doesn't exist - return response indicating new item
-        is_new = True
-        # Don't create a generic item - let the frontend handle it
-    
-    # Create scan event
-    crud.create_scan_event(db, scan_data.barcode)
-    
-    return schemas.ScanResponse(item=item if item else schemas.ItemRead(
-        id=0,  # Placeholder
-        barcode=scan_data.barcode,
-        name="",
-        game="",
-        set_name="",
-        brand="",
-        quantity=0,
-        location=batch.target_location,
-        notes="",
-        price=None,
-        description="",
-        batch_id=batch_id,
-        created_at=datetime.now(),
-        updated_at=datetime.now()
-    ), is_new=is_new)
+
+    def apply(quantity):
+        # Check if batch exists and is active
+        batch = crud.get_batch(db, batch_id)
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        if not batch.is_active:
+            raise HTTPException(status_code=400, detail="Batch is not active")
+
+        # Check if item exists
+        item = crud.get_item_by_barcode(db, scan_data.barcode)
+        is_new = False
+        known = None
+
+        if item:
+            # Item exists, add to batch
+            item = crud.add_item_to_batch(db, scan_data.barcode, batch_id, quantity,
+                                          station=coalesce.station_name(request))
+            if not item:
+                raise HTTPException(status_code=500, detail="Failed to add item to batch")
+        else:
+            # Item doesn't exist - return response indicating new item
+            is_new = True
+            # Don't create a generic item - let the frontend handle it, prefilled from the vendor catalog
+            known = catalog.lookup(scan_data.barcode)
+
+        # Create scan event
+        crud.create_scan_event(db, scan_data.barcode)
+
+        return schemas.ScanResponse(item=schemas.ItemRead.from_orm(item) if item else schemas.ItemRead(
+            id=0,  # Placeholder
+            barcode=scan_data.barcode,
+            name=(known or {}).get("name") or "",
+            game=(known or {}).get("game") or "",
+            set_name=(known or {}).get("set_name") or "",
+            brand=(known or {}).get("brand") or "",
+            quantity=0,
+            location=batch.target_location,
+            notes="",
+            price=None,
+            description="",
+            batch_id=batch_id,
+            created_at=datetime.now(),
+            updated_at=datetime.now()
+        ), is_new=is_new, catalog_match=known is not None)
+
+    key = coalesce.key(request, batch_id, scan_data.barcode)
+    result, coalesced = coalesce.batch_scan.submit(key, scan_data.quantity, apply)
+    if coalesced:
+        response.headers[coalesce.COALESCED_HEADER] = coalesce.batch_scan.mode
+        return result.copy(update={"duplicate": True})
+    return result
 
 
 @router.post("/{batch_id}/add-item", response_model=schemas.ItemRead)
-def add_item_to_batch_with_details(batch_id: int, item_data: schemas.ItemCreate, db: Session = Depends(get_db)):
-    """Add a new item to a batch with full details"""
+def add_item_to_batch_with_details(batch_id: int, item_data: schemas.ItemCreate, request: Request,
+                                   response: Response, db: Session = Depends(get_write_db)):
+    """Add a new item to a batch with full details; If-Match applies to an existing item"""
+    expected_version = etags.if_match(request)
     # Check if batch exists and is active
     batch = crud.get_batch(db, batch_id)
     if not batch:
@@ -136,26 +219,37 @@ def add_item_to_batch_with_details(batch_id: int, item_data: schemas.ItemCreate,
     
     if existing_item:
         # Update existing item and add to batch
-        updated_item = crud.update_item(
-            db,
-            existing_item,
-            name=item_data.name,
-            game=item_data.game,
-            set_name=item_data.set_name,
-            brand=item_data.brand,
-            quantity=item_data.quantity,
-            location=batch.target_location,  # Set to batch target location
-            notes=item_data.notes,
-            price=float(item_data.price) if item_data.price else None,
-            description=item_data.description,
-            batch_id=batch_id,  # Add to batch
-        )
+        try:
+            updated_item = crud.update_item(
+                db,
+                existing_item,
+                reason="batch",
+                station=coalesce.station_name(request),
+                expected_version=expected_version,
+                name=item_data.name,
+                game=item_data.game,
+                set_name=item_data.set_name,
+                brand=item_data.brand,
+                quantity=item_data.quantity,
+                location=batch.target_location,  # Set to batch target location
+                notes=item_data.notes,
+                price=float(item_data.price) if item_data.price else None,
+                description=item_data.description,
+                batch_id=batch_id,  # Add to batch
+            )
+        except StaleDataError:
+            raise etags.precondition_failed("Item")
         print(f"Updated existing item and added to batch: {updated_item.name}")
+        response.headers["ETag"] = etags.etag(updated_item.version)
         return updated_item
+    if expected_version is not None:
+        raise etags.precondition_failed("Item")
     
     # Create new item with batch information
     item = crud.create_item(
         db,
+        reason="batch",
+        station=coalesce.station_name(request),
         barcode=item_data.barcode,
         name=item_data.name,
         game=item_data.game,
@@ -173,11 +267,12 @@ def add_item_to_batch_with_details(batch_id: int, item_data: schemas.ItemCreate,
     crud.create_scan_event(db, barcode=item_data.barcode)
     
     print(f"Created new item and added to batch: {item.name}")
+    response.headers["ETag"] = etags.etag(item.version)
     return item
 
 
 @router.post("/{batch_id}/transfer")
-def transfer_batch(batch_id: int, transfer_data: schemas.BatchTransferRequest, db: Session = Depends(get_db)):
+def transfer_batch(batch_id: int, transfer_data: schemas.BatchTransferRequest, db: Session = Depends(get_write_db)):
     """Transfer or cancel a batch"""
     if transfer_data.batch_id != batch_id:
         raise HTTPException(status_code=400, detail="Batch ID mismatch")
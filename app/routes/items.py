@@ -1,11 +1,13 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
-from ..db import get_db
-from .. import crud, schemas, models
+from ..db import get_read_db, get_write_db
+from .. import coalesce, crud, encoding, etags, facets, importer, search_cache, suggest, schemas, models
 
-router = APIRouter(prefix="/api/items", tags=["items"])
+router = APIRouter(prefix="/api/items", tags=["items"], route_class=encoding.MsgPackRoute,
+                   default_response_class=encoding.NegotiatedResponse)
 
 
 @router.get("/", response_model=List[schemas.ItemRead])
@@ -13,23 +15,61 @@ def list_items(
     limit: int = Query(500, ge=1, le=5000), 
     offset: int = Query(0, ge=0), 
     search: str = Query(None, description="Search term for name, game, set, or barcode"),
-    db: Session = Depends(get_db)
+    game: str = Query(None),
+    set_name: str = Query(None),
+    brand: str = Query(None),
+    location: str = Query(None),
+    sort: str = Query("id", pattern="^(" + "|".join(crud.ITEM_LIST_SORTS) + ")$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    include_archived: bool = Query(False, description="Also list archived (sold-out, inactive) items"),
+    db: Session = Depends(get_read_db)
 ):
+    filters = {"game": game, "set_name": set_name, "brand": brand, "location": location}
     if search:
-        return crud.get_items(db, skip=offset, limit=limit, search=search)
-    return crud.get_items(db, skip=offset, limit=limit)
+        return search_cache.search_items(db, search, skip=offset, limit=limit, include_archived=include_archived,
+                                         filters=filters, sort=sort, descending=order == "desc")
+    return crud.get_items(db, skip=offset, limit=limit, search=search, include_archived=include_archived,
+                          filters=filters, sort=sort, descending=order == "desc")
+
+
+@router.get("/facets", response_model=schemas.FacetCounts)
+def item_facets(
+    search: str = Query(None, description="Search term for name, game, set, brand, or barcode"),
+    game: str = Query(None),
+    set_name: str = Query(None),
+    brand: str = Query(None),
+    location: str = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    """Counts, quantity and value per game / set / brand / location for the current filters"""
+    return facets.facet_counts(db, search=search, game=game, set_name=set_name, brand=brand, location=location)
+
+
+@router.get("/suggest", response_model=List[schemas.ItemSuggestion])
+def suggest_items(
+    q: str = Query(..., min_length=1, description="Prefix of a card name, set name, or barcode"),
+    limit: int = Query(10, ge=1, le=50),
+    rank: str = Query("quantity", pattern="^(quantity|recent)$"),
+    db: Session = Depends(get_read_db)
+):
+    """Typeahead suggestions from the in-memory prefix index"""
+    return suggest.suggest(db, q, limit=limit, rank=rank)
 
 
 @router.get("/{item_id}", response_model=schemas.ItemRead)
-def get_item(item_id: int, db: Session = Depends(get_db)):
+def get_item(item_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
     item = crud.get_item(db, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
+    if etags.not_modified(request, item.version):
+        return Response(status_code=304, headers={"ETag": etags.etag(item.version)})
+    response.headers["ETag"] = etags.etag(item.version)
     return item
 
 
 @router.post("/", response_model=schemas.ItemRead)
-def create_item(payload: schemas.ItemCreate, db: Session = Depends(get_db)):
+def create_item(payload: schemas.ItemCreate, request: Request, response: Response,
+                db: Session = Depends(get_write_db)):
     if payload.barcode:
         existing = crud.get_item_by_barcode(db, payload.barcode)
         if existing:
@@ -39,12 +79,55 @@ def create_item(payload: schemas.ItemCreate, db: Session = Depends(get_db)):
     if payload.price:
         item_data["price"] = float(payload.price)
     
-    item = crud.create_item(db, **item_data)
+    item = crud.create_item(db, station=coalesce.station_name(request), **item_data)
+    response.headers["ETag"] = etags.etag(item.version)
     return item
 
 
+@router.post("/import", response_model=schemas.ImportSummary)
+async def import_items(
+    request: Request,
+    format: str = Query(None, pattern="^(csv|ndjson)$", description="Defaults from the Content-Type header"),
+    quantity_mode: str = Query("set", pattern="^(set|add)$", description="Replace or add to existing quantities"),
+    chunk_size: int = Query(importer.DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_write_db)
+):
+    """Stream a CSV or NDJSON catalog upload and upsert items by barcode, one chunk per commit"""
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    return await importer.import_stream(
+        request.stream(), db, format, add_quantity=quantity_mode == "add", chunk_size=chunk_size
+    )
+
+
+@router.patch("/bulk", response_model=schemas.ItemBulkUpdateResult)
+def bulk_update_items(payload: schemas.ItemBulkUpdate, request: Request, db: Session = Depends(get_write_db)):
+    """Change many items at once, selected by ids, barcodes, or a filter"""
+    selectors = [s for s in (payload.ids, payload.barcodes, payload.filter) if s is not None]
+    if len(selectors) != 1:
+        raise HTTPException(status_code=400, detail="Provide exactly one of ids, barcodes, or filter")
+    filters = payload.filter.dict(exclude_unset=True) if payload.filter else None
+    if payload.filter is not None and not filters:
+        raise HTTPException(status_code=400, detail="Filter must set at least one field")
+
+    changes = payload.changes.dict(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No changes given")
+    if changes.get("batch_id") is not None and not crud.batch_exists(db, changes["batch_id"]):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if changes.get("price") is not None:
+        changes["price"] = float(changes["price"])
+
+    updated = crud.bulk_update_items(db, changes, ids=payload.ids, barcodes=payload.barcodes, filters=filters,
+                                     station=coalesce.station_name(request))
+    return schemas.ItemBulkUpdateResult(updated=updated)
+
+
 @router.patch("/{item_id}", response_model=schemas.ItemRead)
-def update_item(item_id: int, payload: schemas.ItemUpdate, db: Session = Depends(get_db)):
+def update_item(item_id: int, payload: schemas.ItemUpdate, request: Request, response: Response,
+                db: Session = Depends(get_write_db)):
+    expected_version = etags.if_match(request)
     item = crud.get_item(db, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -53,14 +136,33 @@ def update_item(item_id: int, payload: schemas.ItemUpdate, db: Session = Depends
     if payload.price:
         update_data["price"] = float(payload.price)
     
-    updated = crud.update_item(db, item, **update_data)
+    try:
+        updated = crud.update_item(db, item, station=coalesce.station_name(request),
+                                   expected_version=expected_version, **update_data)
+    except StaleDataError:
+        raise etags.precondition_failed("Item")
+    response.headers["ETag"] = etags.etag(updated.version)
     return updated
 
 
+@router.get("/{item_id}/movements", response_model=List[schemas.StockMovementRead])
+def item_movements(
+    item_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    before_id: int = Query(None, description="Page further back: the smallest id already seen"),
+    db: Session = Depends(get_read_db)
+):
+    """The item's stock movement ledger, newest first"""
+    return crud.get_item_movements(db, item_id, limit=limit, before_id=before_id)
+
+
 @router.delete("/{item_id}")
-def delete_item(item_id: int, db: Session = Depends(get_db)):
-    item = crud.get_item(db, item_id)
-    if not item:
+def delete_item(item_id: int, request: Request, db: Session = Depends(get_write_db)):
+    try:
+        deleted = crud.delete_item(db, item_id, station=coalesce.station_name(request),
+                                   expected_version=etags.if_match(request))
+    except StaleDataError:
+        raise etags.precondition_failed("Item")
+    if not deleted:
         raise HTTPException(status_code=404, detail="Item not found")
-    crud.delete_item(db, item_id)
     return {"message": "Item deleted successfully"}
\ No newline at end of file
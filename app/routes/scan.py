@@ -1,70 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
-from ..db import get_db
-from .. import crud, schemas
+from ..db import get_write_db
+from .. import catalog, coalesce, crud, encoding, etags, schemas
 
-router = APIRouter(prefix="/api", tags=["scan"])
+router = APIRouter(prefix="/api", tags=["scan"], route_class=encoding.MsgPackRoute,
+                   default_response_class=encoding.NegotiatedResponse)
 
 
 @router.post("/scan", response_model=schemas.ScanResponse)
-def scan_barcode(payload: schemas.ScanRequest, db: Session = Depends(get_db)):
+def scan_barcode(payload: schemas.ScanRequest, request: Request, response: Response,
+                 db: Session = Depends(get_write_db)):
     barcode = payload.barcode.strip()
     increment = payload.increment or 1
 
     print(f"Scan request received for barcode: {barcode}")
 
-    item = crud.get_item_by_barcode(db, barcode)
-    is_new = False
-    
-    if item:
-        print(f"Found existing item: {item.name} (ID: {item.id})")
-        # Don't automatically increment - let the frontend handle the quantity update
-        print(f"Existing item found: {item.name} (qty {item.quantity})")
-    else:
-        print(f"No existing item found, creating basic item...")
-        # Create a basic item with just barcode and quantity
-        item = crud.create_item(db, barcode=barcode, quantity=increment)
-        is_new = True
-        print(f"Created basic item with ID: {item.id}")
+    def apply(increment):
+        item = crud.get_item_by_barcode(db, barcode)
+        is_new = False
+        known = None
+
+        if item:
+            print(f"Found existing item: {item.name} (ID: {item.id})")
+            # Don't automatically increment - let the frontend handle the quantity update
+            print(f"Existing item found: {item.name} (qty {item.quantity})")
+        else:
+            print(f"No existing item found, creating basic item...")
+            # Create a basic item with barcode and quantity, named from the vendor catalog if it knows the card
+            known = catalog.lookup(barcode)
+            item = crud.create_item(db, reason="scan", station=coalesce.station_name(request),
+                                    barcode=barcode, quantity=increment, **(known or {}))
+            is_new = True
+            print(f"Created basic item with ID: {item.id}")
+
+        crud.create_scan_event(db, barcode=barcode)
+        return schemas.ScanResponse(item=schemas.ItemRead.from_orm(item), is_new=is_new,
+                                    catalog_match=known is not None)
 
-    crud.create_scan_event(db, barcode=barcode)
-    return schemas.ScanResponse(item=item, is_new=is_new)
+    key = coalesce.key(request, barcode)
+    result, coalesced = coalesce.scan.submit(key, increment, apply)
+    if coalesced:
+        print(f"Coalesced repeated scan of {barcode} ({coalesce.scan.mode})")
+        response.headers[coalesce.COALESCED_HEADER] = coalesce.scan.mode
+        return result.copy(update={"duplicate": True})
+    return result
 
 
 @router.post("/items/update-quantity", response_model=schemas.ItemRead)
-def update_item_quantity(payload: schemas.QuantityUpdateRequest, db: Session = Depends(get_db)):
+def update_item_quantity(payload: schemas.QuantityUpdateRequest, request: Request, response: Response,
+                         db: Session = Depends(get_write_db)):
     print(f"Updating quantity for barcode: {payload.barcode}")
-    
-    item = crud.get_item_by_barcode(db, payload.barcode)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    
-    # Calculate new quantity based on action
-    current_quantity = item.quantity or 0
-    if payload.action == "add":
-        new_quantity = current_quantity + payload.quantity
-    elif payload.action == "sell":
-        new_quantity = current_quantity - payload.quantity
-        if new_quantity < 0:
-            raise HTTPException(status_code=400, detail="Cannot sell more items than available in inventory")
-    else:
-        raise HTTPException(status_code=400, detail="Invalid action. Must be 'add' or 'sell'")
-    
-    print(f"Updating {item.name}: {current_quantity} -> {new_quantity} ({payload.action} {payload.quantity})")
-    
-    # Update the item quantity
-    updated_item = crud.update_item(db, item, quantity=new_quantity)
-    
-    # Create scan event
-    crud.create_scan_event(db, barcode=payload.barcode)
-    
-    return updated_item
+
+    def apply(quantity):
+        item = crud.get_item_by_barcode(db, payload.barcode)
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+
+        # Calculate new quantity based on action
+        current_quantity = item.quantity or 0
+        if payload.action == "add":
+            new_quantity = current_quantity + quantity
+        elif payload.action == "sell":
+            new_quantity = current_quantity - quantity
+            if new_quantity < 0:
+                raise HTTPException(status_code=400, detail="Cannot sell more items than available in inventory")
+        else:
+            raise HTTPException(status_code=400, detail="Invalid action. Must be 'add' or 'sell'")
+
+        print(f"Updating {item.name}: {current_quantity} -> {new_quantity} ({payload.action} {quantity})")
+
+        # Update the item quantity
+        updated_item = crud.update_item(db, item, reason="sell" if payload.action == "sell" else "scan",
+                                        station=coalesce.station_name(request), quantity=new_quantity)
+
+        # Create scan event
+        crud.create_scan_event(db, barcode=payload.barcode)
+
+        return schemas.ItemRead.from_orm(updated_item)
+
+    key = coalesce.key(request, payload.barcode, payload.action)
+    result, coalesced = coalesce.update_quantity.submit(key, payload.quantity, apply)
+    if coalesced:
+        response.headers[coalesce.COALESCED_HEADER] = coalesce.update_quantity.mode
+    return result
 
 
 @router.post("/items/new", response_model=schemas.ItemRead)
-def create_new_item(item_data: schemas.ItemCreate, db: Session = Depends(get_db)):
+def create_new_item(item_data: schemas.ItemCreate, request: Request, response: Response,
+                    db: Session = Depends(get_write_db)):
     print(f"Processing new item request for barcode: {item_data.barcode}")
+    expected_version = etags.if_match(request)
     
     # Check if item already exists
     existing_item = crud.get_item_by_barcode(db, item_data.barcode)
@@ -72,26 +99,37 @@ def create_new_item(item_data: schemas.ItemCreate, db: Session = Depends(get_db)
     if existing_item:
         print(f"Found existing item with ID {existing_item.id}, updating...")
         # Update the existing item with the new details
-        updated_item = crud.update_item(
-            db,
-            existing_item,
-            name=item_data.name,
-            game=item_data.game,
-            set_name=item_data.set_name,
-            brand=item_data.brand,
-            quantity=item_data.quantity,
-            location=item_data.location,
-            notes=item_data.notes,
-            price=float(item_data.price) if item_data.price else None,
-            description=item_data.description,
-        )
+        try:
+            updated_item = crud.update_item(
+                db,
+                existing_item,
+                station=coalesce.station_name(request),
+                expected_version=expected_version,
+                name=item_data.name,
+                game=item_data.game,
+                set_name=item_data.set_name,
+                brand=item_data.brand,
+                quantity=item_data.quantity,
+                location=item_data.location,
+                notes=item_data.notes,
+                price=float(item_data.price) if item_data.price else None,
+                description=item_data.description,
+            )
+        except StaleDataError:
+            raise etags.precondition_failed("Item")
         print(f"Item updated successfully: {updated_item.name}")
+        response.headers["ETag"] = etags.etag(updated_item.version)
         return updated_item
+    if expected_version is not None:
+        # If-Match names a version of an item that does not exist (any more)
+        raise etags.precondition_failed("Item")
     
     print(f"No existing item found, creating new item...")
     # Create new item with all provided details if it doesn't exist
     item = crud.create_item(
         db,
+        reason="scan",
+        station=coalesce.station_name(request),
         barcode=item_data.barcode,
         name=item_data.name,
         game=item_data.game,
@@ -108,4 +146,5 @@ def create_new_item(item_data: schemas.ItemCreate, db: Session = Depends(get_db)
     crud.create_scan_event(db, barcode=item_data.barcode)
     
     print(f"New item created successfully: {item.name}")
+    response.headers["ETag"] = etags.etag(item.version)
     return item
\ No newline at end of file
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ..db import get_read_db
+from .. import crud, schemas
+
+router = APIRouter(prefix="/api/stock", tags=["stock"])
+
+
+def _utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/as-of", response_model=schemas.QuantityAsOf)
+def quantity_as_of(
+    at: datetime = Query(..., description="Point in time (ISO 8601; UTC unless an offset is given)"),
+    item_id: int = Query(None, description="One item; all stock when omitted"),
+    db: Session = Depends(get_read_db)
+):
+    """Quantity at a past moment, from the nearest snapshot plus the ledger since"""
+    return crud.get_quantity_as_of(db, _utc(at), item_id=item_id)
+
+
+@router.get("/sales", response_model=List[schemas.DailySales])
+def sales_per_day(
+    days: int = Query(30, ge=1, le=366, description="Days back from today when start is omitted"),
+    start: datetime = Query(None),
+    end: datetime = Query(None, description="Exclusive; defaults to the end of today (UTC)"),
+    item_id: int = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    """Units sold per day, from 'sell' movements"""
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    end = _utc(end) if end else today + timedelta(days=1)
+    start = _utc(start) if start else end - timedelta(days=days)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end - start > timedelta(days=366):
+        raise HTTPException(status_code=400, detail="At most 366 days per request")
+    return crud.get_sales_per_day(db, start, end, item_id=item_id)
@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Optional, List
+from datetime import date, datetime
+from typing import Any, Optional, List, Dict
 from decimal import Decimal
 from pydantic import BaseModel, Field, validator
 
@@ -47,15 +47,100 @@ class ItemUpdate(BaseModel):
         return v
 
 
+class ItemFilter(BaseModel):
+    game: Optional[str] = None
+    set_name: Optional[str] = None
+    location: Optional[str] = None
+    batch_id: Optional[int] = None
+
+
+class ItemBulkChanges(BaseModel):
+    name: Optional[str] = None
+    game: Optional[str] = None
+    set_name: Optional[str] = None
+    brand: Optional[str] = None
+    quantity: Optional[int] = None
+    location: Optional[str] = None
+    notes: Optional[str] = None
+    price: Optional[Decimal] = None
+    description: Optional[str] = None
+    batch_id: Optional[int] = None
+
+    @validator('location')
+    def validate_location(cls, v):
+        if v and v not in ["Storage", "Show"]:
+            raise ValueError("Location must be either 'Storage' or 'Show'")
+        return v
+
+    @validator('quantity')
+    def validate_quantity(cls, v):
+        # Unlike a single-item edit, a null quantity here would zero stock across the whole selection
+        if v is None:
+            raise ValueError("Quantity cannot be null in a bulk edit; leave it out to keep quantities")
+        if v < 0:
+            raise ValueError("Quantity cannot be negative")
+        return v
+
+
+class ItemBulkUpdate(BaseModel):
+    ids: Optional[List[int]] = Field(default=None, max_length=30000)
+    barcodes: Optional[List[str]] = Field(default=None, max_length=30000)
+    filter: Optional[ItemFilter] = None
+    changes: ItemBulkChanges
+
+
+class ItemBulkUpdateResult(BaseModel):
+    updated: int
+
+
 class ItemRead(ItemBase):
     id: int
     created_at: datetime
     updated_at: datetime
+    # Row version, also sent as the ETag; pass it back in If-Match to update safely
+    version: int = 1
+    # Set on archived items, which listings only include on request
+    archived_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
 
+class FacetBucket(BaseModel):
+    value: Optional[str] = None
+    count: int
+    quantity: int
+    total_value: float
+
+
+class FacetCounts(BaseModel):
+    count: int
+    quantity: int
+    total_value: float
+    facets: Dict[str, List[FacetBucket]]
+
+
+class ItemSuggestion(BaseModel):
+    id: int
+    name: Optional[str] = None
+    set_name: Optional[str] = None
+    barcode: Optional[str] = None
+    quantity: int
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportSummary(BaseModel):
+    rows_read: int
+    rows_imported: int
+    rows_failed: int
+    chunks: int
+    errors: List[ImportRowError] = []
+
+
 class ScanRequest(BaseModel):
     barcode: str
     increment: Optional[int] = 1
@@ -64,6 +149,10 @@ class ScanRequest(BaseModel):
 class ScanResponse(BaseModel):
     item: ItemRead
     is_new: bool
+    # Repeat of a scan handled moments ago; no separate write was made
+    duplicate: bool = False
+    # A new item's name, game, set and brand were filled in from the vendor catalog
+    catalog_match: bool = False
 
 
 class QuantityUpdateRequest(BaseModel):
@@ -107,14 +196,29 @@ class BatchRead(BatchBase):
     is_active: bool
     created_at: datetime
     updated_at: datetime
+    version: int = 1
     item_count: Optional[int] = 0
 
     class Config:
         from_attributes = True
 
 
-class BatchWithItems(BatchRead):
-    items: List[ItemRead] = []
+class BatchGameSummary(BaseModel):
+    game: Optional[str] = None
+    item_count: int
+    total_quantity: int
+    total_value: float
+
+
+class BatchSummary(BatchRead):
+    total_quantity: int = 0
+    total_value: float = 0
+    games: List[BatchGameSummary] = []
+
+
+class BatchItemsPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
 
 
 class BatchScanRequest(BaseModel):
@@ -139,4 +243,69 @@ class ScanEventRead(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class StockMovementRead(BaseModel):
+    id: int
+    item_id: int
+    delta: int
+    reason: str
+    station: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class QuantityAsOf(BaseModel):
+    item_id: Optional[int] = None
+    at: datetime
+    quantity: int
+    snapshot_at: Optional[datetime] = None
+    movements_replayed: int
+
+
+class DailySales(BaseModel):
+    day: date
+    units: int
+    sales: int
+
+
+class ReorderPointUpdate(BaseModel):
+    item_id: Optional[int] = None
+    set_name: Optional[str] = None
+    # Alert when quantity falls to or below this; null clears the reorder point
+    threshold: Optional[int] = Field(None, ge=0)
+
+    @validator('set_name', always=True)
+    def one_target(cls, v, values):
+        if (values.get('item_id') is None) == (v is None):
+            raise ValueError('Give either item_id or set_name')
+        return v
+
+
+class ReorderPointRead(BaseModel):
+    id: int
+    item_id: Optional[int] = None
+    set_name: Optional[str] = None
+    threshold: int
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class StockAlertRead(BaseModel):
+    id: int
+    item_id: int
+    barcode: Optional[str] = None
+    name: Optional[str] = None
+    set_name: Optional[str] = None
+    threshold: int
+    quantity: int
+    created_at: datetime
+    resolved_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,185 @@
+"""
+LRU cache of item search results (``GET /api/items?search=``).
+
+Results are cached per database under the normalized search term plus the
+filters, sort, offset and limit, as ready-to-serialize ``ItemRead`` models.
+Every entry remembers the inventory generation it was read at; item writes
+reported through ``events`` bump the generation, which invalidates every
+entry at once in O(1). Writes that only change quantities (scans, sales)
+patch the affected items in place instead, so busy scanning does not empty
+the cache, except for entries sorted by quantity or update time.
+
+A result read while the generation moved on is not stored. Each process keeps
+its own cache; writes made by other processes invalidate it through the
+``change_counters`` check in ``events``, and entries also expire after
+``CARD_INV_SEARCH_CACHE_TTL`` seconds. ``CARD_INV_SEARCH_CACHE_SIZE`` bounds
+the entries (0 disables the cache).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from . import crud, events, schemas
+
+SEARCH_CACHE_SIZE = int(os.getenv("CARD_INV_SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.getenv("CARD_INV_SEARCH_CACHE_TTL", "60"))
+
+# Item fields a quantity change touches; any other field change invalidates everything
+_QUANTITY_FIELDS = {"quantity", "updated_at", "version"}
+# Orders a quantity change can reshuffle
+_QUANTITY_SORTS = {"quantity", "updated_at"}
+
+
+def normalize(search: str) -> str:
+    """Cache key and query term: trimmed, and lower-cased where ILIKE ignores case (ASCII)."""
+    search = search.strip()
+    return search.lower() if search.isascii() else search
+
+
+class _Entry:
+    __slots__ = ("generation", "expires", "rows", "ids", "sort")
+
+    def __init__(self, generation, expires, rows, sort):
+        self.generation = generation
+        self.expires = expires
+        self.rows = rows
+        self.ids = {row.id: index for index, row in enumerate(rows)}
+        self.sort = sort
+
+
+class SearchCache:
+    def __init__(self, size: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.lock = threading.Lock()
+        self.loaded = True
+        self.stale = False
+        self.uses_items = False  # set-based writes just start a new generation
+        self.size = size
+        self.ttl = ttl
+        self.generation = 0
+        # Bumped by in-place quantity patches, so a result read before one is not stored after it
+        self.patches = 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.patched = 0
+
+    # -- ViewRegistry protocol ---------------------------------------------------
+
+    def load(self, db: Session) -> None:
+        # Only reached when another process changed the items (the lock is already held)
+        self.generation += 1
+        self.invalidations += 1
+        self.stale = False
+
+    def upsert_item(self, item, fields=None) -> None:
+        if fields is not None and fields <= _QUANTITY_FIELDS:
+            self._patch_quantity(item)
+        else:
+            self.invalidate()
+
+    def remove(self, item_id: int) -> None:
+        self.invalidate()
+
+    def invalidate(self, fields=None) -> None:
+        with self.lock:
+            # Old entries are skipped on lookup and age out of the LRU
+            self.generation += 1
+            self.invalidations += 1
+
+    # -------------------------------------------------------------------------
+
+    def _patch_quantity(self, item) -> None:
+        with self.lock:
+            self.patches += 1
+            for key, entry in list(self._entries.items()):
+                index = entry.ids.get(item.id)
+                if index is None or entry.generation != self.generation:
+                    continue
+                if entry.sort in _QUANTITY_SORTS:
+                    del self._entries[key]
+                    continue
+                entry.rows[index] = entry.rows[index].copy(
+                    update={"quantity": item.quantity, "updated_at": item.updated_at, "version": item.version})
+                self.patched += 1
+
+    def begin(self) -> tuple:
+        """Token to pass to ``put`` for a result read from now on."""
+        return self.generation, self.patches
+
+    def get(self, key):
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.generation == self.generation and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry.rows)
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, token: tuple, rows: list, sort: str) -> None:
+        with self.lock:
+            if token != (self.generation, self.patches):
+                return
+            self._entries[key] = _Entry(self.generation, time.monotonic() + self.ttl, list(rows), sort)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+            "patched_rows": self.patched,
+        }
+
+
+caches = events.ViewRegistry(SearchCache)
+
+
+def search_items(db: Session, search: str, skip: int = 0, limit: int = 100, include_archived: bool = False,
+                 filters: dict = None, sort: str = "id", descending: bool = False) -> list:
+    """``crud.get_items`` for a search term, as ``ItemRead`` models, served from the cache when possible."""
+    search = normalize(search)
+    if SEARCH_CACHE_SIZE <= 0 or not search:
+        items = crud.get_items(db, skip=skip, limit=limit, search=search or None, include_archived=include_archived,
+                               filters=filters, sort=sort, descending=descending)
+        return [schemas.ItemRead.from_orm(item) for item in items]
+
+    cache = caches.get(db)
+    key = (search, tuple(sorted((filters or {}).items())), sort, descending, include_archived, skip, limit)
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+    token = cache.begin()
+    items = crud.get_items(db, skip=skip, limit=limit, search=search, include_archived=include_archived,
+                           filters=filters, sort=sort, descending=descending)
+    rows = [schemas.ItemRead.from_orm(item) for item in items]
+    cache.put(key, token, rows, sort)
+    return rows
+
+
+def stats():
+    views = caches.views()
+    if not views:
+        return None
+    totals = {"entries": 0, "hits": 0, "misses": 0, "invalidations": 0, "patched_rows": 0}
+    for cache in views.values():
+        for name, value in cache.stats().items():
+            if name in totals:
+                totals[name] += value
+    lookups = totals["hits"] + totals["misses"]
+    totals["hit_ratio"] = round(totals["hits"] / lookups, 3) if lookups else None
+    totals["databases"] = len(views)
+    return totals
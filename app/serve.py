@@ -0,0 +1,230 @@
+"""
+Production launcher: ``python -m app.serve [--port 8000] [--workers N]``.
+
+Checks the schema once, before any worker starts (creating a fresh database
+or, with ``CARD_INV_AUTO_MIGRATE=1``, upgrading it), so workers never race
+each other through ``create_all`` or a migration. Then runs uvicorn with:
+
+- Workers: one by default. The in-memory views (facets, suggestions, search
+  cache, reorder points) are per process; other workers' writes reach them
+  through the change counters within ``CARD_INV_VIEW_CHECK_SECONDS``, so with
+  several workers a read can trail a write made through another worker by
+  that long, and single-flight reads and scan coalescing only merge requests
+  that land on the same worker. On other backends than SQLite,
+  ``CARD_INV_WORKERS`` or ``--workers`` asks for more: a number, or 0 for one
+  per available core (affinity and cgroup CPU quota respected), reduced until
+  their connection pools fit ``CARD_INV_DB_MAX_CONNECTIONS`` (100). SQLite
+  always gets one (one writer process). With several workers the backup,
+  archive and snapshot schedulers run once, in this supervisor process,
+  instead of in every worker.
+- uvloop and httptools when installed, the stock asyncio loop and h11 otherwise.
+- A worker thread pool sized to the database pools (``configure_threadpool``),
+  so sync endpoints queue for a thread rather than for a connection while
+  holding one. ``CARD_INV_THREADS`` overrides it.
+- Graceful shutdown: on SIGTERM workers stop accepting connections and let
+  in-flight requests (scans waiting out a coalescing window included) finish
+  for up to ``CARD_INV_SHUTDOWN_GRACE`` (20) seconds before cancelling them.
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import sys
+from pathlib import Path
+
+APP = "app.main:app"
+HOST = os.getenv("CARD_INV_HOST", "0.0.0.0")
+PORT = int(os.getenv("CARD_INV_PORT", "8000"))
+WORKERS = int(os.getenv("CARD_INV_WORKERS", "1"))
+THREADS = int(os.getenv("CARD_INV_THREADS", "0"))
+DB_MAX_CONNECTIONS = int(os.getenv("CARD_INV_DB_MAX_CONNECTIONS", "100"))
+SHUTDOWN_GRACE = int(os.getenv("CARD_INV_SHUTDOWN_GRACE", "20"))
+SSL_CERTFILE = os.getenv("CARD_INV_SSL_CERTFILE")
+SSL_KEYFILE = os.getenv("CARD_INV_SSL_KEYFILE")
+
+# Never fewer threads than this, whatever the pools say
+MIN_THREADS = 4
+MIN_READ_POOL_SIZE = 2
+
+
+def available_cpus() -> int:
+    """Cores this process may use: its CPU affinity, capped by a cgroup CPU quota (docker --cpus)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        limit, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            limit = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+            period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def pool_capacity(engine) -> int:
+    """Connections an engine's pool can hand out at once; 1 for pools without a size (in-memory SQLite)."""
+    size = getattr(engine.pool, "size", None)
+    if not callable(size):
+        return 1
+    return size() + max(0, getattr(engine.pool, "_max_overflow", 0))
+
+
+def threadpool_size() -> int:
+    if THREADS > 0:
+        return THREADS
+    from .db import engine, read_engine
+
+    capacity = pool_capacity(engine)
+    if read_engine is not engine:
+        capacity += pool_capacity(read_engine)
+    return max(MIN_THREADS, capacity)
+
+
+def configure_threadpool() -> int:
+    """Size the worker thread pool for sync endpoints; call from the event loop (app startup)."""
+    from anyio import to_thread
+
+    threads = threadpool_size()
+    to_thread.current_default_thread_limiter().total_tokens = threads
+    return threads
+
+
+def _read_pool_size(cpus: int, workers: int) -> int:
+    # Several workers split the cores between their reader pools
+    if workers == 1 or os.getenv("CARD_INV_READ_POOL_SIZE"):
+        from .db import READ_POOL_SIZE
+
+        return READ_POOL_SIZE
+    return max(MIN_READ_POOL_SIZE, cpus // workers)
+
+
+def choose_workers(requested: int = WORKERS) -> tuple:
+    """(worker count, read pool size per worker, reason)."""
+    from . import tenancy
+    from .db import DATABASE_URL, READ_DATABASE_URL, _is_sqlite, engine
+
+    cpus = available_cpus()
+    if _is_sqlite(DATABASE_URL) or tenancy.enabled():
+        reason = "SQLite: one writer process"
+        if requested > 1:
+            reason += f", --workers {requested} ignored"
+        return 1, _read_pool_size(cpus, 1), reason
+    if requested == 1:
+        return 1, _read_pool_size(cpus, 1), "default; in-memory views are per worker"
+    if requested > 0:
+        return requested, _read_pool_size(cpus, requested), "requested"
+
+    def connections(workers: int) -> int:
+        read = 2 * _read_pool_size(cpus, workers) if READ_DATABASE_URL != DATABASE_URL else 0
+        return workers * (pool_capacity(engine) + read)
+
+    workers = cpus
+    while workers > 1 and connections(workers) > DB_MAX_CONNECTIONS:
+        workers -= 1
+    return workers, _read_pool_size(cpus, workers), (
+        f"{cpus} available cores, {connections(workers)} of {DB_MAX_CONNECTIONS} database connections")
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def preflight() -> None:
+    """Create or check the schema once, before workers start."""
+    from .db import engine
+    from .migrations import ensure_schema
+
+    try:
+        ensure_schema(engine, auto_upgrade=os.getenv("CARD_INV_AUTO_MIGRATE") == "1")
+    finally:
+        engine.dispose()
+
+
+def _start_schedulers() -> list:
+    from . import archive, backup, ledger
+
+    schedulers = [backup.scheduler, archive.scheduler, ledger.scheduler]
+    for scheduler in schedulers:
+        scheduler.start()
+    return schedulers
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="Run the card inventory API")
+    parser.add_argument("--host", default=HOST, help="Bind address (default: CARD_INV_HOST or 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=PORT, help="Port (default: CARD_INV_PORT or 8000)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Worker processes; 0 picks from cores and database (default: CARD_INV_WORKERS or 1)")
+    parser.add_argument("--ssl-certfile", default=SSL_CERTFILE, help="TLS certificate (default: CARD_INV_SSL_CERTFILE)")
+    parser.add_argument("--ssl-keyfile", default=SSL_KEYFILE, help="TLS key (default: CARD_INV_SSL_KEYFILE)")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--dry-run", action="store_true", help="Print the chosen settings and exit")
+    args = parser.parse_args(argv)
+
+    if args.workers < 0:
+        parser.error("--workers cannot be negative")
+    if bool(args.ssl_certfile) != bool(args.ssl_keyfile):
+        parser.error("--ssl-certfile and --ssl-keyfile go together")
+
+    workers, read_pool_size, reason = choose_workers(args.workers)
+    loop, http = event_loop(), http_protocol()
+    scheme = "https" if args.ssl_certfile else "http"
+    print(f"Serving {APP} on {scheme}://{args.host}:{args.port}: "
+          f"{workers} worker{'s' if workers != 1 else ''} ({reason}), {loop}, {http}, "
+          f"read pool {read_pool_size}, {SHUTDOWN_GRACE}s shutdown grace")
+    if args.dry_run:
+        return 0
+
+    from .migrations import SchemaVersionError
+
+    try:
+        preflight()
+    except SchemaVersionError as exc:
+        print(f"Not starting: {exc}", file=sys.stderr)
+        return 1
+
+    schedulers = []
+    if workers > 1:
+        # Workers are spawned and read their settings from the environment
+        os.environ["CARD_INV_READ_POOL_SIZE"] = str(read_pool_size)
+        os.environ["CARD_INV_SCHEDULERS"] = "0"
+        schedulers = _start_schedulers()
+
+    import uvicorn
+
+    try:
+        uvicorn.run(
+            APP,
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            loop=loop,
+            http=http,
+            timeout_graceful_shutdown=SHUTDOWN_GRACE,
+            ssl_certfile=args.ssl_certfile,
+            ssl_keyfile=args.ssl_keyfile,
+            log_level=args.log_level,
+        )
+    finally:
+        for scheduler in schedulers:
+            scheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
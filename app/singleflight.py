@@ -0,0 +1,181 @@
+"""
+Single-flight coalescing of identical concurrent API reads.
+
+When a batch is transferred every open station reloads the same pages at
+once. A GET arriving while an identical one (same store, path, normalized
+query string and ``Accept``/``If-None-Match`` headers) is still being served
+does not run the endpoint again: it waits for that request to finish and is
+sent the same status, headers and body bytes, marked ``X-Single-Flight:
+shared``. N simultaneous reloads cost one query and one serialization.
+
+Freshness is kept per store by a write generation: every API write request
+bumps it when it completes, and the generation is part of the key, so a read
+issued after a write never joins a flight that started before it.
+
+A follower waits at most ``CARD_INV_SINGLE_FLIGHT_MAX_WAIT`` seconds, then
+runs the request itself; so do followers of a flight that failed or whose
+body grew beyond ``CARD_INV_SINGLE_FLIGHT_MAX_BYTES`` (streamed exports).
+``CARD_INV_SINGLE_FLIGHT=0`` turns the middleware off.
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+from .db import current_store
+
+SINGLE_FLIGHT_ENABLED = os.getenv("CARD_INV_SINGLE_FLIGHT", "1") != "0"
+SINGLE_FLIGHT_MAX_WAIT = float(os.getenv("CARD_INV_SINGLE_FLIGHT_MAX_WAIT", "5"))
+SINGLE_FLIGHT_MAX_BYTES = int(os.getenv("CARD_INV_SINGLE_FLIGHT_MAX_BYTES", str(8 * 1024 * 1024)))
+
+SHARED_PREFIX = "/api/"
+# Admin responses are not shared, and the alert stream never completes
+EXEMPT_PREFIXES = ("/api/admin", "/api/alerts/stream")
+SHARED_HEADER = b"x-single-flight"
+# Request headers that change the response, so they are part of the key
+KEY_HEADERS = (b"accept", b"if-none-match")
+
+
+def normalize_query(query_string: bytes) -> tuple:
+    """Query parameters in a canonical order, so ``?a=1&b=2`` and ``?b=2&a=1`` share a flight."""
+    return tuple(sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)))
+
+
+class _Flight:
+    __slots__ = ("done", "response")
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.response = None
+
+    def finish(self, response) -> None:
+        if not self.done.is_set():
+            self.response = response
+            self.done.set()
+
+
+class SingleFlight:
+    """In-flight GETs by key, used from the event loop only."""
+
+    def __init__(self, max_wait: float = SINGLE_FLIGHT_MAX_WAIT, max_bytes: int = SINGLE_FLIGHT_MAX_BYTES):
+        self.max_wait = max_wait
+        self.max_bytes = max_bytes
+        self._flights = {}
+        self._generations = defaultdict(int)
+        self.leaders = 0
+        self.shared = 0
+        self.timed_out = 0
+        self.not_shared = 0
+
+    def key(self, scope, store_id) -> tuple:
+        headers = tuple(value for name, value in scope.get("headers", ()) if name in KEY_HEADERS)
+        return (store_id, self._generations[store_id], scope.get("path", ""),
+                normalize_query(scope.get("query_string", b"")), headers)
+
+    def wrote(self, store_id) -> None:
+        self._generations[store_id] += 1
+
+    def join(self, key):
+        return self._flights.get(key)
+
+    def lead(self, key) -> _Flight:
+        flight = self._flights[key] = _Flight()
+        self.leaders += 1
+        return flight
+
+    def land(self, key, flight: _Flight, response=None) -> None:
+        """End a flight; followers get ``response``, or run the request themselves when it is None."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.finish(response)
+
+    async def wait(self, flight: _Flight):
+        try:
+            await asyncio.wait_for(flight.done.wait(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return None
+        if flight.response is None:
+            self.not_shared += 1
+        else:
+            self.shared += 1
+        return flight.response
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "timed_out": self.timed_out,
+            "not_shared": self.not_shared,
+            "max_wait_seconds": self.max_wait,
+        }
+
+
+flights = SingleFlight()
+
+
+def stats():
+    return flights.stats() if SINGLE_FLIGHT_ENABLED else None
+
+
+class SingleFlightMiddleware:
+    def __init__(self, app, single_flight: SingleFlight = None):
+        self.app = app
+        self.flights = single_flight or flights
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(SHARED_PREFIX) or path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        store = current_store.get()
+        store_id = store.store_id if store is not None else None
+        if scope["method"] in ("HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] != "GET":
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.flights.wrote(store_id)
+            return
+
+        key = self.flights.key(scope, store_id)
+        flight = self.flights.join(key)
+        if flight is not None:
+            response = await self.flights.wait(flight)
+            if response is not None:
+                status, headers, body = response
+                await send({"type": "http.response.start", "status": status,
+                            "headers": headers + [(SHARED_HEADER, b"shared")]})
+                await send({"type": "http.response.body", "body": body})
+            else:
+                await self.app(scope, receive, send)
+            return
+
+        flight = self.flights.lead(key)
+        response = {"status": 0, "headers": [], "body": bytearray(), "shareable": True}
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", ()))
+            elif message["type"] == "http.response.body" and response["shareable"]:
+                response["body"].extend(message.get("body", b""))
+                if len(response["body"]) > self.flights.max_bytes:
+                    # Too large to hold for others: release them now to run on their own
+                    response["shareable"] = False
+                    response["body"] = bytearray()
+                    self.flights.land(key, flight)
+            await send(message)
+
+        shared = None
+        try:
+            await self.app(scope, receive, recording_send)
+            if response["shareable"] and response["status"]:
+                shared = (response["status"], response["headers"], bytes(response["body"]))
+        finally:
+            self.flights.land(key, flight, shared)
@@ -0,0 +1,288 @@
+"""
+In-memory prefix index for search-as-you-type suggestions.
+
+Names and set names are normalized (lower-cased, accents stripped) and split
+into word tokens; barcodes are indexed whole. Each distinct token maps to the
+ids of the items carrying it, and the tokens are kept sorted in blocks
+(``SortedList``), so a prefix lookup bisects to the first matching token and
+adding or dropping a token shifts one block rather than the whole index.
+Items are also kept in rank order, by quantity and by recency.
+
+A lookup first counts, up to ``DENSE_MATCHES``, the items each query word
+matches. When one word matches fewer, its items are gathered and ranked in
+full. When every word matches more (a first letter, a shared barcode
+prefix), items are walked in rank order and the first ``limit`` that match
+every word are the answer, which a dense match finds after a few hundred
+items. The walk stops after ``MAX_WALK`` items, so words that are each
+common but rarely occur together may return fewer than ``limit``
+suggestions; the ones returned are still the top ranked. The index is loaded
+lazily on the first suggestion request and maintained incrementally from
+item writes.
+"""
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from datetime import timezone
+from itertools import islice
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+INDEXED_FIELDS = ("name", "set_name", "barcode")
+# Entries per block of a SortedList
+BLOCK_SIZE = 1000
+# A query word matching more items than this is answered by walking items in rank order
+DENSE_MATCHES = 2000
+# Items a rank-order walk looks at before giving up on filling the limit
+MAX_WALK = 4000
+
+_LOAD_BATCH = 10000
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(name, set_name, barcode) -> set:
+    tokens = set(_WORD.findall(normalize(name)))
+    tokens.update(_WORD.findall(normalize(set_name)))
+    if barcode:
+        tokens.add(normalize(barcode))
+    return tokens
+
+
+# Rank keys end in (item id, token text): ids keep them unique, and a walk in rank order tests the text
+# without looking the item up
+def _quantity_key(item_id: int, quantity: int, token_text: str) -> tuple:
+    return -quantity, item_id, token_text
+
+
+def _recent_key(item_id: int, updated_at, token_text: str) -> tuple:
+    if updated_at is None:
+        return 1, 0.0, item_id, token_text
+    # SQLite hands back naive UTC times, writes may carry aware ones
+    return 0, -updated_at.replace(tzinfo=timezone.utc).timestamp(), item_id, token_text
+
+
+class SortedList:
+    """Sorted entries in blocks: inserts and deletes cost one block, not the whole list."""
+
+    def __init__(self, entries=(), block: int = BLOCK_SIZE):
+        entries = sorted(entries)
+        self.block = block
+        self._blocks = [entries[i:i + block] for i in range(0, len(entries), block)]
+        self._firsts = [block_entries[0] for block_entries in self._blocks]
+
+    def __len__(self) -> int:
+        return sum(len(block_entries) for block_entries in self._blocks)
+
+    def __iter__(self):
+        for block_entries in self._blocks:
+            yield from block_entries
+
+    def add(self, entry) -> None:
+        if not self._blocks:
+            self._blocks.append([entry])
+            self._firsts.append(entry)
+            return
+        index = max(0, bisect_right(self._firsts, entry) - 1)
+        block_entries = self._blocks[index]
+        insort(block_entries, entry)
+        self._firsts[index] = block_entries[0]
+        if len(block_entries) > 2 * self.block:
+            self._blocks[index:index + 1] = [block_entries[:self.block], block_entries[self.block:]]
+            self._firsts[index:index + 1] = [block_entries[0], block_entries[self.block]]
+
+    def discard(self, entry) -> None:
+        index = bisect_right(self._firsts, entry) - 1
+        if index < 0:
+            return
+        block_entries = self._blocks[index]
+        position = bisect_left(block_entries, entry)
+        if position < len(block_entries) and block_entries[position] == entry:
+            del block_entries[position]
+            if block_entries:
+                self._firsts[index] = block_entries[0]
+            else:
+                del self._blocks[index]
+                del self._firsts[index]
+
+    def prefixed(self, prefix: str, limit: int = None) -> list:
+        """The (string) entries starting with ``prefix``, in order; at most about ``limit`` of them."""
+        end = prefix + "\U0010ffff"
+        found = []
+        for index in range(max(0, bisect_right(self._firsts, prefix) - 1), len(self._blocks)):
+            block_entries = self._blocks[index]
+            stop = bisect_left(block_entries, end)
+            found.extend(block_entries[bisect_left(block_entries, prefix):stop])
+            if stop < len(block_entries) or (limit is not None and len(found) > limit):
+                break
+        return found
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.stale = False
+        self.uses_items = True
+        self._tokens = SortedList()
+        self._postings = {}  # token -> set of item ids
+        self._items = {}     # item_id -> (name, set_name, barcode, quantity, updated_at, tokens, token_text)
+        self._by_quantity = SortedList()  # _quantity_key of every item
+        self._by_recent = SortedList()    # _recent_key of every item
+
+    # -- maintenance -------------------------------------------------------
+
+    def _unrank(self, item_id: int, entry: tuple) -> None:
+        self._by_quantity.discard(_quantity_key(item_id, entry[3], entry[6]))
+        self._by_recent.discard(_recent_key(item_id, entry[4], entry[6]))
+
+    def _rank(self, item_id: int, entry: tuple) -> None:
+        self._by_quantity.add(_quantity_key(item_id, entry[3], entry[6]))
+        self._by_recent.add(_recent_key(item_id, entry[4], entry[6]))
+
+    def _remove(self, item_id: int) -> None:
+        entry = self._items.pop(item_id, None)
+        if entry is None:
+            return
+        self._unrank(item_id, entry)
+        for token in entry[5]:
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[token]
+                self._tokens.discard(token)
+
+    def _add(self, item_id, name, set_name, barcode, quantity, updated_at, bulk=False) -> None:
+        tokens = tokenize(name, set_name, barcode)
+        token_text = "".join(" " + token for token in tokens)
+        entry = self._items[item_id] = (name, set_name, barcode, quantity or 0, updated_at, tokens, token_text)
+        if not bulk:
+            self._rank(item_id, entry)
+        for token in tokens:
+            ids = self._postings.get(token)
+            if ids is None:
+                self._postings[token] = {item_id}
+                if not bulk:
+                    self._tokens.add(token)
+            else:
+                ids.add(item_id)
+
+    def load(self, db: Session) -> None:
+        columns = [models.Item.id, models.Item.name, models.Item.set_name, models.Item.barcode,
+                   models.Item.quantity, models.Item.updated_at]
+        with self.lock:
+            self._postings = {}
+            self._items = {}
+            result = db.execute(select(*columns).execution_options(yield_per=_LOAD_BATCH))
+            for row in result:
+                self._add(*row, bulk=True)
+            self._tokens = SortedList(self._postings)
+            self._by_quantity = SortedList(_quantity_key(item_id, entry[3], entry[6])
+                                           for item_id, entry in self._items.items())
+            self._by_recent = SortedList(_recent_key(item_id, entry[4], entry[6])
+                                         for item_id, entry in self._items.items())
+            self.loaded = True
+            self.stale = False
+
+    def upsert_item(self, item, fields=None) -> None:
+        with self.lock:
+            if not self.loaded:
+                return
+            entry = self._items.get(item.id)
+            if entry is not None and fields is not None and not fields & set(INDEXED_FIELDS):
+                # Quantity-only and other non-text changes keep the tokens
+                self._unrank(item.id, entry)
+                entry = self._items[item.id] = entry[:3] + (item.quantity or 0, item.updated_at) + entry[5:]
+                self._rank(item.id, entry)
+                return
+            self._remove(item.id)
+            self._add(item.id, item.name, item.set_name, item.barcode, item.quantity, item.updated_at)
+
+    def remove(self, item_id: int) -> None:
+        with self.lock:
+            self._remove(item_id)
+
+    def invalidate(self, fields=None) -> None:
+        if fields is None or fields & (set(INDEXED_FIELDS) | {"quantity"}):
+            self.stale = True
+
+    # -- lookups -----------------------------------------------------------
+
+    def _matching(self, word: str):
+        """Posting sets of the tokens starting with ``word``, or None once they hold over ``DENSE_MATCHES`` ids."""
+        # Every token has an item, so more tokens than that is dense already
+        postings = list(map(self._postings.__getitem__, self._tokens.prefixed(word, limit=DENSE_MATCHES)))
+        if sum(map(len, postings)) > DENSE_MATCHES:
+            return None
+        return postings
+
+    def _walk(self, needles: list, limit: int, rank: str) -> list:
+        """The first ``limit`` items in rank order whose text has every needle."""
+        order = self._by_recent if rank == "recent" else self._by_quantity
+        first, rest = needles[0], needles[1:]
+        top = []
+        for key in islice(order, MAX_WALK):
+            token_text = key[-1]
+            # Most items fail the first test, so that one stays inline
+            if first in token_text and all(needle in token_text for needle in rest):
+                top.append(key[-2])
+                if len(top) >= limit:
+                    break
+        return top
+
+    def suggest(self, query: str, limit: int = 10, rank: str = "quantity") -> list:
+        words = set(_WORD.findall(normalize(query)))
+        if not words or limit <= 0:
+            return []
+        with self.lock:
+            matches = [(self._matching(word), word) for word in words]
+            sparse = sorted((entry for entry in matches if entry[0] is not None),
+                            key=lambda entry: sum(map(len, entry[0])))
+            if not sparse:
+                # Longer words tend to be rarer, so test them first
+                top = self._walk([" " + word for word in sorted(words, key=len, reverse=True)], limit, rank)
+            else:
+                # Few enough matches to rank all of them
+                postings, driver = sparse[0]
+                candidates = set().union(*postings)
+                for postings, word in matches:
+                    if word == driver or not candidates:
+                        continue
+                    if postings is not None:
+                        candidates &= set().union(*postings)
+                    else:
+                        needle = " " + word
+                        candidates = {item_id for item_id in candidates if needle in self._items[item_id][6]}
+                if rank == "recent":
+                    key = lambda item_id: _recent_key(item_id, self._items[item_id][4], "")
+                else:
+                    key = lambda item_id: _quantity_key(item_id, self._items[item_id][3], "")
+                top = heapq.nsmallest(limit, candidates, key=key)
+            return [
+                {
+                    "id": item_id,
+                    "name": self._items[item_id][0],
+                    "set_name": self._items[item_id][1],
+                    "barcode": self._items[item_id][2],
+                    "quantity": self._items[item_id][3],
+                }
+                for item_id in top
+            ]
+
+
+indexes = events.ViewRegistry(PrefixIndex)
+
+
+def suggest(db: Session, query: str, limit: int = 10, rank: str = "quantity") -> list:
+    return indexes.get(db).suggest(query, limit=limit, rank=rank)
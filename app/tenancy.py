@@ -0,0 +1,394 @@
+"""
+Multi-store tenancy: one API process serving several shops, each with its own
+SQLite file.
+
+With ``CARD_INV_STORES_DIR`` set, a request picks its store with an
+``X-Store-Id`` header or a ``/stores/<id>/`` path prefix (the web UI served
+under the prefix sends its API calls there too). Requests naming no store use
+``CARD_INV_DB_URL`` exactly as before.
+
+A store's database is ``<CARD_INV_STORES_DIR>/<id>.db``. Its engines are
+opened on first use, after the same schema check the default database gets
+at startup (a new file is created and stamped), and kept in an LRU of at
+most ``CARD_INV_MAX_OPEN_STORES``. Stores idle for
+``CARD_INV_STORE_IDLE_SECONDS`` are closed, which releases their connection
+pools and in-memory views; busy stores are never closed under a request.
+
+Unknown stores get a 404 unless ``CARD_INV_STORE_AUTO_CREATE=1``. Manage the
+files with ``python -m app.tenancy [list|create|migrate]``. The backup,
+archive and snapshot schedulers visit every store file in turn
+(``each_database``).
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+from . import events, profiling
+from .db import DATABASE_URL, create_engines, current_store, session_factories
+
+STORES_DIR = os.getenv("CARD_INV_STORES_DIR")
+STORE_HEADER = "x-store-id"
+PATH_PREFIX = "/stores/"
+MAX_OPEN_STORES = int(os.getenv("CARD_INV_MAX_OPEN_STORES", "32"))
+STORE_IDLE_SECONDS = float(os.getenv("CARD_INV_STORE_IDLE_SECONDS", "600"))
+STORE_AUTO_CREATE = os.getenv("CARD_INV_STORE_AUTO_CREATE") == "1"
+# Per store, so dozens of open stores don't each hold a CPU-count sized pool
+STORE_READ_POOL_SIZE = int(os.getenv("CARD_INV_STORE_READ_POOL_SIZE", "4"))
+
+_STORE_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+class StoreError(Exception):
+    status_code = 400
+
+
+class UnknownStore(StoreError):
+    status_code = 404
+
+
+class StoreUnavailable(StoreError):
+    status_code = 503
+
+
+class StoreDatabase:
+    """Engines and session factories of one open store."""
+
+    def __init__(self, store_id: str, url: str, read_pool_size: int):
+        self.store_id = store_id
+        self.url = url
+        self.engine, self.read_engine = create_engines(url, read_pool_size=read_pool_size)
+        self.SessionLocal, self.ReadSessionLocal = session_factories(self.engine, self.read_engine, url)
+        self.in_use = 0
+        self.requests = 0
+        self.opened_at = time.monotonic()
+        self.last_used = self.opened_at
+
+    def close(self) -> None:
+        self.engine.dispose()
+        if self.read_engine is not self.engine:
+            self.read_engine.dispose()
+        events.drop_views(self.url)
+
+
+class StoreRouter:
+    """Lazily opened store databases in a bounded LRU with idle eviction."""
+
+    def __init__(self, directory, max_open: int = MAX_OPEN_STORES, idle_seconds: float = STORE_IDLE_SECONDS,
+                 auto_create: bool = STORE_AUTO_CREATE, read_pool_size: int = STORE_READ_POOL_SIZE,
+                 auto_upgrade: bool = False):
+        self.directory = Path(directory)
+        self.max_open = max(1, max_open)
+        self.idle_seconds = idle_seconds
+        self.auto_create = auto_create
+        self.read_pool_size = read_pool_size
+        self.auto_upgrade = auto_upgrade
+        self._lock = threading.Lock()
+        self._open = OrderedDict()
+        self._opening = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.opened = 0
+        self.evicted = 0
+
+    def path(self, store_id: str) -> Path:
+        if not _STORE_ID.match(store_id):
+            raise StoreError(f"Invalid store id {store_id!r}")
+        return self.directory / f"{store_id}.db"
+
+    def _checkout(self, store: StoreDatabase) -> StoreDatabase:
+        # Caller holds self._lock
+        self._open.move_to_end(store.store_id)
+        store.in_use += 1
+        store.requests += 1
+        return store
+
+    def acquire_open(self, store_id: str):
+        """The store if it is already open (never blocks on I/O), else None."""
+        with self._lock:
+            store = self._open.get(store_id)
+            if store is None:
+                return None
+            self.hits += 1
+            return self._checkout(store)
+
+    def acquire(self, store_id: str) -> StoreDatabase:
+        """Open the store if needed and mark it in use; pair with ``release``."""
+        store = self.acquire_open(store_id)
+        if store is not None:
+            return store
+        path = self.path(store_id)
+        with self._lock:
+            opening = self._opening.setdefault(store_id, threading.Lock())
+        # One thread opens a store; others asking for it meanwhile wait here
+        with opening:
+            store = self.acquire_open(store_id)
+            if store is not None:
+                return store
+            try:
+                store = self._open_store(store_id, path)
+            finally:
+                with self._lock:
+                    self._opening.pop(store_id, None)
+            with self._lock:
+                self._open[store_id] = store
+                self.opened += 1
+                self._checkout(store)
+                evicted = self._evict_over_capacity()
+        for old in evicted:
+            old.close()
+        return store
+
+    def _open_store(self, store_id: str, path: Path) -> StoreDatabase:
+        from .migrations import SchemaVersionError, ensure_schema
+
+        if not path.exists() and not self.auto_create:
+            raise UnknownStore(f"Unknown store {store_id!r}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        store = StoreDatabase(store_id, f"sqlite:///{path}", self.read_pool_size)
+        try:
+            ensure_schema(store.engine, auto_upgrade=self.auto_upgrade)
+        except SchemaVersionError as exc:
+            store.close()
+            raise StoreUnavailable(f"Store {store_id!r}: {exc}")
+        if profiling.SLOW_QUERY_MS > 0:
+            for engine in {store.engine, store.read_engine}:
+                profiling.install_slow_query_log(engine, profiling.SLOW_QUERY_MS)
+        return store
+
+    def release(self, store: StoreDatabase) -> None:
+        with self._lock:
+            store.in_use -= 1
+            store.last_used = time.monotonic()
+
+    def _evict_over_capacity(self) -> list:
+        # Caller holds self._lock. Least recently used first; busy stores are
+        # skipped, so the LRU can briefly exceed its bound under load.
+        evicted = []
+        for store_id in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            store = self._open[store_id]
+            if store.in_use == 0:
+                del self._open[store_id]
+                evicted.append(store)
+        self.evicted += len(evicted)
+        return evicted
+
+    def evict_idle(self) -> list:
+        """Close stores unused for ``idle_seconds``; returns their ids."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [store for store in self._open.values()
+                    if store.in_use == 0 and now - store.last_used >= self.idle_seconds]
+            for store in idle:
+                del self._open[store.store_id]
+            self.evicted += len(idle)
+        for store in idle:
+            store.close()
+        return [store.store_id for store in idle]
+
+    def close_all(self) -> None:
+        with self._lock:
+            stores = list(self._open.values())
+            self._open.clear()
+        for store in stores:
+            store.close()
+
+    def start(self) -> None:
+        if self.idle_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="store-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.close_all()
+
+    def _run(self) -> None:
+        while not self._stop.wait(min(60.0, max(1.0, self.idle_seconds / 4))):
+            closed = self.evict_idle()
+            if closed:
+                print(f"Closed idle stores: {', '.join(closed)}")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            stores = [{
+                "store": store.store_id,
+                "in_use": store.in_use,
+                "requests": store.requests,
+                "idle_seconds": round(now - store.last_used, 1),
+            } for store in reversed(self._open.values())]
+        return {
+            "open": len(stores),
+            "max_open": self.max_open,
+            "idle_seconds": self.idle_seconds,
+            "hits": self.hits,
+            "opened": self.opened,
+            "evicted": self.evicted,
+            "stores": stores,
+        }
+
+
+router = StoreRouter(STORES_DIR, auto_upgrade=os.getenv("CARD_INV_AUTO_MIGRATE") == "1") if STORES_DIR else None
+
+
+def enabled() -> bool:
+    return router is not None
+
+
+def each_database():
+    """
+    ``(store_id, url, session factory)`` of the default database (store id
+    None) and, with tenancy on, of every store file on disk; for scheduled
+    jobs. A store is held open, and bound as the current store, while its
+    entry is being used.
+    """
+    from .db import SessionLocal
+
+    yield None, DATABASE_URL, SessionLocal
+    if router is None:
+        return
+    for path in sorted(router.directory.glob("*.db")):
+        try:
+            store = router.acquire(path.stem)
+        except StoreError as exc:
+            print(f"Skipping store {path.stem}: {exc}")
+            continue
+        token = current_store.set(store)
+        try:
+            yield store.store_id, store.url, store.SessionLocal
+        finally:
+            current_store.reset(token)
+            router.release(store)
+
+
+def current_database_url() -> str:
+    """URL of the database the current request works on."""
+    store = current_store.get()
+    return store.url if store is not None else DATABASE_URL
+
+
+def stats():
+    return router.stats() if router is not None else None
+
+
+def store_from_scope(scope):
+    """``(store_id, scope)`` with a ``/stores/<id>`` prefix stripped from the path."""
+    path = scope.get("path", "")
+    if path.startswith(PATH_PREFIX):
+        store_id, _, rest = path[len(PATH_PREFIX):].partition("/")
+        scope = dict(scope, path="/" + rest)
+        if "raw_path" in scope:
+            scope["raw_path"] = scope["path"].encode()
+        return store_id, scope
+    for name, value in scope.get("headers", []):
+        if name == STORE_HEADER.encode():
+            return value.decode("latin-1").strip(), scope
+    return None, scope
+
+
+async def _send_error(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class StoreMiddleware:
+    """Binds each request that names a store to that store's database."""
+
+    def __init__(self, app, store_router: StoreRouter = None):
+        self.app = app
+        self.router = store_router or router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        store_id, scope = store_from_scope(scope)
+        if not store_id:
+            await self.app(scope, receive, send)
+            return
+        try:
+            store = self.router.acquire_open(store_id) or await run_in_threadpool(self.router.acquire, store_id)
+        except StoreError as exc:
+            await _send_error(send, exc.status_code, str(exc))
+            return
+
+        token = current_store.set(store)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_store.reset(token)
+            self.router.release(store)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.tenancy", description="Manage per-store databases")
+    parser.add_argument("--dir", type=Path, default=STORES_DIR, help="Store directory (default: CARD_INV_STORES_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List store databases")
+    create = sub.add_parser("create", help="Create a store database")
+    create.add_argument("store")
+    migrate = sub.add_parser("migrate", help="Apply pending migrations to every store")
+    migrate.add_argument("stores", nargs="*", help="Only these stores")
+    args = parser.parse_args(argv)
+    if args.dir is None:
+        print("Error: set CARD_INV_STORES_DIR or pass --dir", file=sys.stderr)
+        return 1
+
+    from sqlalchemy import create_engine
+    from .migrations import current_version, ensure_schema, head_version, upgrade
+
+    store_router = StoreRouter(args.dir, auto_create=True)
+    try:
+        if args.command == "list":
+            for path in sorted(Path(args.dir).glob("*.db")):
+                engine = create_engine(f"sqlite:///{path}", future=True)
+                try:
+                    print(f"{path.stem:<32} schema {current_version(engine)}/{head_version()}  "
+                          f"{path.stat().st_size / 1e6:>9.1f} MB")
+                finally:
+                    engine.dispose()
+        elif args.command == "create":
+            path = store_router.path(args.store)
+            if path.exists():
+                print(f"Error: store {args.store!r} already exists", file=sys.stderr)
+                return 1
+            path.parent.mkdir(parents=True, exist_ok=True)
+            engine = create_engine(f"sqlite:///{path}", future=True)
+            try:
+                ensure_schema(engine)
+            finally:
+                engine.dispose()
+            print(f"Created {path}")
+        elif args.command == "migrate":
+            paths = [store_router.path(store) for store in args.stores] or sorted(Path(args.dir).glob("*.db"))
+            for path in paths:
+                engine = create_engine(f"sqlite:///{path}", future=True)
+                try:
+                    print(f"{path.stem}: version {upgrade(engine)}")
+                finally:
+                    engine.dispose()
+    except StoreError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
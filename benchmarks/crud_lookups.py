@@ -0,0 +1,101 @@
+"""
+Per-call overhead of the hot crud lookups: ``python benchmarks/crud_lookups.py [--items N] [--calls N]``.
+
+Builds a throwaway SQLite database, then times each lookup through
+``app.crud`` next to the legacy ``db.query(...).filter(...).first()`` form it
+replaced. The session's identity map is cleared between calls, so every call
+pays for statement construction, compilation lookup, execution and row
+hydration just as a fresh request session would.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _legacy(models, func):
+    """The pre-2.0 query forms, kept here as the baseline."""
+    return {
+        "get_item": lambda db, item_id, barcode, batch_id: (
+            db.query(models.Item).filter(models.Item.id == item_id).first()),
+        "get_item_by_barcode": lambda db, item_id, barcode, batch_id: (
+            db.query(models.Item).filter(models.Item.barcode == barcode).first()),
+        "get_batch": lambda db, item_id, barcode, batch_id: (
+            db.query(models.Batch).filter(models.Batch.id == batch_id).first()),
+        "item_exists": lambda db, item_id, barcode, batch_id: (
+            db.query(models.Item).filter(models.Item.id == item_id).first() is not None),
+        "get_batch_stats": lambda db, item_id, barcode, batch_id: (
+            db.query(func.count(models.Item.id)).filter(models.Item.batch_id == batch_id).scalar()),
+    }
+
+
+def _current(crud):
+    return {
+        "get_item": lambda db, item_id, barcode, batch_id: crud.get_item(db, item_id),
+        "get_item_by_barcode": lambda db, item_id, barcode, batch_id: crud.get_item_by_barcode(db, barcode),
+        "get_batch": lambda db, item_id, barcode, batch_id: crud.get_batch(db, batch_id),
+        "item_exists": lambda db, item_id, barcode, batch_id: crud.item_exists(db, item_id),
+        "get_batch_stats": lambda db, item_id, barcode, batch_id: crud.get_batch_stats(db, batch_id),
+    }
+
+
+def _time(call, db, keys, calls: int) -> float:
+    started = time.perf_counter()
+    for index in range(calls):
+        item_id, barcode, batch_id = keys[index % len(keys)]
+        call(db, item_id, barcode, batch_id)
+        db.expunge_all()
+    db.rollback()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="crud lookup micro-benchmark")
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3, help="Best of this many rounds")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="crud-bench-")
+    os.environ["CARD_INV_DB_URL"] = f"sqlite:///{workdir}/bench.db"
+    from sqlalchemy import func, insert
+
+    from app import crud, models
+    from app.db import SessionLocal, engine
+    from app.migrations import ensure_schema
+
+    ensure_schema(engine)
+    created = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Batch.__table__), [
+            {"id": n, "name": f"Batch {n}", "target_location": "Show", "is_active": True,
+             "created_at": created, "updated_at": created} for n in range(1, 51)])
+        conn.execute(insert(models.Item.__table__), [
+            {"barcode": f"{n:012d}", "name": f"Card {n}", "game": "Pokemon", "set_name": f"Set {n % 40}",
+             "quantity": n % 7, "location": "Storage", "batch_id": n % 50 + 1,
+             "created_at": created, "updated_at": created} for n in range(1, args.items + 1)])
+    keys = [(n, f"{n:012d}", n % 50 + 1) for n in range(1, args.items + 1, max(1, args.items // 1000))]
+
+    db = SessionLocal()
+    legacy, current = _legacy(models, func), _current(crud)
+    print(f"{args.items} items, {args.calls} calls per round, best of {args.rounds} (microseconds per call)\n")
+    print(f"{'lookup':<22} {'legacy query':>13} {'crud':>10} {'speedup':>8}")
+    try:
+        for name in current:
+            before = min(_time(legacy[name], db, keys, args.calls) for _ in range(args.rounds))
+            after = min(_time(current[name], db, keys, args.calls) for _ in range(args.rounds))
+            print(f"{name:<22} {before:>13.1f} {after:>10.1f} {before / after:>7.2f}x")
+    finally:
+        db.close()
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+JSON versus MessagePack for API responses: ``python benchmarks/encoding.py [--calls N]``.
+
+Encodes the payloads scanner stations receive (a scan response, an item, and
+item list pages) exactly as the API renders them: the response model dumped
+in JSON mode, then ``JSONResponse`` rendering or ``app.encoding.packb``.
+Reports payload size raw and gzipped (as nginx would send it) and the encode
+and decode time per payload.
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+GAMES = ("Pokemon", "Magic: The Gathering", "Yu-Gi-Oh!", "One Piece")
+
+
+def _item(schemas, n: int):
+    created = datetime(2024, 1, 1) + timedelta(minutes=n)
+    named = n % 4 != 0
+    return schemas.ItemRead(
+        id=n, barcode=f"{820650850000 + n:012d}",
+        name=f"Booster Pack {n}" if named else None,
+        game=GAMES[n % len(GAMES)] if named else None,
+        set_name=f"Set {n % 40}" if named else None,
+        brand="Wizards" if named and n % 3 else None,
+        quantity=n % 12, location="Show" if n % 2 else "Storage",
+        notes=None, price=Decimal(f"{n % 50}.99") if named else None, description=None,
+        batch_id=None, created_at=created, updated_at=created + timedelta(hours=1),
+    )
+
+
+def _payloads(schemas) -> dict:
+    scan = schemas.ScanResponse(item=_item(schemas, 7), is_new=False)
+    return {
+        "scan response": scan.model_dump(mode="json"),
+        "item": _item(schemas, 7).model_dump(mode="json"),
+        "item list (100)": [_item(schemas, n).model_dump(mode="json") for n in range(1, 101)],
+        "item list (1000)": [_item(schemas, n).model_dump(mode="json") for n in range(1, 1001)],
+    }
+
+
+def _time(call, calls: int) -> float:
+    best = None
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(calls):
+            call()
+        elapsed = (time.perf_counter() - started) / calls * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="JSON vs MessagePack response encoding")
+    parser.add_argument("--calls", type=int, default=2000, help="Encodes per payload and round (scaled down for lists)")
+    args = parser.parse_args(argv)
+
+    from fastapi.responses import JSONResponse
+
+    from app import encoding, schemas
+
+    if encoding.msgpack is None:
+        print("msgpack is not installed (pip install msgpack)", file=sys.stderr)
+        return 1
+    render_json = JSONResponse(None).render
+
+    print(f"{'payload':<18} {'json B':>8} {'msgpack B':>10} {'json gz':>8} {'mp gz':>7}  "
+          f"{'json enc us':>11} {'mp enc us':>10}  {'json dec us':>11} {'mp dec us':>10}")
+    for name, content in _payloads(schemas).items():
+        calls = max(10, args.calls // (len(content) if isinstance(content, list) else 1))
+        as_json = render_json(content)
+        as_msgpack = encoding.packb(content)
+        assert encoding.unpackb(as_msgpack) == json.loads(as_json)
+        print(f"{name:<18} {len(as_json):>8} {len(as_msgpack):>10} {len(gzip.compress(as_json)):>8} "
+              f"{len(gzip.compress(as_msgpack)):>7}  "
+              f"{_time(lambda: render_json(content), calls):>11.1f} "
+              f"{_time(lambda: encoding.packb(content), calls):>10.1f}  "
+              f"{_time(lambda: json.loads(as_json), calls):>11.1f} "
+              f"{_time(lambda: encoding.unpackb(as_msgpack), calls):>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
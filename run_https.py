@@ -4,10 +4,9 @@ HTTPS Server for Card Inventory App
 This script runs the FastAPI app with SSL certificates for secure camera access.
 """
 
-import uvicorn
-import ssl
 from pathlib import Path
 from get_ip import get_local_ip, get_network_ip
+from app import serve
 
 if __name__ == "__main__":
     # SSL certificate paths
@@ -37,13 +36,10 @@ if __name__ == "__main__":
     print("⚠️  Note: You'll see a security warning - click 'Advanced' → 'Proceed'")
     print("Press Ctrl+C to stop")
     
-    # Run with HTTPS
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8443,
-        reload=True,
-        ssl_keyfile=str(key_file),
-        ssl_certfile=str(cert_file),
-        log_level="info"
-    ) 
\ No newline at end of file
+    # Run with HTTPS through the production launcher (no auto-reload)
+    exit(serve.main([
+        "--host", "0.0.0.0",
+        "--port", "8443",
+        "--ssl-keyfile", str(key_file),
+        "--ssl-certfile", str(cert_file),
+    ]))
@@ -13,21 +13,13 @@ if not exist ".venv\Scripts\python.exe" (
     exit /b 1
 )
 
-REM Check if database exists
-if not exist "card_inventory.db" (
-    echo ❌ Database not found!
-    echo Please run the app first to create the database.
-    pause
-    exit /b 1
-)
-
 REM Check if search term provided
 if "%1"=="" (
     echo Viewing all items...
-    .venv\Scripts\python.exe view_inventory.py
+    .venv\Scripts\python.exe -m app.cli items
 ) else (
     echo Searching for: %1
-    .venv\Scripts\python.exe view_inventory.py "%1"
+    .venv\Scripts\python.exe -m app.cli items --search "%1"
 )
 
 echo.